@@ -1,5 +1,7 @@
 from pathlib import Path
-from IR_2025S.dataset_utils import save_to_json, convert_to_hf_dataset, load_from_json
+from IR_2025S.dataset_utils import (
+    load_corpus, save_corpus, build_vocabulary, save_vocabulary, convert_to_hf_dataset
+)
 from IR_2025S.preprocessing import Preprocessor
 
 
@@ -7,23 +9,26 @@ def main():
     # project root = IR_2025S/
     root_dir = Path(__file__).resolve().parents[1]      # IR_2025S/
     processed_path = root_dir/"data"/"processed"
-    json_path = processed_path/"dataset.json"
-    preprocessed_path = processed_path/"dataset_preprocessed.json"
+    corpus_path = processed_path/"corpus.arrow"
+    preprocessed_path = processed_path/"corpus_preprocessed.arrow"
+    vocab_path = processed_path/"vocab.arrow"
 
-    dataset = load_from_json(json_path)
-    print(f"📥 Loaded dataset from: {json_path}")
+    dataset = load_corpus(corpus_path).to_pylist()
+    print(f"📥 Loaded dataset from: {corpus_path}")
 
     preprocessor = Preprocessor(stopwords=True, lemmatize=True, preserve_punct=False)
     dataset = preprocessor.preprocess_dataset(dataset)
     print(f"🧹 Preprocessed {len(dataset)} chapters.")
 
-    save_to_json(dataset, preprocessed_path)
-    print(f"📁 Saved preprocessed dataset to: {preprocessed_path}")
+    vocabulary = build_vocabulary(dataset)
+    save_vocabulary(vocabulary, vocab_path)
+    save_corpus(dataset, preprocessed_path, vocabulary=vocabulary)
+    print(f"📁 Saved preprocessed corpus to: {preprocessed_path} ({len(vocabulary)} token types in {vocab_path})")
 
-    # Optional: Convert to HF Dataset
-    hf_dataset = convert_to_hf_dataset(dataset)
+    # Optional: HF Dataset, memory-mapped straight from the Arrow file
+    hf_dataset = convert_to_hf_dataset(preprocessed_path)
     print(f"🤗 HuggingFace Dataset created with {hf_dataset.num_rows} rows.")
-    print(hf_dataset[0])
+    print(hf_dataset[0]["chapter_id"], hf_dataset[0]["chapter_title"])
 
 
 if __name__ == "__main__":
@@ -1,22 +1,40 @@
+import argparse
 from pathlib import Path
-from IR_2025S.dataset_utils import load_from_json
+from IR_2025S.dataset_utils import corpus_columns, iter_corpus_records, load_vocabulary
 from IR_2025S.indexer import BooleanIndexerSQLite
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Build the SQLite boolean/BM25 index")
+    parser.add_argument("--impacts", action="store_true", help="Also store quantized BM25 impacts for rank_impact()")
+    parser.add_argument("--k1", type=float, default=1.5, help="BM25 k1 used for the impact index")
+    parser.add_argument("--b", type=float, default=0.75, help="BM25 b used for the impact index")
+    parser.add_argument("--impact-bits", type=int, default=12, help="Quantization bits per impact")
+    args = parser.parse_args()
+
     # project root = IR_2025S/
     root_dir = Path(__file__).resolve().parents[1]      # IR_2025S/
     processed_path = root_dir/"data"/"processed"
-    dataset_path = processed_path/"dataset_preprocessed.json"
+    dataset_path = processed_path/"corpus_preprocessed.arrow"
+    vocab_path = processed_path/"vocab.arrow"
     db_path = processed_path/"boolean_index.db"
 
-    # Load preprocessed dataset
-    dataset = load_from_json(dataset_path)
+    # Load preprocessed dataset: only the columns the index stores; token ids are
+    # used as term ids directly, the vocabulary only maps them back for the term dictionary;
+    # token offsets (absent from corpora preprocessed before they were stored) give the positions
+    columns = ["chapter_id", "book", "chapter_title", "text", "token_ids"]
+    if "token_offsets" in corpus_columns(dataset_path):
+        columns.append("token_offsets")
+    dataset = list(iter_corpus_records(dataset_path, columns=columns))
+    vocabulary = load_vocabulary(vocab_path)
     print(f"📥 Loaded {len(dataset)} chapters from: {dataset_path}")
 
     # Build SQLite index
     indexer = BooleanIndexerSQLite(db_path)
-    indexer.index_dataset(dataset)
+    indexer.index_dataset(dataset, vocabulary=vocabulary)
+    if args.impacts:
+        indexer.build_impact_index(k1=args.k1, b=args.b, bits=args.impact_bits)
+        print(f"⚡ Impact-ordered postings stored (k1={args.k1}, b={args.b})")
     indexer.close()
     print(f"✅ Boolean index created and saved to: {db_path}")
 
@@ -7,13 +7,18 @@ sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
 import argparse
 from IR_2025S.preprocessing import Preprocessor
 from IR_2025S.retriever import BM25RetrieverSQLite
+from IR_2025S.filters import ChapterFilter
 
 
 def main():
     parser = argparse.ArgumentParser(description="Query BM25 index")
     parser.add_argument("query", type=str, help="Search query (e.g. 'harry dumbledore')")
     parser.add_argument("--topk", type=int, default=5, help="Number of results to return")
+    parser.add_argument("--rm3", action="store_true", help="Expand the query with RM3 pseudo-relevance feedback")
+    parser.add_argument("--book", type=str, default=None, help="Only search these books (e.g. '4' or '1,2')")
+    parser.add_argument("--chapters", type=str, default=None, help="Only search this chapter range (e.g. '1-10', '5-' or '7')")
     args = parser.parse_args()
+    chapter_filter = ChapterFilter.parse(args.book, args.chapters)
 
     # project root = IR_2025S/
     root_dir = Path(__file__).resolve().parents[1]      # IR_2025S/
@@ -30,19 +35,23 @@ def main():
 
     # run BM25 retrieval
     retriever = BM25RetrieverSQLite(db_path)
-    results = retriever.rank(query_tokens, top_n=args.topk)
-    retriever.close()
+    if args.rm3:
+        results, weights = retriever.rank_rm3(query_tokens, top_n=args.topk, chapter_filter=chapter_filter,
+                                              return_weights=True)
+        print("\n🧩 RM3 query: " + ", ".join(f"{token} {weight:.3f}" for token, weight in
+                                            sorted(weights.items(), key=lambda item: -item[1])))
+    else:
+        results = retriever.rank(query_tokens, top_n=args.topk, chapter_filter=chapter_filter)
 
-    # display results
+    # display results; snippets are read from the index, so it is closed afterwards
     print(f"\n🔎 Query: {' '.join(query_tokens)}  (Top {args.topk} results)\n")
     if not results:
         print("❌ No results found.")
-        return
-
-    for i, (chapter_id, book, chapter_title, text) in enumerate(results, 1):
-        preview = text[:300].replace("\n", " ").strip() + "..."
-        print(f"{i}. 📘 {book} — {chapter_title} ({chapter_id})")
+    for i, hit in enumerate(results, 1):
+        preview = "..." + hit.snippet(width=300).replace("\n", " ") + "..."
+        print(f"{i}. 📘 {hit.book} — {hit.chapter_title} ({hit.chapter_id})")
         print(f"   {preview}\n")
+    retriever.close()
 
 
 if __name__ == "__main__":
@@ -51,6 +60,7 @@ if __name__ == "__main__":
 # in Terminal:
 # conda activate IR_2025S
 # python pipeline/04_query_bm25.py "dobby sock" --topk 5
+# python pipeline/04_query_bm25.py "dobby sock" --book 2 --chapters 1-10
 
 
 #indexer next step
@@ -16,5 +16,15 @@ with open(index_path.with_suffix(".pkl"), "rb") as f:
     metadata = pickle.load(f)
 
 print(f"✅ Loaded index with {faiss_index.ntotal} vectors")
-print(f"📄 First paragraph:\n{metadata[0]['paragraph_text']}")
+
+# paragraphs are stored as offsets into the chapter text (older indexes still carry the text itself)
+first = metadata[0]
+if "paragraph_text" in first:
+    paragraph = first["paragraph_text"]
+else:
+    from IR_2025S.dataset_utils import load_corpus
+    from IR_2025S.segmentation import segment_text
+    chapter = load_corpus(index_path.parent / "corpus.arrow", columns=["text"]).column("text")[first["doc_id"]].as_py()
+    paragraph = segment_text(chapter, first["start"], first["end"])
+print(f"📄 First paragraph:\n{paragraph}")
 #
\ No newline at end of file
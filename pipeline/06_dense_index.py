@@ -6,19 +6,30 @@ from pathlib import Path
 # Fix Python path to point to src/ folder where the IR_project module lives
 sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
 
-from IR_2025S.dataset_utils import load_from_json
+import argparse
+from IR_2025S.dataset_utils import load_corpus
 from IR_2025S.dense_retriever import DenseRetrieverFAISS
+from IR_2025S.late_interaction import LateInteractionRetriever
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Build the dense paragraph index")
+    parser.add_argument("--late-interaction", action="store_true",
+                        help="Also build the multi-vector (late-interaction) index with compressed token embeddings")
+    parser.add_argument("--late-dim", type=int, default=128, help="Projected token embedding dimension")
+    parser.add_argument("--late-nbits", type=int, default=2, help="Residual bits per dimension")
+    parser.add_argument("--late-centroids", type=int, default=1024, help="Number of centroids")
+    args = parser.parse_args()
+
     # project root = IR_2025S/
     root_dir = Path(__file__).resolve().parents[1]  # IR_2025S/
     processed_path = root_dir / "data" / "processed"
-    dataset_path = processed_path / "dataset.json"  # Use original dataset, not preprocessed
+    dataset_path = processed_path / "corpus.arrow"  # Use original dataset, not preprocessed
     dense_index_path = processed_path / "dense_index"
 
     # Load dataset
-    dataset = load_from_json(dataset_path)
+    # the dense stage only needs the text and the ids/titles it reports
+    dataset = load_corpus(dataset_path, columns=["chapter_id", "book", "chapter_title", "text"]).to_pylist()
     print(f"📥 Loaded {len(dataset)} chapters from: {dataset_path}")
 
     # Initialize dense retriever
@@ -26,10 +37,18 @@ def main():
 
     # Build dense index with paragraph-level embeddings
     print("🏗️ Building dense retrieval index...")
-    dense_retriever.build_index(dataset, save_path=str(dense_index_path))
+    dense_retriever.build_index(dataset, save_path=str(dense_index_path), corpus_path=str(dataset_path))
 
     print(f"✅ Dense index created and saved to: {dense_index_path}")
 
+    if args.late_interaction:
+        late_index_path = processed_path / "harry_late_index"
+        late_retriever = LateInteractionRetriever(
+            dense_retriever, dim=args.late_dim, nbits=args.late_nbits, ncentroids=args.late_centroids
+        )
+        late_retriever.build_index(dataset, save_path=str(late_index_path))
+        print(f"✅ Late-interaction index created and saved to: {late_index_path}")
+
 
 if __name__ == "__main__":
     main()
@@ -7,7 +7,6 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
 
 import argparse
-from IR_2025S.dense_retriever import DenseRetrieverFAISS
 
 
 def main():
@@ -15,8 +14,16 @@ def main():
     parser.add_argument("query", type=str, help="Search query (e.g. 'Harry talks to Dumbledore')")
     parser.add_argument("--topk", type=int, default=5, help="Number of results to return")
     parser.add_argument("--by-chapter", action="store_true", help="Group results by chapter")
+    parser.add_argument("--late-interaction", action="store_true", help="Search the multi-vector (MaxSim) index")
+    parser.add_argument("--book", type=str, default=None, help="Only search these books (e.g. '4' or '1,2')")
+    parser.add_argument("--chapters", type=str, default=None, help="Only search this chapter range (e.g. '1-10', '5-' or '7')")
     args = parser.parse_args()
 
+    # torch, transformers and faiss are only imported once the arguments are valid (fast --help)
+    from IR_2025S.dense_retriever import DenseRetrieverFAISS
+    from IR_2025S.filters import ChapterFilter
+    chapter_filter = ChapterFilter.parse(args.book, args.chapters)
+
     # project root = IR_2025S/
     root_dir = Path(__file__).resolve().parents[1]  # IR_2025S/
     processed_path = root_dir / "data" / "processed"
@@ -25,12 +32,16 @@ def main():
     # Initialize and load dense retriever
     dense_retriever = DenseRetrieverFAISS()
     dense_retriever.load_index(str(dense_index_path))
+    if args.late_interaction:
+        from IR_2025S.late_interaction import LateInteractionRetriever
+        late_retriever = LateInteractionRetriever(dense_retriever)
+        late_retriever.load_index(str(processed_path / "harry_late_index"))
 
     print(f"\n🔍 Dense Query: {args.query}  (Top {args.topk} results)\n")
 
     if args.by_chapter:
         # Search and group by chapter
-        chapter_results = dense_retriever.search_by_chapter(args.query, top_k=args.topk)
+        chapter_results = dense_retriever.search_by_chapter(args.query, top_k=args.topk, chapter_filter=chapter_filter)
 
         if not chapter_results:
             print("❌ No results found.")
@@ -38,28 +49,29 @@ def main():
 
         for chapter_id, paragraphs in chapter_results.items():
             # Get chapter info from first paragraph
-            first_para = paragraphs[0][1]
-            print(f"📘 {first_para['book']} — {first_para['chapter_title']} ({chapter_id})")
-            print(f"   Score: {paragraphs[0][0]:.4f}")
+            first_para = paragraphs[0]
+            print(f"📘 {first_para.book} — {first_para.chapter_title} ({chapter_id})")
+            print(f"   Score: {first_para.score:.4f}")
 
-            for i, (score, metadata) in enumerate(paragraphs, 1):
-                preview = metadata['paragraph_text'][:200].replace("\n", " ").strip() + "..."
-                print(f"   {i}. [{score:.4f}] {preview}")
+            for i, hit in enumerate(paragraphs, 1):
+                preview = hit.preview(200).strip() + "..."
+                print(f"   {i}. [{hit.score:.4f}] {preview}")
             print()
 
     else:
         # Regular paragraph-level search
-        results = dense_retriever.search(args.query, top_k=args.topk)
+        searcher = late_retriever if args.late_interaction else dense_retriever
+        results = searcher.search(args.query, top_k=args.topk, chapter_filter=chapter_filter)
 
         if not results:
             print("❌ No results found.")
             return
 
-        for i, (score, metadata) in enumerate(results, 1):
-            preview = metadata['paragraph_text'][:200].replace("\n", " ").strip() + "..."
-            print(f"{i}. 📘 {metadata['book']} — {metadata['chapter_title']} ({metadata['chapter_id']})")
-            print(f"   Score: {score:.4f}")
-            print(f"   Paragraph {metadata['paragraph_idx']}: {preview}\n")
+        for i, hit in enumerate(results, 1):
+            preview = hit.preview(200).strip() + "..."
+            print(f"{i}. 📘 {hit.book} — {hit.chapter_title} ({hit.chapter_id})")
+            print(f"   Score: {hit.score:.4f}")
+            print(f"   Paragraph {hit.metadata['paragraph_idx']}: {preview}\n")
 
 
 if __name__ == "__main__":
@@ -68,4 +80,5 @@ if __name__ == "__main__":
 
 #run with
 #python pipeline/07_dense_query.py "What is Hogwarts?" --topk 5
+#python pipeline/07_dense_query.py "What is Hogwarts?" --book 1
 #test ##
\ No newline at end of file
@@ -12,56 +12,86 @@ sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
 import argparse
 from IR_2025S.preprocessing import Preprocessor
 from IR_2025S.hybrid_retriever import HybridRetriever, DEFAULT_ALPHA
+from IR_2025S.results import HybridHit
+from IR_2025S.filters import ChapterFilter
 
-def run_hybrid_query(query: str, topk: int = 5, alpha: float = DEFAULT_ALPHA) -> List[dict]:
+def open_hybrid_retriever(alpha: float = DEFAULT_ALPHA, late_interaction: bool = False, expansion: bool = False,
+                          snapshot: str = None) -> HybridRetriever:
     root_dir = Path(__file__).resolve().parents[1]
     processed_path = root_dir / "data" / "processed"
     bm25_db_path = processed_path / "boolean_index.db"
     dense_index_path = processed_path / "harry_dense_index"
 
-    hybrid_retriever = HybridRetriever(
-        bm25_db_path=str(bm25_db_path),
-        dense_index_path=str(dense_index_path),
-        alpha=alpha
-    )
+    # lexical+expanded: the expansion index replaces the dense leg and no DPR model is loaded
+    if snapshot:
+        from IR_2025S.snapshots import open_snapshot
+        hybrid_retriever = HybridRetriever.from_snapshot(
+            open_snapshot(processed_path / "snapshots", None if snapshot == "current" else snapshot),
+            dense=not expansion, late_interaction=late_interaction, expansion=expansion, alpha=alpha
+        )
+    else:
+        hybrid_retriever = HybridRetriever(
+            bm25_db_path=str(bm25_db_path),
+            dense_index_path=None if expansion else str(dense_index_path),
+            alpha=alpha,
+            late_interaction_path=str(processed_path / "harry_late_index") if late_interaction else None,
+            expansion_index_path=str(processed_path / "expansion_index.db") if expansion else None
+        )
+
+    return hybrid_retriever
 
+
+def run_hybrid_query(hybrid_retriever: HybridRetriever, query: str, topk: int = 5,
+                     chapter_filter: ChapterFilter = None) -> List[HybridHit]:
     preprocessor = Preprocessor(stopwords=True, lemmatize=True, preserve_punct=False)
     query_tokens = preprocessor.preprocess_text(query)
-
-    results = hybrid_retriever.search(query, query_tokens=query_tokens, top_k=topk)
-    hybrid_retriever.close()
-    return results
+    return hybrid_retriever.search(query, query_tokens=query_tokens, top_k=topk, chapter_filter=chapter_filter)
 
 def main():
     parser = argparse.ArgumentParser(description="Query Hybrid (BM25 + Dense) Retrieval with Weighted Fusion")
     parser.add_argument("query", type=str, help="Search query (e.g. 'dobby house elf')")
     parser.add_argument("--topk", type=int, default=5, help="Number of results to return")
     parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA, help="Weight for dense vs BM25 (0=BM25 only, 1=dense only)")
+    parser.add_argument("--late-interaction", action="store_true", help="Use the multi-vector (MaxSim) index as the dense leg")
+    parser.add_argument("--expansion", action="store_true", help="Use the learned sparse expansion index instead of the dense leg")
+    parser.add_argument("--book", type=str, default=None, help="Only search these books (e.g. '4' or '1,2')")
+    parser.add_argument("--chapters", type=str, default=None, help="Only search this chapter range (e.g. '1-10', '5-' or '7')")
+    parser.add_argument("--snapshot", type=str, nargs="?", const="current", default=None,
+                        help="Read the indexes from a published snapshot (default CURRENT, see 12_publish_snapshot.py)")
     args = parser.parse_args()
 
-    results = run_hybrid_query(
-        query=args.query,
-        topk=args.topk,
-        alpha=args.alpha
+    # hits read their snippets from the open indexes, so they are printed before close()
+    hybrid_retriever = open_hybrid_retriever(
+        alpha=args.alpha,
+        late_interaction=args.late_interaction,
+        expansion=args.expansion,
+        snapshot=args.snapshot
     )
+    try:
+        results = run_hybrid_query(hybrid_retriever, args.query, topk=args.topk,
+                                   chapter_filter=ChapterFilter.parse(args.book, args.chapters))
 
-    print(f"\n🔍 Hybrid Query: {args.query}")
-    print(f"⚖️ Alpha (dense weight): {args.alpha}")
-    print(f"📊 Top {args.topk} results\n")
+        print(f"\n🔍 Hybrid Query: {args.query}")
+        print(f"⚖️ Alpha (dense weight): {args.alpha}")
+        print(f"📊 Top {args.topk} results\n")
 
-    if not results:
-        print("❌ No results found.")
-    else:
-        for i, result in enumerate(results, 1):
-            print(f"{i}. Chapter {result['chapter_id']}")
-            print(f"   🔗 Combined Score: {result['combined_score']:.4f}")
-            print(f"   📚 BM25 Score: {result['bm25_score']:.4f}")
-            print(f"   🤖 Dense Score: {result['dense_score']:.4f}")
-            print(f"   📖 BM25 Snippet: {result['bm25_text']}")
-            print(f"   🧠 Dense Snippet: {result['dense_text']}\n")
+        if not results:
+            print("❌ No results found.")
+        else:
+            for i, result in enumerate(results, 1):
+                print(f"{i}. Chapter {result.chapter_id}")
+                print(f"   🔗 Combined Score: {result.combined_score:.4f}")
+                print(f"   📚 BM25 Score: {result.bm25_score:.4f}")
+                print(f"   🤖 Dense Score: {result.dense_score:.4f}")
+                print(f"   📖 BM25 Snippet: {result.bm25_text}")
+                print(f"   🧠 Dense Snippet: {result.dense_text}\n")
+    finally:
+        hybrid_retriever.close()
 
 if __name__ == "__main__":
     main()
 
 #python pipeline/08_hybrid.py "harry potter godfather"
-#python pipeline/08_hybrid.py "voldemort wand"
\ No newline at end of file
+#python pipeline/08_hybrid.py "voldemort wand"
+#python pipeline/08_hybrid.py "voldemort wand" --book 4
+#python pipeline/08_hybrid.py "voldemort wand" --snapshot
\ No newline at end of file
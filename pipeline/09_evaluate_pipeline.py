@@ -3,18 +3,22 @@
 # - Loops over alpha values
 # - Runs the hybrid retriever
 # - Computes MAP and NDCG
+#
+# Relevance comes from the qrels file (IR_2025S.evaluation): the positive_ctxs texts are resolved
+# to chapter doc_ids and passage ids once, a result is then judged by set membership.
 
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
 
 import json
+import time
 import argparse
 from pathlib import Path
 from collections import defaultdict
-from sklearn.metrics import ndcg_score, average_precision_score
 from IR_2025S.preprocessing import Preprocessor
 from IR_2025S.hybrid_retriever import HybridRetriever
+from IR_2025S.evaluation import ensure_qrels, relevance_matrix, average_precision, ndcg
 
 
 def load_dataset(path):
@@ -22,58 +26,89 @@ def load_dataset(path):
         return json.load(f)
 
 
-def get_relevant_texts(positive_ctxs):
-    return set(ctx["text"].strip() for ctx in positive_ctxs if "text" in ctx)
+def evaluate_query(retriever, query, query_tokens, topk, rerank=False, level="chapter"):
+    """Ids of the ranked results (chapter doc_ids, or dense passage ids at level "passage") and the latency."""
+    start = time.perf_counter()
+    results = retriever.search(query, query_tokens=query_tokens, top_k=topk, rerank=rerank)
+    latency_ms = (time.perf_counter() - start) * 1000
+    # in rank order: after re-ranking, combined_score is no longer the ordering key
+    if level == "passage":
+        return [hit.passage_id for hit in results], latency_ms
+    return [hit.doc_id for hit in results], latency_ms
 
 
-def evaluate_query(retriever, query, relevant_texts, topk):
-    preprocessor = Preprocessor(stopwords=True, lemmatize=True, preserve_punct=False)
-    query_tokens = preprocessor.preprocess_text(query)
-    results = retriever.search(query, query_tokens=query_tokens, top_k=topk)
-
-    y_true = []
-    y_scores = []
-
-    for r in results:
-        bm25_text = r.get("bm25_text", "")
-        dense_text = r.get("dense_text", "")
-
-        is_relevant = any(
-            rel_text.lower() in bm25_text.lower() or rel_text.lower() in dense_text.lower()
-            for rel_text in relevant_texts
-        )
-
-        y_true.append(1 if is_relevant else 0)
-        y_scores.append(r["combined_score"])
-
-    ap = average_precision_score(y_true, y_scores) if any(y_true) else 0.0
-    ndcg = ndcg_score([y_true], [y_scores]) if any(y_true) else 0.0
-    return ap, ndcg
+def summarize_latency(latencies):
+    latencies = sorted(latencies)
+    mean = sum(latencies) / len(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    return mean, p95
 
 
-def evaluate_all(data_path, bm25_path, dense_path, topk=5):
+def evaluate_all(data_path, bm25_path, dense_path, topk=5, reranker=None, late_path=None, expansion_path=None,
+                 query_cache=None, feedback=None, corpus_path=None, qrels_path=None, level="chapter"):
+    if level == "passage" and expansion_path:
+        # expansion hits are whole chapters (passage_id -1): every ranking would be judged irrelevant
+        raise ValueError("Passage-level evaluation needs dense passages; the expansion leg only ranks chapters.")
     dataset = load_dataset(data_path)
     alpha_results = defaultdict(list)
 
+    # judgments are resolved against the corpus once and reused until the eval data or corpus change
+    processed = Path(bm25_path).parent
+    qrels = ensure_qrels(data_path, corpus_path or processed / "corpus.arrow", qrels_path or processed / "eval_qrels.json")
+    unmatched = sum(len(entry["unmatched"]) for entry in qrels["queries"])
+    if unmatched:
+        print(f"⚠️ {unmatched} positive passages were not found in the corpus and count as missing")
+    relevant = [set(entry["passage_ids" if level == "passage" else "doc_ids"]) for entry in qrels["queries"]]
+
+    preprocessor = Preprocessor(stopwords=True, lemmatize=True, preserve_punct=False)
+    queries = [(entry["query"], preprocessor.preprocess_text(entry["query"])) for entry in dataset]
+
+    # with a reranker, every alpha is evaluated with and without the second stage
+    modes = [("fused", False)] + ([("reranked", True)] if reranker else [])
+    # second legs fused with BM25: the dense index, and the expansion index if built ("lexical+expanded");
+    # at alpha = 1.0 each leg is evaluated on its own
+    legs = [("dense", {"dense_index_path": dense_path, "late_interaction_path": late_path, "query_cache": query_cache})]
+    if expansion_path:
+        legs.append(("expanded", {"expansion_index_path": expansion_path}))
+    # BM25 leg as is, and with RM3 feedback if requested: MAP/NDCG gained against the added latency
+    lexical = [("bm25", None)] + ([("bm25+rm3", feedback)] if feedback is not None else [])
+
     for alpha in [x / 10.0 for x in range(0, 11)]:
         print(f"🔁 Evaluating for alpha = {alpha:.1f}")
-        retriever = HybridRetriever(bm25_db_path=bm25_path, dense_index_path=dense_path, alpha=alpha)
-        total_ap, total_ndcg = 0.0, 0.0
-
-        for entry in dataset:
-            query = entry["query"]
-            relevant_texts = get_relevant_texts(entry.get("positive_ctxs", []))
-            ap, ndcg = evaluate_query(retriever, query, relevant_texts, topk)
-            total_ap += ap
-            total_ndcg += ndcg
-
-        retriever.close()
-        avg_ap = total_ap / len(dataset)
-        avg_ndcg = total_ndcg / len(dataset)
-        alpha_results["alpha"].append(alpha)
-        alpha_results["MAP"].append(avg_ap)
-        alpha_results["NDCG"].append(avg_ndcg)
-        print(f"✅ Alpha: {alpha:.1f} | MAP: {avg_ap:.4f} | NDCG: {avg_ndcg:.4f}")
+        for leg, leg_paths in legs:
+            retriever = HybridRetriever(bm25_db_path=bm25_path, alpha=alpha, reranker=reranker, **leg_paths)
+
+            for lex, lex_feedback in lexical:
+                retriever.feedback = lex_feedback
+                for mode, rerank in modes:
+                    ranked, latencies = [], []
+
+                    for query, query_tokens in queries:
+                        result_ids, latency_ms = evaluate_query(retriever, query, query_tokens, topk, rerank=rerank, level=level)
+                        ranked.append(result_ids)
+                        latencies.append(latency_ms)
+
+                    judged = relevance_matrix(ranked, relevant, topk)
+                    avg_ap = float(average_precision(judged).mean())
+                    avg_ndcg = float(ndcg(judged).mean())
+                    mean_ms, p95_ms = summarize_latency(latencies)
+                    alpha_results["alpha"].append(alpha)
+                    alpha_results["leg"].append(leg)
+                    alpha_results["lexical"].append(lex)
+                    alpha_results["mode"].append(mode)
+                    alpha_results["MAP"].append(avg_ap)
+                    alpha_results["NDCG"].append(avg_ndcg)
+                    alpha_results["latency_ms"].append(mean_ms)
+                    alpha_results["p95_ms"].append(p95_ms)
+                    print(f"✅ Alpha: {alpha:.1f} | {leg:<8} | {lex:<8} | {mode:<8} | MAP: {avg_ap:.4f} | NDCG: {avg_ndcg:.4f} "
+                          f"| latency: {mean_ms:.1f} ms (p95 {p95_ms:.1f} ms)")
+
+            retriever.close()
+
+    if reranker:
+        print(f"📈 Re-ranker stats: {reranker.stats}")
+    if query_cache is not None:
+        print(f"📈 Query cache: {query_cache.metrics()}")
 
     return alpha_results
 
@@ -82,14 +117,52 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("data", type=str, help="Path to evaluation JSON file")
     parser.add_argument("--topk", type=int, default=5)
+    parser.add_argument("--rerank-model", type=str, default=None, help="Cross-encoder name or local path; enables re-ranking")
+    parser.add_argument("--rerank-candidates", type=int, default=20, help="Fused candidates passed to the cross-encoder")
+    parser.add_argument("--rerank-budget-ms", type=float, default=250.0, help="Per-query re-ranking time budget")
+    parser.add_argument("--late-interaction", action="store_true", help="Use the multi-vector (MaxSim) index as the dense leg")
+    parser.add_argument("--expansion", action="store_true", help="Also evaluate the expansion index as second leg, next to the dense one")
+    parser.add_argument("--query-cache", type=float, default=None, metavar="THRESHOLD",
+                        help="Put a semantic query cache with this cosine threshold in front of the dense search")
+    parser.add_argument("--qrels", type=str, default=None,
+                        help="Qrels file, built from the eval data if missing or stale (default data/processed/eval_qrels.json)")
+    parser.add_argument("--level", choices=["chapter", "passage"], default="chapter",
+                        help="Judge the retrieved chapter, or the dense leg's best passage in it")
+    parser.add_argument("--rm3", action="store_true", help="Also evaluate the BM25 leg with RM3 pseudo-relevance feedback")
+    parser.add_argument("--rm3-docs", type=int, default=10, help="Feedback chapters (RM3)")
+    parser.add_argument("--rm3-terms", type=int, default=10, help="Expansion terms (RM3)")
+    parser.add_argument("--rm3-weight", type=float, default=0.5, help="Weight of the original query (RM3)")
     args = parser.parse_args()
+    if args.level == "passage" and args.expansion:
+        parser.error("--level passage judges dense passages; the expansion leg only ranks chapters, drop --expansion")
 
     root = Path(__file__).resolve().parents[1]
     processed = root / "data" / "processed"
     bm25 = processed / "boolean_index.db"
     dense = processed / "harry_dense_index"
 
-    evaluate_all(args.data, str(bm25), str(dense), topk=args.topk)
+    reranker = None
+    if args.rerank_model:
+        from IR_2025S.reranker import CrossEncoderReranker
+        reranker = CrossEncoderReranker(
+            args.rerank_model,
+            max_candidates=args.rerank_candidates,
+            time_budget_ms=args.rerank_budget_ms
+        )
+
+    late = str(processed / "harry_late_index") if args.late_interaction else None
+    expansion = str(processed / "expansion_index.db") if args.expansion else None
+    query_cache = None
+    if args.query_cache is not None:
+        from IR_2025S.query_cache import SemanticQueryCache
+        query_cache = SemanticQueryCache(dim=768, threshold=args.query_cache)
+    feedback = None
+    if args.rm3:
+        feedback = {"fb_docs": args.rm3_docs, "fb_terms": args.rm3_terms, "original_query_weight": args.rm3_weight}
+
+    evaluate_all(args.data, str(bm25), str(dense), topk=args.topk, reranker=reranker, late_path=late,
+                 expansion_path=expansion, query_cache=query_cache, feedback=feedback,
+                 corpus_path=str(processed / "corpus.arrow"), qrels_path=args.qrels, level=args.level)
 
 
 if __name__ == "__main__":
@@ -97,4 +170,7 @@ if __name__ == "__main__":
 
 
 #python pipeline/09_evaluate_pipeline.py data/processed/eval_data.json --topk 5
+#python pipeline/09_evaluate_pipeline.py data/processed/eval_data.json --topk 5 --rerank-model cross-encoder/ms-marco-MiniLM-L-6-v2
+#python pipeline/09_evaluate_pipeline.py data/processed/eval_data.json --topk 5 --expansion
+#python pipeline/09_evaluate_pipeline.py data/processed/eval_data.json --topk 5 --rm3
 
@@ -0,0 +1,45 @@
+# pipeline/10_build_expansion_index.py
+#
+import sys
+from pathlib import Path
+
+# Fix Python path to point to src/ folder where the IR_2025S module lives
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+import argparse
+from IR_2025S.dataset_utils import load_corpus
+from IR_2025S.indexer import BooleanIndexerSQLite
+from IR_2025S.expansion import DocumentExpander, DEFAULT_EXPANSION_MODEL
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the learned sparse (document expansion) index")
+    parser.add_argument("--model", type=str, default=DEFAULT_EXPANSION_MODEL, help="SPLADE document encoder")
+    parser.add_argument("--top-terms", type=int, default=256, help="Expansion terms kept per chapter")
+    parser.add_argument("--max-length", type=int, default=256, help="Word pieces per encoder window")
+    parser.add_argument("--bits", type=int, default=8, help="Quantization bits of the term weights")
+    args = parser.parse_args()
+
+    # project root = IR_2025S/
+    root_dir = Path(__file__).resolve().parents[1]  # IR_2025S/
+    processed_path = root_dir / "data" / "processed"
+    corpus_path = processed_path / "corpus.arrow"
+    db_path = processed_path / "expansion_index.db"
+
+    # raw text, not the lemmatized tokens: the expansion model has its own tokenizer
+    dataset = load_corpus(corpus_path, columns=["chapter_id", "book", "chapter_title", "text"]).to_pylist()
+    print(f"📥 Loaded {len(dataset)} chapters from: {corpus_path}")
+
+    expander = DocumentExpander(args.model, max_length=args.max_length, top_terms=args.top_terms)
+    expansions = expander.expand_dataset(dataset)
+
+    indexer = BooleanIndexerSQLite(db_path)
+    indexer.index_expansions(dataset, expansions, model_name=args.model, bits=args.bits)
+    indexer.close()
+    print(f"✅ Expansion index saved to: {db_path}")
+
+
+if __name__ == "__main__":
+    main()
+
+# python pipeline/10_build_expansion_index.py
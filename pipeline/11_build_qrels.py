@@ -0,0 +1,41 @@
+# pipeline/11_build_qrels.py
+#
+import sys
+from pathlib import Path
+
+# Fix Python path to point to src/ folder where the IR_2025S module lives
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+import time
+import argparse
+from IR_2025S.evaluation import ensure_qrels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve the eval data's positive passages to chapter and passage ids")
+    parser.add_argument("data", type=str, nargs="?", default=None, help="Evaluation JSON file (default data/processed/eval_data.json)")
+    parser.add_argument("--output", type=str, default=None, help="Qrels file (default data/processed/eval_qrels.json)")
+    args = parser.parse_args()
+
+    # project root = IR_2025S/
+    root_dir = Path(__file__).resolve().parents[1]  # IR_2025S/
+    processed_path = root_dir / "data" / "processed"
+    data_path = Path(args.data) if args.data else processed_path / "eval_data.json"
+    output_path = Path(args.output) if args.output else processed_path / "eval_qrels.json"
+
+    start = time.perf_counter()
+    qrels = ensure_qrels(data_path, processed_path / "corpus.arrow", output_path, rebuild=True)
+    print(f"🔎 Matched the positives of {len(qrels['queries'])} queries in {time.perf_counter() - start:.2f} s")
+
+    for entry in qrels["queries"]:
+        line = f"   {entry['query'][:60]:<60} {len(entry['chapter_ids']):>3} chapters {len(entry['passage_ids']):>4} passages"
+        if entry["unmatched"]:
+            line += f"  ⚠️ not found: positives {entry['unmatched']}"
+        print(line)
+    print(f"✅ Qrels saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
+
+# python pipeline/11_build_qrels.py data/processed/eval_data.json
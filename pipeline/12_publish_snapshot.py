@@ -0,0 +1,98 @@
+# pipeline/12_publish_snapshot.py
+#
+# Publishes the indexes built in data/processed as a new immutable snapshot version and points
+# CURRENT at it; running HotSwapRetrievers pick it up on their next refresh(). Also lists,
+# verifies, rolls back and prunes versions, see IR_2025S.snapshots.
+import sys
+from pathlib import Path
+
+# Fix Python path to point to src/ folder where the IR_2025S module lives
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+import time
+import argparse
+from IR_2025S.snapshots import (
+    SNAPSHOT_COMPONENTS, Snapshot, current_version, default_sources, list_versions,
+    prune_snapshots, publish_snapshot, set_current,
+)
+
+
+def print_versions(root):
+    current = current_version(root)
+    versions = list_versions(root)
+    if not versions:
+        print(f"❌ No snapshots in {root}")
+        return
+    print(f"{'':2}{'version':<10}{'created':<27}{'N':>6}{'avgdl':>9}  components")
+    for version in versions:
+        snapshot = Snapshot(root / version)
+        marker = "→" if version == current else ""
+        print(f"{marker:<2}{version:<10}{snapshot.manifest['created']:<27}{snapshot.N:>6}{snapshot.avgdl:>9.1f}  "
+              + ", ".join(snapshot.manifest["components"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish, list, verify, roll back and prune index snapshots")
+    parser.add_argument("--root", type=str, default=None, help="Snapshot directory (default data/processed/snapshots)")
+    parser.add_argument("--components", nargs="+", choices=sorted(SNAPSHOT_COMPONENTS), default=None,
+                        help="Components to publish (default: all present in data/processed)")
+    parser.add_argument("--note", type=str, default=None, help="Free text stored in the manifest")
+    parser.add_argument("--no-current", action="store_true", help="Publish without making it CURRENT")
+    parser.add_argument("--list", action="store_true", help="Only list the published versions")
+    parser.add_argument("--verify", type=str, nargs="?", const="current", default=None,
+                        help="Only check a version's files against its manifest (default CURRENT)")
+    parser.add_argument("--rollback", type=str, default=None, help="Only point CURRENT at an earlier version")
+    parser.add_argument("--keep", type=int, default=None, help="After publishing, delete all but the newest KEEP versions "
+                             "(CURRENT and versions held by running retrievers are kept)")
+    args = parser.parse_args()
+
+    # project root = IR_2025S/
+    root_dir = Path(__file__).resolve().parents[1]  # IR_2025S/
+    processed_path = root_dir / "data" / "processed"
+    snapshot_root = Path(args.root) if args.root else processed_path / "snapshots"
+
+    if args.list:
+        print_versions(snapshot_root)
+        return
+    if args.verify:
+        version = current_version(snapshot_root) if args.verify == "current" else args.verify
+        if version is None:
+            sys.exit(f"❌ No CURRENT snapshot in {snapshot_root}; name the version to verify")
+        try:
+            problems = Snapshot(snapshot_root / version).verify()
+        except FileNotFoundError as e:
+            sys.exit(f"❌ {e}")
+        for problem in problems:
+            print(f"⚠️ {problem}")
+        print(f"{'❌' if problems else '✅'} {version}: {len(problems)} problems")
+        sys.exit(1 if problems else 0)
+    if args.rollback:
+        set_current(snapshot_root, args.rollback)
+        print(f"⏪ CURRENT -> {args.rollback}")
+        return
+
+    sources = default_sources(processed_path)
+    if args.components:
+        missing = [name for name in args.components if name not in sources]
+        if missing:
+            sys.exit(f"❌ Not built in {processed_path}: {', '.join(missing)}")
+        sources = {name: sources[name] for name in args.components}
+
+    start = time.perf_counter()
+    snapshot = publish_snapshot(snapshot_root, sources, note=args.note, make_current=not args.no_current)
+    print(f"📦 Published {snapshot.version} ({', '.join(snapshot.manifest['components'])}, "
+          f"N={snapshot.N}, avgdl={snapshot.avgdl:.1f}) in {time.perf_counter() - start:.2f} s")
+    if not args.no_current:
+        print(f"✅ CURRENT -> {snapshot.version}")
+    if args.keep is not None:
+        removed = prune_snapshots(snapshot_root, keep=args.keep)
+        if removed:
+            print(f"🧹 Removed {', '.join(removed)}")
+
+
+if __name__ == "__main__":
+    main()
+
+# python pipeline/03_build_boolean_index.py && python pipeline/12_publish_snapshot.py --keep 3
+# python pipeline/12_publish_snapshot.py --list
+# python pipeline/12_publish_snapshot.py --rollback v000002
@@ -0,0 +1,124 @@
+# pipeline/bench_filters.py
+#
+# Book / chapter-range filters pushed into the indexes against the usual workaround of searching
+# the whole collection for more results and dropping the ones outside the filter. Reports the
+# cost per query of each, next to an unfiltered search, and how much of the true filtered top-k
+# the over-fetch recovers. Dense queries are stored paragraph vectors, so no model is loaded.
+import sys
+from pathlib import Path
+
+# Fix Python path to point to src/ folder where the IR_2025S module lives
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+import time
+import pickle
+import argparse
+import numpy as np
+from IR_2025S.retriever import BM25RetrieverSQLite
+from IR_2025S.filters import ChapterFilter, resolve_runs, search_faiss_runs
+from bench_sqlite_readers import sample_queries
+
+
+def timed(fn, queries):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append(fn(query))
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def recall(exact, approx):
+    """Mean fraction of the exact filtered top-k that the post-filtered over-fetch also returns, as a column."""
+    judged = [(e, a) for e, a in zip(exact, approx) if e]
+    if not judged:
+        return f"{'-':>8}"      # the filter matches nothing in this index
+    return f"{sum(len(set(e) & set(a)) / len(e) for e, a in judged) / len(judged):>8.3f}"
+
+
+def default_filters():
+    return [ChapterFilter(book) for book in range(1, 8)] + [
+        ChapterFilter([1, 2, 3], (1, 10)),
+        ChapterFilter(None, (1, 3)),
+    ]
+
+
+def bench_bm25(db_path, filters, n_queries, topk, overfetch):
+    retriever = BM25RetrieverSQLite(db_path)
+    queries = sample_queries(retriever, n_queries)
+    chapter_of = retriever._chapter_ids()
+    impact = "impact_scale" in retriever.meta
+
+    _, open_ms = timed(lambda q: retriever.rank(q, top_n=topk), queries)
+    print(f"\n📚 BM25 ({len(queries)} queries, top {topk}, over-fetch {overfetch}x): unfiltered {open_ms:.3f} ms/query")
+    print(f"{'filter':<50}{'pushed ms':>10}{'post ms':>10}{'recall':>8}" + (f"{'impact ms':>11}" if impact else ""))
+    for chapter_filter in filters:
+        retriever.doc_runs(chapter_filter)      # resolved once per filter, as in a long-running process
+        exact, pushed_ms = timed(lambda q: [h.doc_id for h in retriever.rank(q, top_n=topk, chapter_filter=chapter_filter)], queries)
+        post, post_ms = timed(lambda q: [h.doc_id for h in retriever.rank(q, top_n=topk * overfetch)
+                                         if chapter_filter.matches_chapter_id(chapter_of[h.doc_id])][:topk], queries)
+        line = f"{repr(chapter_filter):<50}{pushed_ms:>10.3f}{post_ms:>10.3f}{recall(exact, post)}"
+        if impact:
+            _, impact_ms = timed(lambda q: retriever.rank_impact(q, top_n=topk, chapter_filter=chapter_filter), queries)
+            line += f"{impact_ms:>11.3f}"
+        print(line)
+    retriever.close()
+
+
+def bench_dense(index_path, filters, n_queries, topk, overfetch):
+    import faiss
+    index = faiss.read_index(str(index_path.with_suffix(".faiss")))
+    with open(index_path.with_suffix(".pkl"), "rb") as f:
+        chapter_of = [meta["chapter_id"] for meta in pickle.load(f)]
+    vectors = faiss.rev_swig_ptr(index.get_xb(), index.ntotal * index.d).reshape(index.ntotal, index.d)
+    rng = np.random.default_rng(0)
+    queries = [vectors[i:i + 1].copy() for i in rng.choice(index.ntotal, min(n_queries, index.ntotal), replace=False)]
+
+    _, open_ms = timed(lambda q: index.search(q, topk), queries)
+    print(f"\n🤖 Dense ({index.ntotal} vectors, {len(queries)} queries): unfiltered {open_ms:.3f} ms/query")
+    print(f"{'filter':<50}{'pushed ms':>10}{'post ms':>10}{'recall':>8}{'selector ms':>13}")
+    for chapter_filter in filters:
+        runs = resolve_runs(chapter_filter, chapter_of)
+        exact, pushed_ms = timed(lambda q: search_faiss_runs(index, q, topk, runs)[1], queries)
+
+        def post_filtered(q):
+            _, ids = index.search(q, topk * overfetch)
+            return [i for i in ids[0].tolist() if i >= 0 and chapter_filter.matches_chapter_id(chapter_of[i])][:topk]
+        post, post_ms = timed(post_filtered, queries)
+
+        # the same restriction through FAISS's IDSelector path, which non-flat indexes take
+        if runs:
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(
+                np.concatenate([np.arange(start, end) for start, end in runs]).astype("int64")))
+            _, selector_ms = timed(lambda q: index.search(q, topk, params=params), queries)
+        else:
+            selector_ms = 0.0
+        print(f"{repr(chapter_filter):<50}{pushed_ms:>10.3f}{post_ms:>10.3f}{recall(exact, post)}{selector_ms:>13.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark filters pushed into BM25 and FAISS against over-fetch + post-filter")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--topk", type=int, default=10)
+    parser.add_argument("--overfetch", type=int, default=5, help="Post-filter baseline fetches topk * overfetch results")
+    parser.add_argument("--book", type=str, default=None, help="Benchmark only this filter (e.g. '4')")
+    parser.add_argument("--chapters", type=str, default=None, help="Chapter range of that filter (e.g. '1-10')")
+    parser.add_argument("--no-dense", action="store_true", help="Skip the FAISS benchmark")
+    args = parser.parse_args()
+
+    # project root = IR_2025S/
+    root_dir = Path(__file__).resolve().parents[1]
+    processed_path = root_dir / "data" / "processed"
+    chapter_filter = ChapterFilter.parse(args.book, args.chapters)
+    filters = [chapter_filter] if chapter_filter else default_filters()
+
+    bench_bm25(processed_path / "boolean_index.db", filters, args.queries, args.topk, args.overfetch)
+    dense_path = processed_path / "harry_dense_index"
+    if not args.no_dense and dense_path.with_suffix(".faiss").exists():
+        bench_dense(dense_path, filters, args.queries, args.topk, args.overfetch)
+
+
+if __name__ == "__main__":
+    main()
+
+# python pipeline/bench_filters.py --queries 300 --topk 10
+# python pipeline/bench_filters.py --book 4 --chapters 1-10
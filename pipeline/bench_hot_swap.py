@@ -0,0 +1,123 @@
+# pipeline/bench_hot_swap.py
+#
+# Zero-downtime check of HotSwapRetriever: query threads keep ranking (and reading snippets)
+# while the main thread repeatedly moves CURRENT between two snapshot versions and refreshes.
+# Reports failed queries (should be none), latency percentiles of queries that overlapped a
+# swap against the rest, load time per swap and whether every replaced version was released.
+# Snapshots are published into a temporary directory, so the real CURRENT is left alone.
+import sys
+from pathlib import Path
+
+# Fix Python path to point to src/ folder where the IR_2025S module lives
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import functools
+import numpy as np
+from IR_2025S.retriever import BM25RetrieverSQLite
+from IR_2025S.snapshots import HotSwapRetriever, default_sources, publish_snapshot, set_current
+from bench_sqlite_readers import sample_queries
+
+
+def bm25_loader(snapshot, previous):
+    return BM25RetrieverSQLite(snapshot.component("bm25"))
+
+
+def query_loop(hot, queries, topk, stop, records, errors):
+    i = 0
+    while not stop.is_set():
+        query_tokens = queries[i % len(queries)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            with hot.acquire() as retriever:
+                if hasattr(retriever, "rank"):
+                    hits = retriever.rank(query_tokens, top_n=topk)
+                else:
+                    hits = retriever.search(" ".join(query_tokens), query_tokens=query_tokens, top_k=topk)
+                for hit in hits:        # lazy texts are read while the version is held
+                    _ = hit.snippet(width=100) if hasattr(hit, "snippet") else hit.bm25_text
+        except Exception as e:
+            errors.append(repr(e))
+            continue
+        records.append((start, time.perf_counter()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Swap index snapshots under query load and check nothing fails")
+    parser.add_argument("--threads", type=int, default=4, help="Query threads")
+    parser.add_argument("--swaps", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds between swaps")
+    parser.add_argument("--topk", type=int, default=10)
+    parser.add_argument("--dense", action="store_true", help="Serve a hybrid BM25 + dense retriever (loads DPR once)")
+    args = parser.parse_args()
+
+    # project root = IR_2025S/
+    root_dir = Path(__file__).resolve().parents[1]
+    processed_path = root_dir / "data" / "processed"
+    sources = default_sources(processed_path)
+    sources = {name: sources[name] for name in (("bm25", "dense", "corpus") if args.dense else ("bm25",)) if name in sources}
+
+    snapshot_root = Path(tempfile.mkdtemp(prefix="ir_snapshots_"))
+    try:
+        versions = [publish_snapshot(snapshot_root, sources, note="bench_hot_swap").version for _ in range(2)]
+        print(f"📦 Published {', '.join(versions)} to {snapshot_root}")
+
+        if args.dense:
+            from IR_2025S.hybrid_retriever import HybridRetriever
+            loader = functools.partial(HybridRetriever.from_snapshot, dense=True)
+        else:
+            loader = bm25_loader
+        hot = HotSwapRetriever(snapshot_root, loader)
+        with hot.acquire() as retriever:
+            queries = sample_queries(retriever if not args.dense else retriever.bm25_retriever, 500)
+
+        stop, records, errors = threading.Event(), [], []
+        threads = [threading.Thread(target=query_loop, args=(hot, queries, args.topk, stop, records, errors))
+                   for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+
+        swap_windows, swap_seconds = [], []
+        for i in range(args.swaps):
+            time.sleep(args.interval)
+            set_current(snapshot_root, versions[i % 2])
+            start = time.perf_counter()
+            hot.refresh()
+            end = time.perf_counter()
+            swap_windows.append((start, end))
+            swap_seconds.append(end - start)
+        time.sleep(args.interval)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        overlapped = np.array([end - start for start, end in records
+                               if any(start < w_end and end > w_start for w_start, w_end in swap_windows)]) * 1000
+        quiet = np.array([end - start for start, end in records
+                          if not any(start < w_end and end > w_start for w_start, w_end in swap_windows)]) * 1000
+        in_use = hot.versions_in_use()
+        hot.close()
+
+        print(f"\n🔁 {hot.swaps} swaps, load {np.mean(swap_seconds) * 1000:.1f} ms each on average")
+        print(f"🔎 {len(records)} queries on {args.threads} threads, {len(errors)} failed")
+        for name, latencies in (("during a swap", overlapped), ("otherwise", quiet)):
+            if len(latencies):
+                print(f"   {name:<14} {len(latencies):>7} queries  p50 {np.percentile(latencies, 50):.3f} ms"
+                      f"  p99 {np.percentile(latencies, 99):.3f} ms")
+        print(f"🧹 Versions held after the load stopped: {', '.join(in_use)} (only the active one expected)")
+        for error in errors[:5]:
+            print(f"   ⚠️ {error}")
+    finally:
+        shutil.rmtree(snapshot_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
+
+# python pipeline/bench_hot_swap.py --threads 4 --swaps 10
+# python pipeline/bench_hot_swap.py --dense
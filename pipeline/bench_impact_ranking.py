@@ -0,0 +1,92 @@
+# pipeline/bench_impact_ranking.py
+#
+import sys
+from pathlib import Path
+
+# Fix Python path to point to src/ folder where the IR_2025S module lives
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+import time
+import random
+import argparse
+import tempfile
+from IR_2025S.indexer import BooleanIndexerSQLite
+from IR_2025S.retriever import BM25RetrieverSQLite
+from bench_sqlite_readers import sample_queries
+
+
+def timed(fn, queries, topk):
+    results = []
+    start = time.perf_counter()
+    for query_tokens in queries:
+        results.append([hit.chapter_id for hit in fn(query_tokens, top_n=topk)])
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def build_synthetic_index(db_path, num_docs, bits, vocab_size=2000, seed=0):
+    """Index of `num_docs` chapters drawn from a Zipfian vocabulary, for posting lists longer than our corpus has."""
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(vocab_size)]
+    weights = [1 / (rank + 1) for rank in range(vocab_size)]
+    dataset = []
+    for i in range(num_docs):
+        book, chapter = i // 1000 + 1, i % 1000 + 1
+        tokens = rng.choices(words, weights, k=rng.randrange(50, 500))
+        dataset.append({"chapter_id": f"{book}_{chapter}", "book": f"Book {book}", "book_number": book,
+                        "chapter_int_number": chapter, "chapter_title": f"Chapter {chapter}",
+                        "text": " ".join(tokens), "tokens": tokens})
+    indexer = BooleanIndexerSQLite(db_path)
+    indexer.index_dataset(dataset)
+    indexer.build_impact_index(bits=bits)
+    indexer.close()
+
+
+def agreement(exact, approx):
+    """Mean top-k set overlap and fraction of queries with the identical ranked list."""
+    overlap = sum(len(set(e) & set(a)) / max(len(e), 1) for e, a in zip(exact, approx)) / len(exact)
+    same_order = sum(e == a for e, a in zip(exact, approx)) / len(exact)
+    return overlap, same_order
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and benchmark impact-ordered BM25 against exact BM25")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--topk", type=int, default=10)
+    parser.add_argument("--min-df", type=int, default=20, help="Only sample query terms with at least this df")
+    parser.add_argument("--synthetic-docs", type=int, default=0,
+                        help="Benchmark a synthetic index of this many chapters instead of data/processed")
+    parser.add_argument("--bits", type=int, default=16, help="Impact bits of the synthetic index")
+    args = parser.parse_args()
+
+    # project root = IR_2025S/
+    root_dir = Path(__file__).resolve().parents[1]
+    db_path = root_dir / "data" / "processed" / "boolean_index.db"
+    tmp_dir = None
+    if args.synthetic_docs:
+        tmp_dir = tempfile.TemporaryDirectory()
+        db_path = Path(tmp_dir.name) / "synthetic.db"
+        build_synthetic_index(db_path, args.synthetic_docs, args.bits)
+
+    retriever = BM25RetrieverSQLite(db_path)
+    queries = sample_queries(retriever, args.queries, min_df=args.min_df)
+
+    exact, exact_ms = timed(retriever.rank, queries, args.topk)
+    full, full_ms = timed(lambda q, top_n: retriever.rank_impact(q, top_n, early_termination=False), queries, args.topk)
+    saat, saat_ms = timed(retriever.rank_impact, queries, args.topk)
+    retriever.close()
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+    print(f"{'mode':<28}{'ms/query':>10}{'overlap@k':>12}{'same order':>12}")
+    print(f"{'exact BM25':<28}{exact_ms:>10.3f}{1.0:>12.3f}{1.0:>12.3f}")
+    for name, results, ms in (("impact, exhaustive", full, full_ms), ("impact, early termination", saat, saat_ms)):
+        overlap, same_order = agreement(exact, results)
+        print(f"{name:<28}{ms:>10.3f}{overlap:>12.3f}{same_order:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
+
+# python pipeline/03_build_boolean_index.py --impacts --impact-bits 16
+# python pipeline/bench_impact_ranking.py --topk 10
+# python pipeline/bench_impact_ranking.py --synthetic-docs 20000 --queries 300
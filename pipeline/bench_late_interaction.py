@@ -0,0 +1,72 @@
+# pipeline/bench_late_interaction.py
+#
+import sys
+from pathlib import Path
+
+# Fix Python path to point to src/ folder where the IR_2025S module lives
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+import time
+import argparse
+import tempfile
+from IR_2025S.dataset_utils import load_corpus
+from IR_2025S.dense_retriever import DenseRetrieverFAISS
+from IR_2025S.late_interaction import LateInteractionRetriever
+
+
+def time_queries(search, queries, top_k):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query, top_k=top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return sum(latencies) / len(latencies), latencies[max(0, int(len(latencies) * 0.95) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory and latency: late interaction vs the flat single-vector index")
+    parser.add_argument("--books", type=int, nargs="+", default=[1], help="Book numbers to index")
+    parser.add_argument("--model", type=str, default="facebook/dpr-ctx_encoder-single-nq-base")
+    parser.add_argument("--question-model", type=str, default="facebook/dpr-question_encoder-single-nq-base")
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--nbits", type=int, default=2)
+    parser.add_argument("--ncentroids", type=int, default=1024)
+    parser.add_argument("--topk", type=int, default=10)
+    args = parser.parse_args()
+
+    # project root = IR_2025S/
+    root_dir = Path(__file__).resolve().parents[1]
+    corpus = load_corpus(root_dir / "data" / "processed" / "corpus.arrow",
+                         columns=["chapter_id", "book", "book_number", "chapter_title", "text"]).to_pylist()
+    dataset = [{"doc_id": position, **entry} for position, entry in enumerate(corpus)
+               if int(entry["book_number"]) in args.books]
+    # chapter titles make a fixed, entity-heavy query set ("THE SORTING HAT", "NICOLAS FLAMEL", ...)
+    queries = [entry["chapter_title"].title() for entry in dataset]
+
+    dense = DenseRetrieverFAISS(model_name=args.model, question_model_name=args.question_model)
+    late = LateInteractionRetriever(dense, dim=args.dim, nbits=args.nbits, ncentroids=args.ncentroids)
+    with tempfile.TemporaryDirectory() as tmp:
+        dense.build_index(dataset, save_path=str(Path(tmp) / "flat"))
+        late.build_index(dataset, save_path=str(Path(tmp) / "late"))
+        late.load_index(str(Path(tmp) / "late"))      # search the memory-mapped arrays, like in production
+
+        flat_ms = time_queries(dense.search, queries, args.topk)
+        late_ms = time_queries(late.search, queries, args.topk)
+        sizes = late.footprint()
+
+    n_paragraphs = len(late.paragraph_metadata)
+    print(f"\n{n_paragraphs} paragraphs, {len(late.codes)} tokens, {len(queries)} queries")
+    print(f"{'index':<20}{'MB':>8}{'B/para':>9}{'ms/q':>8}{'p95':>8}")
+    print(f"{'flat single-vector':<20}{sizes['flat_single_vector'] / 2**20:>8.2f}"
+          f"{sizes['flat_single_vector'] / n_paragraphs:>9.0f}{flat_ms[0]:>8.2f}{flat_ms[1]:>8.2f}")
+    print(f"{'late interaction':<20}{sizes['total'] / 2**20:>8.2f}"
+          f"{sizes['total'] / n_paragraphs:>9.0f}{late_ms[0]:>8.2f}{late_ms[1]:>8.2f}")
+    print("   " + ", ".join(f"{name} {size / 2**20:.2f} MB" for name, size in sizes.items()
+                            if name not in ("total", "flat_single_vector")))
+
+
+if __name__ == "__main__":
+    main()
+
+# python pipeline/bench_late_interaction.py --books 1
@@ -0,0 +1,71 @@
+# pipeline/bench_memory.py
+#
+import sys
+from pathlib import Path
+
+# Fix Python path to point to src/ folder where the IR_2025S module lives
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+import argparse
+from IR_2025S.memory_report import MemoryProfiler, memory_step, format_report
+
+WARMUP_QUERIES = ["harry potter godfather", "dobby sock", "What is Hogwarts?", "who killed dumbledore"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory footprint of the loaded retrieval components")
+    parser.add_argument("--late-interaction", action="store_true", help="Also load the late-interaction index")
+    parser.add_argument("--expansion", action="store_true", help="Also load the expansion index")
+    parser.add_argument("--no-dense", action="store_true", help="Skip the DPR models and FAISS index (needs --expansion)")
+    parser.add_argument("--warmup", type=int, default=len(WARMUP_QUERIES),
+                        help="Queries run after loading, so that caches fill as in serving")
+    parser.add_argument("--budget-mb", type=float, default=None,
+                        help="Memory per node: estimate how many worker processes fit")
+    parser.add_argument("--no-trace", action="store_true",
+                        help="RSS and object sizes only; tracemalloc slows loading down several times")
+    parser.add_argument("--output", type=str, default=None, help="JSON report path (default data/processed/memory_report.json)")
+    args = parser.parse_args()
+
+    root = Path(__file__).resolve().parents[1]
+    processed = root / "data" / "processed"
+    output = Path(args.output) if args.output else processed / "memory_report.json"
+
+    with MemoryProfiler(trace=not args.no_trace) as profiler:
+        # imported inside the profiler so that the libraries' own import cost is part of the steps
+        with memory_step("import"):
+            from IR_2025S.hybrid_retriever import HybridRetriever
+            from IR_2025S.preprocessing import Preprocessor
+
+        preprocessor = Preprocessor(stopwords=True, lemmatize=True, preserve_punct=False)
+        retriever = HybridRetriever(
+            str(processed / "boolean_index.db"),
+            dense_index_path=None if args.no_dense else str(processed / "harry_dense_index"),
+            late_interaction_path=str(processed / "harry_late_index") if args.late_interaction else None,
+            expansion_index_path=str(processed / "expansion_index.db") if args.expansion else None,
+        )
+
+        with memory_step("warmup"):
+            for query in WARMUP_QUERIES[:args.warmup]:
+                retriever.search(query, query_tokens=preprocessor.preprocess_text(query), top_k=5)
+
+        profiler.measure("spacy", preprocessor.nlp)
+        profiler.measure_components("hybrid", retriever)
+
+    profiler.save(output)
+    report = profiler.report()
+    print(format_report(report))
+
+    if args.budget_mb:
+        # mapped file pages are shared by all workers on a node, the rest of the loaded RSS is per worker
+        mb = 1024 * 1024
+        private = max(report["rss"] - report["mapped_total"], 1)
+        workers = int((args.budget_mb * mb - report["mapped_total"]) // private)
+        print(f"👷 ~{private / mb:.0f} MB private per worker, {report['mapped_total'] / mb:.0f} MB shared: "
+              f"{max(workers, 0)} workers fit in {args.budget_mb:.0f} MB")
+    print(f"📁 Saved memory report to: {output}")
+
+
+if __name__ == "__main__":
+    main()
+
+# python pipeline/bench_memory.py --budget-mb 16000
@@ -0,0 +1,117 @@
+# pipeline/bench_result_objects.py
+#
+# Allocations per query of the result objects: SearchHit/ChapterHit/HybridHit handles against
+# the previous shapes (BM25 tuples with the chapter text, dense (score, metadata-copy) pairs,
+# hybrid dicts with eager snippets), rebuilt here from the same rankings the way the old code did.
+import sys
+from pathlib import Path
+
+# Fix Python path to point to src/ folder where the IR_2025S module lives
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+import gc
+import time
+import argparse
+import tracemalloc
+from IR_2025S.preprocessing import Preprocessor
+from IR_2025S.hybrid_retriever import HybridRetriever
+
+QUERIES = [
+    "harry potter godfather", "dobby sock", "What is Hogwarts?", "who killed dumbledore",
+    "the sorting hat", "quidditch world cup", "hagrid dragon egg", "the half-blood prince",
+]
+
+
+def legacy_bm25(bm25, query_tokens, top_k):
+    return [(hit.score, hit.chapter_id, hit.book, hit.chapter_title, bm25.fetch_text(hit.doc_id))
+            for hit in bm25.rank(query_tokens, top_n=top_k)]
+
+
+def legacy_dense(dense, query_embedding, top_k):
+    scores, indices = dense.faiss_index.search(query_embedding, top_k)
+    results = []
+    for score, idx in zip(scores[0], indices[0]):
+        if idx < len(dense.paragraph_metadata):
+            metadata = dense.paragraph_metadata[idx].copy()
+            metadata["paragraph_text"] = dense.paragraph_text(metadata)
+            results.append((float(score), metadata))
+    return results
+
+
+def legacy_hybrid(hybrid, query, query_tokens, top_k):
+    return [{
+        "doc_id": hit.doc_id,
+        "chapter_id": hit.chapter_id,
+        "combined_score": hit.score,
+        "bm25_score": hit.bm25_score,
+        "dense_score": hit.dense_score,
+        "bm25_text": hit.bm25_text,
+        "dense_text": hit.dense_text,
+    } for hit in hybrid.search(query, query_tokens=query_tokens, top_k=top_k)]
+
+
+def measure(run, inputs, repeats):
+    """Mean retained blocks and bytes held by one query's results, peak traced bytes and latency."""
+    for item in inputs:     # warm statement, text and snippet caches first
+        run(item)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for item in inputs:
+            run(item)
+    latency_us = (time.perf_counter() - start) * 1e6 / (repeats * len(inputs))
+
+    gc.collect()
+    tracemalloc.start()
+    blocks = retained = peak = 0
+    for item in inputs:
+        blocks_before = sys.getallocatedblocks()
+        traced_before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = run(item)
+        traced_after, traced_peak = tracemalloc.get_traced_memory()
+        blocks += sys.getallocatedblocks() - blocks_before
+        retained += traced_after - traced_before
+        peak += traced_peak - traced_before
+        del result
+    tracemalloc.stop()
+    n = len(inputs)
+    return blocks / n, retained / n, peak / n, latency_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Allocations per query: result handles vs the previous result shapes")
+    parser.add_argument("--topk", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=20, help="Timed passes over the queries")
+    args = parser.parse_args()
+
+    root = Path(__file__).resolve().parents[1]
+    processed = root / "data" / "processed"
+    hybrid = HybridRetriever(str(processed / "boolean_index.db"), str(processed / "harry_dense_index"))
+    bm25, dense = hybrid.bm25_retriever, hybrid.dense_retriever
+
+    preprocessor = Preprocessor(stopwords=True, lemmatize=True, preserve_punct=False)
+    queries = [(query, preprocessor.preprocess_text(query)) for query in QUERIES]
+    embeddings = [dense.encode_query(query) for query in QUERIES]   # encoding is the same for both shapes
+    topk = args.topk
+
+    cases = [
+        ("bm25", "tuples + text", lambda q: legacy_bm25(bm25, q[1], topk), queries),
+        ("bm25", "ChapterHit", lambda q: bm25.rank(q[1], top_n=topk), queries),
+        ("dense", "(score, dict)", lambda e: legacy_dense(dense, e, topk), embeddings),
+        ("dense", "SearchHit", lambda e: dense.search_embedding(e, topk), embeddings),
+        ("hybrid", "dicts + snippets", lambda q: legacy_hybrid(hybrid, q[0], q[1], topk), queries),
+        ("hybrid", "HybridHit", lambda q: hybrid.search(q[0], query_tokens=q[1], top_k=topk), queries),
+    ]
+
+    print(f"\n{'retriever':<10}{'result shape':<18}{'blocks/query':>14}{'retained KB':>13}{'peak KB':>10}{'µs/query':>11}")
+    for retriever, shape, run, inputs in cases:
+        blocks, retained, peak, latency = measure(run, inputs, args.repeats)
+        print(f"{retriever:<10}{shape:<18}{blocks:>14.0f}{retained / 1024:>13.1f}{peak / 1024:>10.1f}{latency:>11.0f}")
+    hybrid.close()
+
+
+if __name__ == "__main__":
+    main()
+
+# python pipeline/bench_result_objects.py --topk 10
@@ -0,0 +1,82 @@
+# pipeline/bench_segmentation.py
+#
+import sys
+from pathlib import Path
+
+# Fix Python path to point to src/ folder where the IR_2025S module lives
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+import re
+import time
+import argparse
+import tracemalloc
+from IR_2025S.dataset_utils import load_corpus
+from IR_2025S.segmentation import iter_segment_spans, tokenize
+
+
+def split_legacy(text):
+    """The previous DenseRetrieverFAISS._split_into_paragraphs, minus its print."""
+    sentences = re.split(r'(?<=[.!?])\s+(?=[A-Z“"])', text.strip())
+    return [s.strip().replace('\n', ' ') for s in sentences if len(s.strip()) > 20]
+
+
+def tokenize_legacy(text):
+    """The previous Preprocessor.tokenize."""
+    spaced = re.sub(r"([^\w\s])", r" \1 ", text)
+    spaced = re.sub(r"\s{2,}", " ", spaced)
+    return spaced.strip().split()
+
+
+def spans_only(text):
+    return list(iter_segment_spans(text))
+
+
+def measure(fn, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+
+    # peak of the largest single call: what one chapter allocates on top of its text
+    peak = 0
+    for text in texts:
+        tracemalloc.start()
+        fn(text)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Segmentation and tokenization over the whole corpus")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # project root = IR_2025S/
+    root_dir = Path(__file__).resolve().parents[1]
+    texts = load_corpus(root_dir / "data" / "processed" / "corpus.arrow", columns=["text"]).column("text").to_pylist()
+    corpus_mb = sum(len(t.encode("utf-8")) for t in texts) / 2**20
+
+    # the new code must produce exactly what the old one did
+    for text in texts:
+        assert tokenize(text) == tokenize_legacy(text)
+        assert [text[s:e].replace("\n", " ") for s, e in iter_segment_spans(text)] == split_legacy(text)
+
+    print(f"corpus: {len(texts)} chapters, {corpus_mb:.1f} MB")
+    print(f"{'stage':<30}{'s':>8}{'MB/s':>9}{'peak KB':>10}")
+    for name, fn in [
+        ("segment: re.split + strip", split_legacy),
+        ("segment: offsets", spans_only),
+        ("tokenize: 2x re.sub + split", tokenize_legacy),
+        ("tokenize: single pass", tokenize),
+    ]:
+        seconds, peak = measure(fn, texts, args.repeat)
+        print(f"{name:<30}{seconds:>8.3f}{corpus_mb / seconds:>9.1f}{peak / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
+
+# python pipeline/bench_segmentation.py
@@ -0,0 +1,60 @@
+# pipeline/bench_shard_scaling.py
+#
+import sys
+from pathlib import Path
+
+# Fix Python path to point to src/ folder where the IR_2025S module lives
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+import time
+import argparse
+import tempfile
+from IR_2025S.dataset_utils import iter_corpus_records, load_vocabulary
+from IR_2025S.retriever import BM25RetrieverSQLite
+from IR_2025S.sharding import build_bm25_shards, ShardedSearcher
+from bench_sqlite_readers import sample_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 scatter-gather scaling over shard counts")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 7])
+    parser.add_argument("--scheme", choices=["book", "hash"], default="hash")
+    parser.add_argument("--executor", choices=["process", "thread"], default="process")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--topk", type=int, default=10)
+    args = parser.parse_args()
+
+    # project root = IR_2025S/
+    root_dir = Path(__file__).resolve().parents[1]
+    processed_path = root_dir / "data" / "processed"
+    dataset = list(iter_corpus_records(
+        processed_path / "corpus_preprocessed.arrow",
+        vocabulary=load_vocabulary(processed_path / "vocab.arrow")
+    ))
+
+    # reference ranking from the single, unsharded index
+    reference = BM25RetrieverSQLite(processed_path / "boolean_index.db")
+    queries = sample_queries(reference, args.queries)
+    expected = [[hit.chapter_id for hit in reference.rank(q, top_n=args.topk)] for q in queries]
+    reference.close()
+
+    print(f"{'shards':>6}{'qps':>10}{'ms/query':>10}{'same top-k':>12}")
+    for num_shards in args.shards:
+        with tempfile.TemporaryDirectory() as shard_dir:
+            build_bm25_shards(dataset, shard_dir, num_shards, scheme=args.scheme)
+            searcher = ShardedSearcher(shard_dir, executor=args.executor)
+            searcher.rank(queries[0], top_n=args.topk)      # start workers, open shards
+
+            start = time.perf_counter()
+            results = [[hit.chapter_id for hit in searcher.rank(q, top_n=args.topk)] for q in queries]
+            elapsed = time.perf_counter() - start
+            searcher.close()
+
+        agreement = sum(r == e for r, e in zip(results, expected)) / len(queries)
+        print(f"{num_shards:>6}{len(queries) / elapsed:>10.1f}{elapsed / len(queries) * 1000:>10.2f}{agreement:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
+
+# python pipeline/bench_shard_scaling.py --shards 1 2 4 7 --scheme hash
@@ -0,0 +1,69 @@
+# pipeline/bench_sqlite_readers.py
+#
+import sys
+from pathlib import Path
+
+# Fix Python path to point to src/ folder where the IR_2025S module lives
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from IR_2025S.retriever import BM25RetrieverSQLite
+
+
+def sample_queries(retriever, n_queries, max_len=3, min_df=2, seed=13):
+    """Draws random multi-token queries from the index vocabulary."""
+    tokens = [row[0] for row in retriever.conn.execute(
+        "SELECT token FROM vocabulary WHERE document_frequency >= ?", (min_df,)
+    ).fetchall()]
+    rng = random.Random(seed)
+    return [rng.sample(tokens, rng.randint(1, max_len)) for _ in range(n_queries)]
+
+
+def run(retriever, queries, threads, topk):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(lambda q: timed_rank(retriever, q, topk), queries))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"threads={threads:<3} qps={len(queries) / elapsed:8.1f}  p50={p50:6.2f} ms  p95={p95:6.2f} ms")
+
+
+def timed_rank(retriever, query_tokens, topk):
+    start = time.perf_counter()
+    retriever.rank_with_scores(query_tokens, top_n=topk)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BM25 retrieval under concurrent readers")
+    parser.add_argument("--queries", type=int, default=2000, help="Number of queries per run")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8], help="Reader thread counts")
+    parser.add_argument("--topk", type=int, default=10)
+    args = parser.parse_args()
+
+    # project root = IR_2025S/
+    root_dir = Path(__file__).resolve().parents[1]
+    db_path = root_dir / "data" / "processed" / "boolean_index.db"
+
+    retriever = BM25RetrieverSQLite(db_path)
+    queries = sample_queries(retriever, args.queries)
+
+    # warm up page cache / mmap
+    run(retriever, queries[:200], 1, args.topk)
+    print()
+    for threads in args.threads:
+        run(retriever, queries, threads, args.topk)
+
+    retriever.close()
+
+
+if __name__ == "__main__":
+    main()
+
+# python pipeline/bench_sqlite_readers.py --threads 1 2 4 8
@@ -0,0 +1,100 @@
+# pipeline/bench_startup.py
+#
+# Startup cost of the entry points, each in a fresh interpreter: wall time of `--help`, wall time
+# to the first printed result, and what `python -X importtime` attributes the import time to.
+import sys
+from pathlib import Path
+
+# Fix Python path to point to src/ folder where the IR_2025S module lives
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+import os
+import time
+import argparse
+import subprocess
+
+ROOT = Path(__file__).resolve().parents[1]
+HEAVY = ("torch", "transformers", "faiss", "sklearn", "spacy", "datasets")
+
+ENTRY_POINTS = {
+    "bm25": ["pipeline/04_query_bm25.py", "dobby sock"],
+    "bm25+rm3": ["pipeline/04_query_bm25.py", "dobby sock", "--rm3"],
+    "dense": ["pipeline/07_dense_query.py", "What is Hogwarts?"],
+    "hybrid": ["pipeline/08_hybrid.py", "harry potter godfather"],
+    "hybrid+expanded": ["pipeline/08_hybrid.py", "harry potter godfather", "--expansion"],
+}
+
+MODULES = ["retriever", "preprocessing", "hybrid_retriever", "expansion", "dense_retriever",
+           "late_interaction", "reranker", "build_pipeline", "sharding"]
+
+
+def run(argv, importtime=False):
+    """
+    Runs one interpreter; returns (seconds, return code, {module: cumulative µs}). Nested imports
+    are keyed with a leading space, so top-level modules are the keys without one.
+    """
+    env = dict(os.environ, PYTHONPATH=str(ROOT / "src"))
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + argv
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    seconds = time.perf_counter() - start
+    imports = {}
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package", nesting shown by indentation
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        nested = name.startswith("  ")       # already counted in the cumulative time of their parent
+        imports[(" " if nested else "") + name.strip()] = int(cumulative)
+    return seconds, proc.returncode, imports
+
+
+def top_level(imports):
+    return {name: us for name, us in imports.items() if not name.startswith(" ")}
+
+
+def heavy_of(imports):
+    names = {name.strip() for name in imports}
+    return ",".join(name for name in HEAVY if name in names) or "-"
+
+
+def best_of(argv, repeats):
+    """Fastest of `repeats` runs (warm OS file cache), then one -X importtime run for the breakdown."""
+    seconds, code = min((run(argv)[:2] for _ in range(repeats)), key=lambda r: r[0])
+    _, _, imports = run(argv, importtime=True)
+    return seconds, code, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time and import cost of the entry points")
+    parser.add_argument("--entry", action="append", choices=sorted(ENTRY_POINTS), help="Entry points to run (default all)")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per measurement, the fastest is kept")
+    parser.add_argument("--top", type=int, default=5, help="Slowest top-level imports listed per entry point")
+    parser.add_argument("--modules", action="store_true", help="Also time `import IR_2025S.<module>` for each module")
+    args = parser.parse_args()
+
+    print(f"\n{'entry point':<18}{'--help s':>9}{'first result s':>16}{'imports s':>11}  heavy libraries imported")
+    breakdown = {}
+    for name in args.entry or ENTRY_POINTS:
+        argv = ENTRY_POINTS[name]
+        help_seconds, _, _ = best_of([argv[0], "--help"], args.repeats)
+        seconds, code, imports = best_of(argv, args.repeats)
+        breakdown[name] = imports
+        result = f"{seconds:>16.2f}" if code == 0 else f"{'failed (' + str(code) + ')':>16}"
+        print(f"{name:<18}{help_seconds:>9.2f}{result}{sum(top_level(imports).values()) / 1e6:>11.2f}  {heavy_of(imports)}")
+
+    for name, imports in breakdown.items():
+        slowest = sorted(top_level(imports).items(), key=lambda item: -item[1])[:args.top]
+        print(f"\n⏱️ {name}: " + ", ".join(f"{module} {us / 1e6:.2f}s" for module, us in slowest))
+
+    if args.modules:
+        print(f"\n{'module':<30}{'import s':>9}  heavy libraries imported")
+        for module in MODULES:
+            seconds, _, imports = best_of(["-c", f"import IR_2025S.{module}"], args.repeats)
+            print(f"{'IR_2025S.' + module:<30}{seconds:>9.2f}  {heavy_of(imports)}")
+
+
+if __name__ == "__main__":
+    main()
+
+# python pipeline/bench_startup.py --modules
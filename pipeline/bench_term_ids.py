@@ -0,0 +1,113 @@
+# pipeline/bench_term_ids.py
+#
+import sys
+from pathlib import Path
+
+# Fix Python path to point to src/ folder where the IR_2025S module lives
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+import time
+import heapq
+import sqlite3
+import argparse
+import tempfile
+from collections import Counter, defaultdict
+from IR_2025S.dataset_utils import iter_corpus_records, load_vocabulary
+from IR_2025S.indexer import BooleanIndexerSQLite
+from IR_2025S.retriever import BM25RetrieverSQLite, bm25_idf, bm25_tf
+from bench_sqlite_readers import sample_queries
+
+
+def build_string_keyed(dataset, db_path):
+    """The previous layout: postings, vocabulary and chapters keyed by TEXT token / chapter_id."""
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("CREATE TABLE chapters (chapter_id TEXT PRIMARY KEY, doc_length INTEGER);")
+        conn.execute("""
+            CREATE TABLE inverted_index (
+                token TEXT, chapter_id TEXT, frequency INTEGER, PRIMARY KEY (token, chapter_id)
+            ) WITHOUT ROWID;
+        """)
+        conn.execute("CREATE TABLE vocabulary (token TEXT PRIMARY KEY, document_frequency INTEGER);")
+        dfs = Counter()
+        for entry in dataset:
+            counts = Counter(entry["tokens"])
+            dfs.update(counts.keys())
+            conn.execute("INSERT INTO chapters VALUES (?, ?)", (entry["chapter_id"], len(entry["tokens"])))
+            conn.executemany("INSERT INTO inverted_index VALUES (?, ?, ?)",
+                             ((token, entry["chapter_id"], freq) for token, freq in counts.items()))
+        conn.executemany("INSERT INTO vocabulary VALUES (?, ?)", dfs.items())
+    return conn
+
+
+def rank_string_keyed(conn, doc_lengths, N, avgdl, query_tokens, top_n, k1=1.5, b=0.75):
+    scores = defaultdict(float)
+    for token in query_tokens:
+        row = conn.execute("SELECT document_frequency FROM vocabulary WHERE token = ?", (token,)).fetchone()
+        if not row:
+            continue
+        idf = bm25_idf(N, row[0])
+        for chapter_id, freq in conn.execute(
+                "SELECT chapter_id, frequency FROM inverted_index WHERE token = ?", (token,)):
+            scores[chapter_id] += idf * bm25_tf(freq, doc_lengths[chapter_id], avgdl, k1, b)
+    return heapq.nlargest(top_n, scores.items(), key=lambda x: x[1])
+
+
+def table_bytes(conn, tables):
+    rows = conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall()
+    return sum(size for name, size in rows if any(name == t or name.endswith(f"_{t}_1") for t in tables))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index size and BM25 latency: string keys vs integer ids")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--topk", type=int, default=10)
+    args = parser.parse_args()
+
+    # project root = IR_2025S/
+    root_dir = Path(__file__).resolve().parents[1]
+    processed_path = root_dir / "data" / "processed"
+    dataset = list(iter_corpus_records(
+        processed_path / "corpus_preprocessed.arrow",
+        columns=["chapter_id", "book", "chapter_title", "text", "token_ids"],
+        vocabulary=load_vocabulary(processed_path / "vocab.arrow")
+    ))
+    tables = ("inverted_index", "vocabulary")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = build_string_keyed(dataset, Path(tmp) / "strings.db")
+        doc_lengths = dict(legacy.execute("SELECT chapter_id, doc_length FROM chapters").fetchall())
+        N, avgdl = len(doc_lengths), sum(doc_lengths.values()) / len(doc_lengths)
+
+        indexer = BooleanIndexerSQLite(Path(tmp) / "ids.db")
+        indexer.index_dataset(dataset)
+        indexer.close()
+        retriever = BM25RetrieverSQLite(Path(tmp) / "ids.db")
+
+        queries = sample_queries(retriever, args.queries)
+
+        start = time.perf_counter()
+        for query_tokens in queries:
+            rank_string_keyed(legacy, doc_lengths, N, avgdl, query_tokens, args.topk)
+        legacy_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+        start = time.perf_counter()
+        for query_tokens in queries:
+            # scoring only, like the string-keyed ranker (no metadata lookups)
+            heapq.nlargest(args.topk, retriever.score_documents(query_tokens).items(), key=lambda x: x[1])
+        ids_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+        legacy_size = table_bytes(legacy, tables)
+        ids_size = table_bytes(retriever.conn, tables)
+        legacy.close()
+        retriever.close()
+
+    print(f"{'layout':<14}{'postings+vocab':>16}{'ms/query':>10}")
+    print(f"{'string keys':<14}{legacy_size / 2**20:>13.2f} MB{legacy_ms:>10.3f}")
+    print(f"{'integer ids':<14}{ids_size / 2**20:>13.2f} MB{ids_ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
+
+# python pipeline/bench_term_ids.py
@@ -0,0 +1,56 @@
+# pipeline/build_all.py
+#
+# One-pass alternative to running 01, 02, 03 and 06 in sequence: the stages run concurrently
+# on streamed chapters, see IR_2025S.build_pipeline.
+import sys
+from pathlib import Path
+
+# Fix Python path to point to src/ folder where the IR_2025S module lives
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+import argparse
+from IR_2025S.build_pipeline import StreamingIndexBuilder, format_metrics
+from IR_2025S.snapshots import default_sources, publish_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build corpus, BM25 and dense indexes in one streaming pass")
+    parser.add_argument("--no-dense", action="store_true", help="Skip DPR encoding and the FAISS index")
+    parser.add_argument("--impacts", action="store_true", help="Also store quantized BM25 impacts for rank_impact()")
+    parser.add_argument("--k1", type=float, default=1.5, help="BM25 k1 used for the impact index")
+    parser.add_argument("--b", type=float, default=0.75, help="BM25 b used for the impact index")
+    parser.add_argument("--impact-bits", type=int, default=12, help="Quantization bits per impact")
+    parser.add_argument("--queue-size", type=int, default=8, help="Chapters buffered between two stages")
+    parser.add_argument("--keep-checkpoint", action="store_true",
+                        help="Keep the spooled tokens/embeddings after a successful build")
+    parser.add_argument("--publish", action="store_true",
+                        help="Publish the new indexes as a snapshot version and make it CURRENT (see 12_publish_snapshot.py)")
+    args = parser.parse_args()
+
+    # project root = IR_2025S/
+    root_dir = Path(__file__).resolve().parents[1]  # IR_2025S/
+    raw_path = root_dir / "data" / "raw"
+    processed_path = root_dir / "data" / "processed"
+
+    builder = StreamingIndexBuilder(
+        raw_path, processed_path,
+        dense=not args.no_dense,
+        impacts=args.impacts, k1=args.k1, b=args.b, impact_bits=args.impact_bits,
+        queue_size=args.queue_size,
+        keep_checkpoint=args.keep_checkpoint,
+    )
+    report = builder.run()
+
+    print(format_metrics(report))
+    print(f"✅ Indexes saved to: {processed_path} (stage metrics in build_metrics.json)")
+    if args.publish:
+        snapshot = publish_snapshot(processed_path / "snapshots", default_sources(processed_path), note="build_all")
+        print(f"📦 Published snapshot {snapshot.version}, CURRENT -> {snapshot.version}")
+
+
+if __name__ == "__main__":
+    main()
+
+# python pipeline/build_all.py
+# python pipeline/build_all.py --publish      running HotSwapRetrievers switch on their next refresh()
+# an interrupted build resumes from data/processed/build_checkpoint when rerun with the same settings
@@ -0,0 +1,418 @@
+# IR_2025S/build_pipeline.py
+#
+# Streaming build of all indexes from the raw books in a single pass. Instead of running
+# 01 -> 02 -> 03 -> 06 one after another (each reading the previous stage's file back in full),
+# every chapter flows through concurrent stages connected by bounded queues:
+#
+#   parse ──┬─> preprocess (spaCy) ──> index (SQLite insert)
+#           └─> encode (DPR) ─────────> faiss_add
+#
+# Each stage runs its blocking work on a dedicated thread (SQLite connections and models stay
+# on one thread); the stages overlap because tokenization, torch and sqlite spend most of their
+# time outside the GIL. A full queue blocks its producer, so memory stays bounded by
+# `queue_size` chapters per edge. The outputs are the same files the stage scripts write.
+#
+# Preprocessed tokens and paragraph embeddings are spooled to a checkpoint directory as they are
+# produced; an interrupted build rerun with the same settings reuses them and only the cheap
+# stages (parsing, inserts, FAISS add) are repeated.
+
+import asyncio
+import json
+import os
+import shutil
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+from IR_2025S.dataset_utils import CorpusWriter, save_vocabulary
+from IR_2025S.indexer import BooleanIndexerSQLite
+from IR_2025S.load_books import iter_chapters_from_txt
+
+_DONE = object()    # end-of-stream marker passed down every queue
+
+
+class StageMetrics:
+    """Counters of one stage: items processed, time working, time blocked on its input and output queues."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.cached = 0         # items served from the checkpoint
+        self.busy_s = 0.0
+        self.wait_in_s = 0.0    # starved: upstream is the bottleneck
+        self.wait_out_s = 0.0   # blocked: downstream is the bottleneck
+        self.started = None
+        self.finished = None
+
+    @property
+    def wall_s(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def to_dict(self):
+        wall = self.wall_s
+        return {
+            "items": self.items,
+            "cached": self.cached,
+            "busy_s": round(self.busy_s, 3),
+            "wait_in_s": round(self.wait_in_s, 3),
+            "wait_out_s": round(self.wait_out_s, 3),
+            "wall_s": round(wall, 3),
+            "items_per_s": round(self.items / wall, 2) if wall else None,
+            "utilization": round(self.busy_s / wall, 3) if wall else None,
+        }
+
+
+class BuildCheckpoint:
+    """
+    Append-only spools of the expensive stage outputs, keyed by chapter_id and a checksum of the
+    chapter text: tokens.jsonl (preprocessed tokens and their offsets) and embeddings.f32 + embeddings.jsonl
+    (normalized paragraph embeddings and their row ranges). Each spool is discarded when the
+    settings it was produced with (`config`) change. Records torn by an interrupted build are cut
+    off on open, so appends continue from the last complete one.
+    """
+
+    def __init__(self, directory, config):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.tokens_path = self.directory / "tokens.jsonl"
+        self.embeddings_path = self.directory / "embeddings.f32"
+        self.embedding_rows_path = self.directory / "embeddings.jsonl"
+
+        config_path = self.directory / "config.json"
+        previous = json.loads(config_path.read_text()) if config_path.exists() else {}
+        if previous.get("tokens") != config.get("tokens"):
+            self.tokens_path.unlink(missing_ok=True)
+        if previous.get("embeddings") != config.get("embeddings"):
+            self.embeddings_path.unlink(missing_ok=True)
+            self.embedding_rows_path.unlink(missing_ok=True)
+        config_path.write_text(json.dumps(config, indent=2))
+
+        self.dim = config.get("embeddings", {}).get("dim")
+        self._next_row = 0
+        for path in (self.tokens_path, self.embedding_rows_path):
+            self._truncate_torn_line(path)
+        if self.dim and self.embeddings_path.exists():
+            # a partial row would shift every row appended after it
+            self._next_row = self.embeddings_path.stat().st_size // (4 * self.dim)
+            os.truncate(self.embeddings_path, self._next_row * 4 * self.dim)
+
+        self.tokens = {key: (tokens, offsets) for key, tokens, offsets in self._read_lines(self.tokens_path)}
+        self.embedding_rows = {key: rows for key, rows in self._read_lines(self.embedding_rows_path)
+                               if rows[1] <= self._next_row}
+        self._embeddings = None
+        self._tokens_file = self.tokens_path.open("a", encoding="utf-8")
+        self._embeddings_file = self.embeddings_path.open("ab")
+        self._embedding_rows_file = self.embedding_rows_path.open("a", encoding="utf-8")
+
+    @staticmethod
+    def _truncate_torn_line(path, chunk_size=1 << 16):
+        """Cuts a spool back to its last complete line (one ending in a newline)."""
+        if not path.exists():
+            return
+        with path.open("rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - chunk_size)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b"\n")
+                if newline >= 0:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                f.truncate(position)
+
+    @staticmethod
+    def _read_lines(path):
+        if not path.exists():
+            return
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:    # damaged record; the ones after it are still valid
+                    continue
+
+    @staticmethod
+    def key(entry):
+        return f"{entry['chapter_id']}:{zlib.crc32(entry['text'].encode('utf-8')):08x}"
+
+    def get_tokens(self, key):
+        return self.tokens.get(key)
+
+    def put_tokens(self, key, tokens, offsets=None):
+        self._tokens_file.write(json.dumps([key, tokens, offsets], ensure_ascii=False) + "\n")
+        self._tokens_file.flush()
+
+    def get_embeddings(self, key):
+        rows = self.embedding_rows.get(key)
+        if rows is None:
+            return None
+        if self._embeddings is None:
+            self._embeddings = np.memmap(self.embeddings_path, dtype=np.float32, mode="r").reshape(-1, self.dim)
+        start, end = rows
+        return np.array(self._embeddings[start:end])
+
+    def put_embeddings(self, key, embeddings):
+        # data first, then the row range: a range on disk always points at complete rows
+        self._embeddings_file.write(np.ascontiguousarray(embeddings, dtype=np.float32).tobytes())
+        self._embeddings_file.flush()
+        start, self._next_row = self._next_row, self._next_row + len(embeddings)
+        self._embedding_rows_file.write(json.dumps([key, [start, self._next_row]]) + "\n")
+        self._embedding_rows_file.flush()
+
+    def close(self):
+        self._embeddings = None
+        for f in (self._tokens_file, self._embeddings_file, self._embedding_rows_file):
+            f.close()
+
+    def remove(self):
+        self.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class StreamingIndexBuilder:
+    """
+    Builds corpus.arrow, dataset.jsonl, corpus_preprocessed.arrow, vocab.arrow, boolean_index.db
+    and the dense FAISS index (harry_dense_index) in `output_dir` from the books in `raw_path`.
+
+    Term ids are assigned in first-seen order while chapters stream in, so vocab.arrow is not
+    sorted as in the batch build; BM25 results are identical. `preprocessor` and
+    `dense_retriever` default to the models of the stage scripts; pass `dense=False` to skip
+    the dense branch.
+    """
+
+    def __init__(self, raw_path, output_dir, preprocessor=None, dense_retriever=None, dense=True,
+                 impacts=False, k1=1.5, b=0.75, impact_bits=12,
+                 queue_size=8, checkpoint_dir=None, keep_checkpoint=False):
+        self.raw_path = Path(raw_path)
+        self.output_dir = Path(output_dir)
+        self.impacts = impacts
+        self.impact_params = {"k1": k1, "b": b, "bits": impact_bits}
+        self.queue_size = queue_size
+        self.keep_checkpoint = keep_checkpoint
+
+        if preprocessor is None:
+            from IR_2025S.preprocessing import Preprocessor
+            preprocessor = Preprocessor(stopwords=True, lemmatize=True, preserve_punct=False)
+        self.preprocessor = preprocessor
+        if dense and dense_retriever is None:
+            from IR_2025S.dense_retriever import DenseRetrieverFAISS
+            dense_retriever = DenseRetrieverFAISS()
+        self.dense_retriever = dense_retriever if dense else None
+
+        config = {"tokens": {
+            "preprocessor": type(preprocessor).__name__,
+            **{name: getattr(preprocessor, name, None) for name in ("remove_stopwords", "lemmatize", "preserve_punct")},
+            "offsets": hasattr(preprocessor, "preprocess_with_offsets"),
+        }}
+        if self.dense_retriever is not None:
+            config["embeddings"] = {"model": self.dense_retriever.model_name, "dim": self.dense_retriever.embedding_dim}
+        self.checkpoint = BuildCheckpoint(checkpoint_dir or self.output_dir / "build_checkpoint", config)
+
+        stages = ["parse", "preprocess", "index"] + (["encode", "faiss_add"] if self.dense_retriever else [])
+        self.metrics = {name: StageMetrics(name) for name in stages}
+        self._executors = {name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=name) for name in stages}
+
+    # --- stage work, each called on its stage's own thread ---
+
+    def _open_parse(self):
+        self._chapters = enumerate(iter_chapters_from_txt(self.raw_path))
+        self._corpus = CorpusWriter(self.output_dir / "corpus.arrow")
+        self._jsonl = (self.output_dir / "dataset.jsonl").open("w", encoding="utf-8")
+
+    def _parse(self):
+        doc_id, entry = next(self._chapters, (None, _DONE))
+        if entry is _DONE:
+            self._corpus.close()
+            self._jsonl.close()
+            return _DONE
+        self._corpus.write(entry)
+        self._jsonl.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        entry["doc_id"] = doc_id    # not stored: it is the row number
+        return entry
+
+    def _preprocess(self, entry):
+        key = self.checkpoint.key(entry)
+        cached = self.checkpoint.get_tokens(key)
+        if cached is None:
+            if hasattr(self.preprocessor, "preprocess_with_offsets"):
+                tokens, offsets = self.preprocessor.preprocess_with_offsets(entry["text"])
+            else:
+                tokens, offsets = self.preprocessor.preprocess_text(entry["text"]), None
+            self.checkpoint.put_tokens(key, tokens, offsets)
+        else:
+            tokens, offsets = cached
+            self.metrics["preprocess"].cached += 1
+        return {**entry, "tokens": tokens, "token_offsets": offsets}
+
+    def _open_index(self):
+        # created on the index thread: a sqlite3 connection may only be used by its creating thread
+        self._indexer = BooleanIndexerSQLite(self.output_dir / "boolean_index.db")
+        self._preprocessed = CorpusWriter(self.output_dir / "corpus_preprocessed.arrow", tokenized=True)
+        self._vocabulary = []
+        self._token_to_id = {}
+        self._document_frequencies = Counter()
+
+    def _index(self, entry):
+        token_to_id = self._token_to_id
+        term_ids = []
+        for token in entry["tokens"]:
+            term_id = token_to_id.get(token)
+            if term_id is None:
+                term_id = token_to_id[token] = len(self._vocabulary)
+                self._vocabulary.append(token)
+            term_ids.append(term_id)
+
+        with self._indexer.conn:
+            self._document_frequencies.update(
+                self._indexer.add_chapter(entry["doc_id"], entry, term_ids, self._vocabulary)
+            )
+        self._preprocessed.write({**entry, "token_ids": term_ids})
+
+    def _close_index(self):
+        with self._indexer.conn:
+            self._indexer.write_vocabulary(self._vocabulary, self._document_frequencies)
+        if self.impacts:
+            self._indexer.build_impact_index(**self.impact_params)
+        self._indexer.close()
+        self._preprocessed.close()
+        save_vocabulary(self._vocabulary, self.output_dir / "vocab.arrow")
+
+    def _encode(self, entry):
+        import faiss        # dense stages only; a BM25-only build never imports it
+        texts, metadata = self.dense_retriever.split_dataset([entry])
+        key = self.checkpoint.key(entry)
+        embeddings = self.checkpoint.get_embeddings(key)
+        if embeddings is None or len(embeddings) != len(texts):
+            embeddings = self.dense_retriever._encode_text(texts) if texts else \
+                np.zeros((0, self.dense_retriever.embedding_dim), dtype=np.float32)
+            faiss.normalize_L2(embeddings)
+            self.checkpoint.put_embeddings(key, embeddings)
+        else:
+            self.metrics["encode"].cached += 1
+        return metadata, embeddings
+
+    def _open_faiss(self):
+        import faiss
+        self._faiss_index = faiss.IndexFlatIP(self.dense_retriever.embedding_dim)
+        self._paragraph_metadata = []
+
+    def _faiss_add(self, item):
+        metadata, embeddings = item
+        offset = len(self._paragraph_metadata)
+        for paragraph in metadata:
+            paragraph["global_idx"] += offset   # split_dataset numbered them within the chapter
+        self._paragraph_metadata.extend(metadata)
+        self._faiss_index.add(embeddings)
+
+    def _close_faiss(self):
+        dense = self.dense_retriever
+        dense.faiss_index = self._faiss_index
+        dense.paragraph_metadata = self._paragraph_metadata
+        dense.corpus_path = self.output_dir / "corpus.arrow"
+        if dense.query_cache is not None:
+            dense.query_cache.clear()
+        dense.save_index(self.output_dir / "harry_dense_index")
+
+    # --- orchestration ---
+
+    async def _call(self, name, work, *args):
+        metrics = self.metrics[name]
+        start = time.perf_counter()
+        result = await asyncio.get_running_loop().run_in_executor(self._executors[name], work, *args)
+        metrics.busy_s += time.perf_counter() - start
+        return result
+
+    async def _emit(self, name, outboxes, item):
+        start = time.perf_counter()
+        for queue in outboxes:
+            await queue.put(item)
+        self.metrics[name].wait_out_s += time.perf_counter() - start
+
+    async def _source(self, name, open_, work, outboxes):
+        metrics = self.metrics[name]
+        metrics.started = time.perf_counter()
+        await self._call(name, open_)
+        while True:
+            item = await self._call(name, work)
+            if item is _DONE:
+                break
+            metrics.items += 1
+            await self._emit(name, outboxes, item)
+        metrics.finished = time.perf_counter()
+        await self._emit(name, outboxes, _DONE)
+
+    async def _stage(self, name, inbox, work, outboxes=(), open_=None, close=None):
+        metrics = self.metrics[name]
+        metrics.started = time.perf_counter()
+        if open_ is not None:
+            await self._call(name, open_)
+        while True:
+            start = time.perf_counter()
+            item = await inbox.get()
+            metrics.wait_in_s += time.perf_counter() - start
+            if item is _DONE:
+                break
+            result = await self._call(name, work, item)
+            metrics.items += 1
+            if outboxes:
+                await self._emit(name, outboxes, result)
+        if close is not None:
+            await self._call(name, close)
+        metrics.finished = time.perf_counter()
+        await self._emit(name, outboxes, _DONE)
+
+    async def _run(self):
+        to_preprocess, to_index = asyncio.Queue(self.queue_size), asyncio.Queue(self.queue_size)
+        stages = [
+            self._stage("preprocess", to_preprocess, self._preprocess, [to_index]),
+            self._stage("index", to_index, self._index, open_=self._open_index, close=self._close_index),
+        ]
+        parse_outboxes = [to_preprocess]
+        if self.dense_retriever is not None:
+            to_encode, to_faiss = asyncio.Queue(self.queue_size), asyncio.Queue(self.queue_size)
+            parse_outboxes.append(to_encode)
+            stages += [
+                self._stage("encode", to_encode, self._encode, [to_faiss]),
+                self._stage("faiss_add", to_faiss, self._faiss_add, open_=self._open_faiss, close=self._close_faiss),
+            ]
+        await asyncio.gather(self._source("parse", self._open_parse, self._parse, parse_outboxes), *stages)
+
+    def run(self):
+        """Runs the whole build; returns the per-stage metrics (also written to build_metrics.json)."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        try:
+            asyncio.run(self._run())
+        finally:
+            for executor in self._executors.values():
+                executor.shutdown(wait=True)
+            self.checkpoint.close()
+
+        report = {
+            "wall_s": round(time.perf_counter() - start, 3),
+            "queue_size": self.queue_size,
+            "stages": {name: metrics.to_dict() for name, metrics in self.metrics.items()},
+        }
+        with (self.output_dir / "build_metrics.json").open("w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        if not self.keep_checkpoint:
+            self.checkpoint.remove()
+        return report
+
+
+def format_metrics(report):
+    """Plain-text table of a run() report."""
+    lines = [f"{'stage':<11}{'items':>7}{'cached':>8}{'items/s':>10}{'busy s':>9}{'util':>7}"
+             f"{'starved s':>11}{'blocked s':>11}"]
+    for name, m in report["stages"].items():
+        lines.append(f"{name:<11}{m['items']:>7}{m['cached']:>8}{m['items_per_s'] or 0:>10.1f}{m['busy_s']:>9.2f}"
+                     f"{m['utilization'] or 0:>7.0%}{m['wait_in_s']:>11.2f}{m['wait_out_s']:>11.2f}")
+    lines.append(f"total wall time: {report['wall_s']:.2f} s")
+    return "\n".join(lines)
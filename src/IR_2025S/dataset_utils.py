@@ -1,6 +1,28 @@
+import os
 import json
 from pathlib import Path
-from datasets import Dataset
+import pyarrow as pa
+
+# Columnar corpus store: Arrow IPC stream files, read through a memory map so that
+# loading is zero-copy and stages only touch the columns they select.
+# Files are written next to their target and renamed over it, never rewritten in place:
+# a reader still mapping the old file keeps its pages (truncating it would SIGBUS the reader).
+# Tokens are stored as int32 ids into a shared vocabulary file (sorted for batch builds,
+# first-seen order when written by the streaming build in IR_2025S.build_pipeline).
+
+CORPUS_SCHEMA = pa.schema([
+    ("chapter_id", pa.string()),
+    ("book", pa.string()),
+    ("book_number", pa.int32()),
+    ("chapter_str_number", pa.string()),
+    ("chapter_int_number", pa.int32()),
+    ("chapter_title", pa.string()),
+    ("text", pa.large_string()),
+])
+TOKEN_IDS_FIELD = pa.field("token_ids", pa.list_(pa.int32()))
+# character offset in `text` of the word each token was produced from, parallel to token_ids
+TOKEN_OFFSETS_FIELD = pa.field("token_offsets", pa.list_(pa.uint32()))
+VOCAB_SCHEMA = pa.schema([("token", pa.string())])
 
 
 def save_to_json(data, path):
@@ -31,4 +53,133 @@ def load_from_jsonl(path):
 
 
 def convert_to_hf_dataset(data):
-    return Dataset.from_list(data)
\ No newline at end of file
+    # an Arrow corpus file is memory-mapped by datasets directly instead of being copied;
+    # datasets is imported here only, it takes longer to import than everything else in this module
+    from datasets import Dataset
+    if isinstance(data, (str, Path)):
+        return Dataset.from_file(str(data))
+    return Dataset.from_list(data)
+
+
+def _temp_path(path):
+    return path.with_name(path.name + ".tmp")
+
+
+def _write_arrow(table, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = _temp_path(path)
+    with pa.OSFile(str(tmp_path), "wb") as sink, pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def _read_arrow(path, columns=None):
+    # memory-mapped: buffers point into the file, nothing is copied until a value is used.
+    # A stream has no column index, so every batch's metadata is read and select() only drops
+    # columns afterwards; it saves no read work, but unselected columns are never paged in.
+    table = pa.ipc.open_stream(pa.memory_map(str(path), "r")).read_all()
+    return table.select(columns) if columns else table
+
+
+def build_vocabulary(dataset):
+    """Sorted list of all distinct tokens; a token's id is its position in the list."""
+    return sorted({token for entry in dataset for token in entry.get("tokens", ())})
+
+
+def save_vocabulary(vocabulary, path):
+    _write_arrow(pa.table([pa.array(vocabulary, pa.string())], schema=VOCAB_SCHEMA), path)
+
+
+def load_vocabulary(path):
+    return _read_arrow(path).column("token").to_pylist()
+
+
+def save_corpus(data, path, vocabulary=None):
+    """
+    Writes chapters to an Arrow corpus file. If the entries carry `tokens`, they are
+    stored as a `token_ids` column against `vocabulary` (which must contain every token),
+    and their `token_offsets`, if present, as a parallel column.
+    """
+    columns = {field.name: [entry.get(field.name) for entry in data] for field in CORPUS_SCHEMA}
+    schema = CORPUS_SCHEMA
+
+    if data and "tokens" in data[0]:
+        if vocabulary is None:
+            raise ValueError("Tokenized corpus needs the vocabulary its token ids refer to.")
+        token_to_id = {token: i for i, token in enumerate(vocabulary)}
+        columns["token_ids"] = [[token_to_id[token] for token in entry["tokens"]] for entry in data]
+        schema = schema.append(TOKEN_IDS_FIELD)
+        if "token_offsets" in data[0]:
+            columns["token_offsets"] = [entry["token_offsets"] for entry in data]
+            schema = schema.append(TOKEN_OFFSETS_FIELD)
+
+    _write_arrow(pa.table(columns, schema=schema), path)
+
+
+class CorpusWriter:
+    """
+    Appends chapters to an Arrow corpus file one record batch at a time, for stages that produce
+    the corpus incrementally. Tokenized writers take `token_ids` already mapped by the caller
+    and optional `token_offsets`. The file replaces `path` on close(); until then (or if the
+    writer exits with an exception) the previous corpus stays in place.
+    """
+
+    def __init__(self, path, tokenized=False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.schema = CORPUS_SCHEMA.append(TOKEN_IDS_FIELD).append(TOKEN_OFFSETS_FIELD) if tokenized else CORPUS_SCHEMA
+        self._tmp_path = _temp_path(self.path)
+        self._sink = pa.OSFile(str(self._tmp_path), "wb")
+        self._writer = pa.ipc.new_stream(self._sink, self.schema)
+        self.rows = 0
+
+    def write(self, entry):
+        self._writer.write_batch(pa.record_batch(
+            [pa.array([entry.get(field.name)], field.type) for field in self.schema], schema=self.schema
+        ))
+        self.rows += 1
+
+    def close(self):
+        self._writer.close()
+        self._sink.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """Discards what was written; `path` is left as it was."""
+        self._writer.close()
+        self._sink.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def load_corpus(path, columns=None):
+    """Memory-mapped Arrow table of the corpus, optionally projected to `columns`."""
+    return _read_arrow(path, columns)
+
+
+def corpus_columns(path):
+    """Column names stored in a corpus file (corpora written before `token_offsets` existed lack it)."""
+    return load_corpus(path).schema.names
+
+
+def iter_corpus_records(path, columns=None, vocabulary=None):
+    """
+    Yields one dict per chapter with the selected columns. With a vocabulary,
+    `token_ids` are additionally decoded into a `tokens` list.
+    """
+    table = load_corpus(path, columns)
+    for batch in table.to_batches():
+        for record in batch.to_pylist():
+            if vocabulary is not None and "token_ids" in record:
+                record["tokens"] = [vocabulary[i] for i in record["token_ids"]]
+            yield record
+
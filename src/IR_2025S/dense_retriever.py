@@ -6,15 +6,25 @@ from pathlib import Path
 from transformers import DPRContextEncoder, DPRContextEncoderTokenizer
 from transformers import DPRQuestionEncoder, DPRQuestionEncoderTokenizer
 from typing import List, Tuple, Dict
+import copy
 import pickle
-import re
+import threading
+from collections import OrderedDict
+from IR_2025S.dataset_utils import load_corpus
+from IR_2025S.segmentation import iter_segment_spans, segment_text
+from IR_2025S.memory_report import memory_step
+from IR_2025S.results import SearchHit
+from IR_2025S.filters import ChapterFilter, cached_runs, search_faiss_runs
 
 #
 class DenseRetrieverFAISS:
+    chapter_cache_size = 16     # chapters whose text is kept after a read, most recently used first
+
     def __init__(self,
                  index_path: str = None,
                  model_name: str = "facebook/dpr-ctx_encoder-single-nq-base",
-                 question_model_name: str = "facebook/dpr-question_encoder-single-nq-base"):
+                 question_model_name: str = "facebook/dpr-question_encoder-single-nq-base",
+                 query_cache=None):
 
         self.index_path = Path(index_path) if index_path else None
         self.model_name = model_name
@@ -25,29 +35,68 @@ class DenseRetrieverFAISS:
 
         # Load DPR models
         print("🤖 Loading DPR context encoder...")
-        self.ctx_encoder = DPRContextEncoder.from_pretrained(model_name)
-        self.ctx_tokenizer = DPRContextEncoderTokenizer.from_pretrained(model_name)
+        with memory_step("dense.ctx_encoder"):
+            self.ctx_encoder = DPRContextEncoder.from_pretrained(model_name)
+            self.ctx_tokenizer = DPRContextEncoderTokenizer.from_pretrained(model_name)
 
         print("🤖 Loading DPR question encoder...")
-        self.q_encoder = DPRQuestionEncoder.from_pretrained(question_model_name)
-        self.q_tokenizer = DPRQuestionEncoderTokenizer.from_pretrained(question_model_name)
+        with memory_step("dense.question_encoder"):
+            self.q_encoder = DPRQuestionEncoder.from_pretrained(question_model_name)
+            self.q_tokenizer = DPRQuestionEncoderTokenizer.from_pretrained(question_model_name)
 
         # Initialize FAISS index and metadata storage
         self.faiss_index = None
-        self.paragraph_metadata = []  # Store paragraph info
+        self.paragraph_metadata = []  # Store paragraph info (offsets, not text)
+        self.corpus_path = None
+        self._corpus_text = None      # doc_id -> chapter text: memory-mapped corpus_path, or the built dataset
+        self._chapter_texts = OrderedDict()     # doc_id -> text of recently read chapters, LRU order
+        self._chapter_lock = threading.Lock()   # hits of concurrent queries read text in parallel
         self.embedding_dim = 768  # DPR embedding dimension
-
-    def _split_into_paragraphs(self, text: str) -> List[str]:
-        """Split chapter text into sentence-like paragraphs using end punctuation."""
-        # Split on '.', '!' or '?' followed by space or newline and a capital letter (naive sentence boundary)
-        sentences = re.split(r'(?<=[.!?])\s+(?=[A-Z“"])', text.strip())
-
-        # Filter and clean
-        paragraphs = [s.strip().replace('\n', ' ') for s in sentences if len(s.strip()) > 20]
-
-        print(f"📄 Chapter has {len(paragraphs)} paragraphs.")
-        return paragraphs
-
+        self.query_cache = query_cache  # optional SemanticQueryCache in front of encode + search
+        self._filter_runs = {}        # ChapterFilter -> runs of paragraph ids, see IR_2025S.filters
+
+    def memory_components(self) -> Dict:
+        """What this retriever holds in memory, by name, for IR_2025S.memory_report."""
+        return {
+            "ctx_encoder": self.ctx_encoder,
+            "ctx_tokenizer": self.ctx_tokenizer,
+            "question_encoder": self.q_encoder,
+            "question_tokenizer": self.q_tokenizer,
+            "faiss_index": self.faiss_index,
+            "paragraph_metadata": self.paragraph_metadata,
+            "corpus_text": self._corpus_text,
+            "chapter_texts": self._chapter_texts,
+            "query_cache": self.query_cache,
+            "filter_runs": self._filter_runs,
+        }
+
+    def chapter_text(self, doc_id: int) -> str:
+        """
+        Full text of a chapter, sliced from the memory-mapped corpus the index was built on.
+        Only the last `chapter_cache_size` chapters read stay materialized.
+        """
+        with self._chapter_lock:
+            text = self._chapter_texts.get(doc_id)
+            if text is not None:
+                self._chapter_texts.move_to_end(doc_id)
+                return text
+            if self._corpus_text is None:
+                if self.corpus_path is None:
+                    raise ValueError("No corpus to read paragraph text from; pass corpus_path to load_index().")
+                self._corpus_text = load_corpus(self.corpus_path, columns=["text"]).column("text")
+            text = self._corpus_text[doc_id]
+            if not isinstance(text, str):
+                text = text.as_py()
+            self._chapter_texts[doc_id] = text
+            while len(self._chapter_texts) > self.chapter_cache_size:
+                self._chapter_texts.popitem(last=False)
+        return text
+
+    def paragraph_text(self, metadata: Dict) -> str:
+        """Text of an indexed paragraph; metadata only stores its (start, end) offsets in the chapter."""
+        if "paragraph_text" in metadata:     # indexes built before offsets were stored
+            return metadata["paragraph_text"]
+        return segment_text(self.chapter_text(metadata["doc_id"]), metadata["start"], metadata["end"])
 
     def _encode_text(self, texts: List[str], batch_size: int = 16) -> np.ndarray:
         """Encode texts using DPR context encoder."""
@@ -73,35 +122,44 @@ class DenseRetrieverFAISS:
 
         return np.vstack(embeddings)
 
-    def build_index(self, dataset: List[Dict], save_path: str = None):
-        """Build FAISS index from chapter dataset with paragraph-level embeddings."""
-        print("📖 Processing chapters into paragraphs...")
-
+    def split_dataset(self, dataset: List[Dict]) -> Tuple[List[str], List[Dict]]:
+        """Paragraph texts and their metadata for a chapter dataset (shared by every dense index type)."""
         all_paragraphs = []
         paragraph_metadata = []
 
-        for entry in dataset:
+        for position, entry in enumerate(dataset):
+            doc_id = entry.get("doc_id", position)     # same doc ids as the BM25 index
             chapter_id = entry["chapter_id"]
             book = entry["book"]
             chapter_title = entry["chapter_title"]
             text = entry["text"]
 
-            # Split chapter into paragraphs
-            paragraphs = self._split_into_paragraphs(text)
-
-            for para_idx, paragraph in enumerate(paragraphs):
-                all_paragraphs.append(paragraph)
+            # Split chapter into paragraphs, kept as offsets into the chapter text
+            for para_idx, (start, end) in enumerate(iter_segment_spans(text)):
+                all_paragraphs.append(segment_text(text, start, end))
 
                 # Store metadata for each paragraph
                 paragraph_metadata.append({
+                    "doc_id": doc_id,
                     "chapter_id": chapter_id,
                     "book": book,
                     "chapter_title": chapter_title,
                     "paragraph_idx": para_idx,
-                    "paragraph_text": paragraph,
+                    "start": start,
+                    "end": end,
                     "global_idx": len(paragraph_metadata)  # Global paragraph index
                 })
 
+        return all_paragraphs, paragraph_metadata
+
+    def build_index(self, dataset: List[Dict], save_path: str = None, corpus_path: str = None):
+        """
+        Build FAISS index from chapter dataset with paragraph-level embeddings. Paragraph text of
+        results is read from `corpus_path` if given, otherwise from the chapters of `dataset`.
+        """
+        print("📖 Processing chapters into paragraphs...")
+        all_paragraphs, paragraph_metadata = self.split_dataset(dataset)
+
         print(f"📝 Created {len(all_paragraphs)} paragraphs from {len(dataset)} chapters")
 
         # Encode all paragraphs
@@ -118,6 +176,14 @@ class DenseRetrieverFAISS:
 
         # Store metadata
         self.paragraph_metadata = paragraph_metadata
+        self.corpus_path = Path(corpus_path) if corpus_path else None
+        self._corpus_text = None if corpus_path else {
+            entry.get("doc_id", position): entry["text"] for position, entry in enumerate(dataset)
+        }
+        self._chapter_texts = OrderedDict()
+        self._filter_runs = {}
+        if self.query_cache is not None:
+            self.query_cache.clear()
 
         print(f"✅ FAISS index built with {self.faiss_index.ntotal} vectors")
 
@@ -142,22 +208,46 @@ class DenseRetrieverFAISS:
         print(f"💾 Saved FAISS index to: {faiss_path}")
         print(f"💾 Saved metadata to: {metadata_path}")
 
-    def load_index(self, load_path: str):
-        """Load FAISS index and metadata from disk."""
+    def load_index(self, load_path: str, corpus_path: str = None):
+        """
+        Load FAISS index and metadata from disk. Paragraph text is read from `corpus_path`
+        (default: corpus.arrow next to the index) when a result needs it.
+        """
         load_path = Path(load_path)
+        self.corpus_path = Path(corpus_path) if corpus_path else load_path.parent / "corpus.arrow"
+        self._corpus_text = None
+        self._chapter_texts = OrderedDict()
 
         # Load FAISS index
         faiss_path = load_path.with_suffix('.faiss')
-        self.faiss_index = faiss.read_index(str(faiss_path))
+        with memory_step("dense.faiss_index"):
+            self.faiss_index = faiss.read_index(str(faiss_path))
 
         # Load metadata
         metadata_path = load_path.with_suffix('.pkl')
-        with open(metadata_path, 'rb') as f:
+        with memory_step("dense.paragraph_metadata"), open(metadata_path, 'rb') as f:
             self.paragraph_metadata = pickle.load(f)
+        self._filter_runs = {}
+        if self.query_cache is not None:
+            self.query_cache.clear()
 
         print(f"📂 Loaded FAISS index from: {faiss_path}")
         print(f"📂 Loaded metadata from: {metadata_path}")
 
+    def with_index(self, load_path: str, corpus_path: str = None) -> "DenseRetrieverFAISS":
+        """
+        A retriever over another saved index that shares this one's encoders and tokenizers, so
+        nothing is reloaded (see IR_2025S.snapshots.HotSwapRetriever). This retriever is unchanged;
+        a query cache is replaced by an empty one, as cached results belong to this index.
+        """
+        clone = copy.copy(self)
+        clone.faiss_index = None
+        clone.paragraph_metadata = []
+        clone.query_cache = self.query_cache.empty_copy() if self.query_cache is not None else None
+        clone._filter_runs = {}
+        clone.load_index(load_path, corpus_path)
+        return clone
+
     def encode_query(self, query: str) -> np.ndarray:
         """Encode query using DPR question encoder."""
         inputs = self.q_tokenizer(
@@ -175,51 +265,76 @@ class DenseRetrieverFAISS:
         faiss.normalize_L2(query_embedding)
         return query_embedding
 
-    def search(self, query: str, top_k: int = 5) -> List[Tuple[float, Dict]]:
-        """Search for most relevant paragraphs."""
+    def hit_metadata(self, hit: SearchHit) -> Dict:
+        return self.paragraph_metadata[hit.passage_id]
+
+    def hit_text(self, hit: SearchHit) -> str:
+        return self.paragraph_text(self.paragraph_metadata[hit.passage_id])
+
+    def search(self, query: str, top_k: int = 5, chapter_filter: ChapterFilter = None) -> List[SearchHit]:
+        """
+        Search for most relevant paragraphs; hits resolve their metadata and text on access.
+        With a ChapterFilter only the paragraphs of the matching chapters are scored.
+        """
         if self.faiss_index is None:
             raise ValueError("Index not built or loaded. Call build_index() or load_index() first.")
 
+        # the cache holds unfiltered result lists only
+        if self.query_cache is not None and chapter_filter is None:
+            return self.query_cache.search(query, top_k, encode=self.encode_query, search=self.search_embedding)
+
         # Encode query
         query_embedding = self.encode_query(query)
-
-        # Search FAISS index
-        scores, indices = self.faiss_index.search(query_embedding, top_k)
-
-        # Retrieve metadata for results
-        results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < len(self.paragraph_metadata):
-                metadata = self.paragraph_metadata[idx].copy()
-                results.append((float(score), metadata))
-
-        return results
-
-    def search_by_chapter(self, query: str, top_k: int = 5) -> Dict[str, List[Tuple[float, Dict]]]:
+        return self.search_embedding(query_embedding, top_k, chapter_filter)
+
+    def passage_runs(self, chapter_filter: ChapterFilter) -> Tuple[Tuple[int, int], ...]:
+        """(start, end) FAISS id runs of the paragraphs in chapters passing a ChapterFilter."""
+        return cached_runs(self._filter_runs, chapter_filter,
+                           lambda: [meta.get("chapter_id") for meta in self.paragraph_metadata])
+
+    def search_embedding(self, query_embedding: np.ndarray, top_k: int = 5,
+                         chapter_filter: ChapterFilter = None) -> List[SearchHit]:
+        """Search with an already encoded (1, dim) query embedding."""
+        if chapter_filter is not None:
+            scores, indices = search_faiss_runs(self.faiss_index, query_embedding, top_k,
+                                                self.passage_runs(chapter_filter))
+            scores, indices = [scores], [indices]
+        else:
+            # Search FAISS index
+            scores, indices = self.faiss_index.search(query_embedding, top_k)
+            scores, indices = scores.tolist(), indices.tolist()
+
+        # ids only; metadata stays in paragraph_metadata until a hit is read
+        metadata = self.paragraph_metadata
+        return [
+            SearchHit(self, score, metadata[idx].get("doc_id", -1), idx)    # doc_id -1: index without doc ids
+            for score, idx in zip(scores[0], indices[0])
+            if 0 <= idx < len(metadata)
+        ]
+
+    def search_by_chapter(self, query: str, top_k: int = 5,
+                          chapter_filter: ChapterFilter = None) -> Dict[str, List[SearchHit]]:
         """Search and group results by chapter."""
-        results = self.search(query, top_k * 2)  # Get more results to group
+        results = self.search(query, top_k * 2, chapter_filter)  # Get more results to group
 
         # Group by chapter
         chapter_results = {}
-        for score, metadata in results:
-            chapter_id = metadata['chapter_id']
-            if chapter_id not in chapter_results:
-                chapter_results[chapter_id] = []
-            chapter_results[chapter_id].append((score, metadata))
+        for hit in results:
+            chapter_results.setdefault(hit.chapter_id, []).append(hit)
 
         # Keep only top results per chapter and limit total
         final_results = {}
         count = 0
         for chapter_id, chapter_paragraphs in sorted(
                 chapter_results.items(),
-                key=lambda x: max(score for score, _ in x[1]),
+                key=lambda x: max(hit.score for hit in x[1]),
                 reverse=True
         ):
             if count >= top_k:
                 break
 
             # Sort paragraphs in chapter by score
-            chapter_paragraphs.sort(key=lambda x: x[0], reverse=True)
+            chapter_paragraphs.sort(key=lambda hit: hit.score, reverse=True)
             final_results[chapter_id] = chapter_paragraphs[:3]  # Top 3 paragraphs per chapter
             count += 1
 
@@ -0,0 +1,198 @@
+# IR_2025S/evaluation.py
+#
+# Relevance judgments resolved once, metrics computed for a whole query set at a time.
+# eval_data.json gives relevant passages as text (positive_ctxs); build_qrels() finds all of
+# them in the corpus in a single Aho-Corasick pass per chapter and records the chapters (doc_id,
+# chapter_id) and passages (global_idx, numbered like DenseRetrieverFAISS.split_dataset) that
+# contain them. Evaluation then judges a hit by integer set membership instead of searching
+# every positive text in every result's snippet.
+
+import json
+from bisect import bisect_left, bisect_right
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List
+import numpy as np
+from IR_2025S.file_utils import file_crc32
+from IR_2025S.segmentation import iter_segment_spans
+
+QRELS_VERSION = 1
+
+# one-to-one character mapping, so offsets in the normalized text are offsets in the original:
+# typographic quotes and dashes fold to ASCII, every whitespace character (newlines) to a space
+_FOLD = str.maketrans({
+    "‘": "'", "’": "'", "“": '"', "”": '"', "–": "-", "—": "-",
+    "\n": " ", "\r": " ", "\t": " ", "\u00a0": " ",
+})
+
+
+def normalize_for_matching(text: str) -> str:
+    """Lower-cased, quote-, dash- and whitespace-folded `text` of the same length."""
+    folded = text.translate(_FOLD)
+    lowered = folded.lower()
+    if len(lowered) == len(folded):
+        return lowered
+    # a few characters lower-case to two ("İ"); keep those as they are
+    return "".join(c.lower() if len(c.lower()) == 1 else c for c in folded)
+
+
+class AhoCorasick:
+    """
+    Multi-pattern string matcher: one pass over a text reports every occurrence of every pattern.
+    Built as a trie of the patterns with failure links (the longest proper suffix that is also a
+    trie path) and output lists merged along those links.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for pattern_id, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            node = 0
+            for char in pattern:
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(pattern_id)
+
+        # failure links breadth-first, so a node's suffix nodes are finished before it
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def iter_matches(self, text: str):
+        """(start, end, pattern_id) of every occurrence, in order of `end`."""
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for pattern_id in out[node]:
+                yield end - len(patterns[pattern_id]), end, pattern_id
+
+
+def build_qrels(eval_data: List[Dict], corpus_records: Iterable[Dict]) -> Dict:
+    """
+    Resolves the positive_ctxs texts of every query to the chapters and passages containing them.
+    `corpus_records` are the corpus chapters in index order (chapter_id and text, doc_id optional).
+    Positives found nowhere are listed per query under "unmatched".
+    """
+    patterns, owners = [], []           # normalized positive text, (query index, positive index)
+    for qi, entry in enumerate(eval_data):
+        for pi, ctx in enumerate(entry.get("positive_ctxs", [])):
+            pattern = normalize_for_matching(ctx.get("text", "").strip())
+            if pattern:
+                patterns.append(pattern)
+                owners.append((qi, pi))
+    matcher = AhoCorasick(patterns)
+
+    doc_ids = [set() for _ in eval_data]
+    chapter_ids = [set() for _ in eval_data]
+    passage_ids = [set() for _ in eval_data]
+    found = set()
+    global_idx = 0
+    for position, record in enumerate(corpus_records):
+        text = record["text"]
+        spans = list(iter_segment_spans(text))
+        starts = [start for start, _ in spans]
+        ends = [end for _, end in spans]
+        for start, end, pattern_id in matcher.iter_matches(normalize_for_matching(text)):
+            qi = owners[pattern_id][0]
+            found.add(pattern_id)
+            doc_ids[qi].add(record.get("doc_id", position))
+            chapter_ids[qi].add(record["chapter_id"])
+            # every passage overlapping the match: a positive may run over a segment boundary
+            for i in range(bisect_right(ends, start), bisect_left(starts, end)):
+                passage_ids[qi].add(global_idx + i)
+        global_idx += len(spans)
+
+    unmatched = [[] for _ in eval_data]
+    for pattern_id, (qi, pi) in enumerate(owners):
+        if pattern_id not in found:
+            unmatched[qi].append(pi)
+
+    return {
+        "version": QRELS_VERSION,
+        "queries": [{
+            "query": entry["query"],
+            "doc_ids": sorted(doc_ids[qi]),
+            "chapter_ids": sorted(chapter_ids[qi]),
+            "passage_ids": sorted(passage_ids[qi]),
+            "unmatched": unmatched[qi],
+        } for qi, entry in enumerate(eval_data)],
+    }
+
+
+def save_qrels(qrels: Dict, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(qrels, f, ensure_ascii=False, indent=1)
+
+
+def load_qrels(path) -> Dict:
+    with Path(path).open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def ensure_qrels(eval_path, corpus_path, qrels_path, rebuild=False) -> Dict:
+    """
+    The qrels of `eval_path`, built and saved to `qrels_path` unless a file made from the same
+    eval data and corpus (by CRC-32) is already there.
+    """
+    sources = {"eval_data_crc32": file_crc32(eval_path), "corpus_crc32": file_crc32(corpus_path)}
+    qrels_path = Path(qrels_path)
+    if not rebuild and qrels_path.exists():
+        qrels = load_qrels(qrels_path)
+        if qrels.get("version") == QRELS_VERSION and all(qrels.get(k) == v for k, v in sources.items()):
+            return qrels
+
+    from IR_2025S.dataset_utils import iter_corpus_records, load_from_json
+    qrels = build_qrels(load_from_json(eval_path), iter_corpus_records(corpus_path, columns=["chapter_id", "text"]))
+    qrels.update(sources)
+    save_qrels(qrels, qrels_path)
+    return qrels
+
+
+def relevance_matrix(result_ids: List[List[int]], relevant: List[set], depth: int) -> np.ndarray:
+    """0/1 matrix, one row per query: is the result at each rank (up to `depth`) in its relevant set."""
+    matrix = np.zeros((len(result_ids), depth), dtype=np.float64)
+    for row, (ids, judged) in enumerate(zip(result_ids, relevant)):
+        for rank, result_id in enumerate(ids[:depth]):
+            if result_id in judged:
+                matrix[row, rank] = 1.0
+    return matrix
+
+
+def average_precision(relevance: np.ndarray) -> np.ndarray:
+    """
+    Per-query AP of a relevance matrix: mean precision at the relevant ranks, normalized by the
+    relevant results retrieved (as sklearn's average_precision_score on the ranked list); 0 without any.
+    """
+    hits = relevance.sum(axis=1)
+    precision = np.cumsum(relevance, axis=1) / np.arange(1, relevance.shape[1] + 1)
+    return np.divide((precision * relevance).sum(axis=1), hits, out=np.zeros_like(hits), where=hits > 0)
+
+
+def ndcg(relevance: np.ndarray) -> np.ndarray:
+    """Per-query NDCG of a relevance matrix against the ideal order of the same results (as sklearn's ndcg_score)."""
+    discount = 1.0 / np.log2(np.arange(2, relevance.shape[1] + 2))
+    dcg = relevance @ discount
+    ideal = -np.sort(-relevance, axis=1) @ discount
+    return np.divide(dcg, ideal, out=np.zeros_like(dcg), where=ideal > 0)
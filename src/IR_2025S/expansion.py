@@ -0,0 +1,129 @@
+# IR_2025S/expansion.py
+#
+# Learned sparse retrieval with document-side expansion (SPLADE-doc style). A masked-LM reads each
+# chapter offline and assigns a weight to every vocabulary term that is relevant to it, including
+# terms that never occur in the text. The weights live in an ordinary SQLite inverted index
+# (BooleanIndexerSQLite.index_expansions); a query is just tokenized and its weighted postings
+# summed, so no neural forward pass is needed at query time.
+
+from pathlib import Path
+from typing import Dict, List
+from IR_2025S.retriever import BM25RetrieverSQLite, ChapterHit
+
+DEFAULT_EXPANSION_MODEL = "naver/splade-v3-doc"
+
+
+def load_query_tokenizer(name: str, local_files_only: bool = False):
+    """
+    The model's fast tokenizer (tokenizer.json) through the `tokenizers` library, without
+    transformers, which imports torch. Falls back to AutoTokenizer for models that only ship
+    the slow tokenizer files.
+    """
+    from tokenizers import Tokenizer
+    path = Path(name)
+    if (path / "tokenizer.json").is_file():
+        return Tokenizer.from_file(str(path / "tokenizer.json"))
+    if not path.exists():
+        from huggingface_hub import hf_hub_download
+        from huggingface_hub.utils import EntryNotFoundError
+        try:
+            return Tokenizer.from_file(hf_hub_download(name, "tokenizer.json", local_files_only=local_files_only))
+        except EntryNotFoundError:
+            pass
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(name, local_files_only=local_files_only)
+
+
+class DocumentExpander:
+    """
+    Offline side: turns chapter text into {term: weight} with a SPLADE document encoder.
+    Chapters are longer than the model's input, so they are read in windows of `max_length`
+    word pieces and the weights max-pooled over all windows. Only the `top_terms` strongest
+    terms per chapter are kept, which bounds the index size.
+    """
+
+    def __init__(self,
+                 model_name: str = DEFAULT_EXPANSION_MODEL,
+                 max_length: int = 256,
+                 top_terms: int = 256,
+                 batch_size: int = 8,
+                 local_files_only: bool = False):
+        self.model_name = model_name
+        self.max_length = max_length
+        self.top_terms = top_terms
+        self.batch_size = batch_size
+
+        from transformers import AutoTokenizer, AutoModelForMaskedLM    # offline only, see module docstring
+        print(f"🤖 Loading expansion model {model_name}...")
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=local_files_only)
+        self.model = AutoModelForMaskedLM.from_pretrained(model_name, local_files_only=local_files_only)
+        self.model.eval()
+
+    def expand(self, text: str) -> Dict[str, float]:
+        """SPLADE weights log(1 + relu(logit)), max-pooled over positions and windows."""
+        import torch
+        windows = self.tokenizer(
+            text,
+            max_length=self.max_length,
+            truncation=True,
+            padding=True,
+            return_overflowing_tokens=True,     # the rest of the chapter as further windows
+            return_tensors="pt"
+        )
+        pooled = None
+        for i in range(0, len(windows["input_ids"]), self.batch_size):
+            input_ids = windows["input_ids"][i:i + self.batch_size]
+            attention_mask = windows["attention_mask"][i:i + self.batch_size]
+            with torch.no_grad():
+                logits = self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+            weights = torch.log1p(torch.relu(logits)) * attention_mask.unsqueeze(-1)
+            batch_max = weights.amax(dim=(0, 1))
+            pooled = batch_max if pooled is None else torch.maximum(pooled, batch_max)
+
+        values, term_ids = pooled.topk(min(self.top_terms, int((pooled > 0).sum())))
+        terms = self.tokenizer.convert_ids_to_tokens(term_ids.tolist())
+        return {term: weight for term, weight in zip(terms, values.tolist())
+                if term not in self.tokenizer.all_special_tokens}
+
+    def expand_dataset(self, dataset: List[Dict]) -> List[Dict[str, float]]:
+        expansions = []
+        for i, entry in enumerate(dataset, 1):
+            expansions.append(self.expand(entry["text"]))
+            if i % 20 == 0 or i == len(dataset):
+                print(f"🧠 Expanded {i}/{len(dataset)} chapters")
+        return expansions
+
+
+class ExpansionRetrieverSQLite:
+    """
+    Query side of an expansion index: tokenizer only (no model), then a sum of the stored
+    term weights over the impact postings. search() returns SearchHits (chapter-level ChapterHits)
+    like DenseRetrieverFAISS.search(), so it can stand in for the dense leg of HybridRetriever.
+    """
+
+    def __init__(self, db_path, tokenizer_name: str = None, local_files_only: bool = False):
+        self.index = BM25RetrieverSQLite(db_path)
+        if self.index.meta.get("index_type") != "expansion":
+            raise ValueError(f"{db_path} is not an expansion index, see BooleanIndexerSQLite.index_expansions()")
+        tokenizer_name = tokenizer_name or self.index.meta["expansion_model"]
+        self.tokenizer = load_query_tokenizer(tokenizer_name, local_files_only=local_files_only)
+
+    def memory_components(self) -> Dict:
+        return {"index": self.index, "tokenizer": self.tokenizer}
+
+    def query_tokens(self, query: str) -> List[str]:
+        if hasattr(self.tokenizer, "tokenize"):     # AutoTokenizer fallback
+            return self.tokenizer.tokenize(query)
+        return self.tokenizer.encode(query, add_special_tokens=False).tokens
+
+    def rank(self, query: str, top_n: int = 5, chapter_filter=None):
+        """Top-n chapters as ChapterHit handles; scores are exact sums of the learned weights."""
+        return self.index.rank_impact(self.query_tokens(query), top_n=top_n, early_termination=False,
+                                      chapter_filter=chapter_filter)
+
+    def search(self, query: str, top_k: int = 5, chapter_filter=None) -> List[ChapterHit]:
+        # a hit's preview() is the best-matching window of the chapter, the counterpart of a dense paragraph
+        return self.rank(query, top_n=top_k, chapter_filter=chapter_filter)
+
+    def close(self):
+        self.index.close()
@@ -0,0 +1,16 @@
+# IR_2025S/file_utils.py
+#
+# Small file helpers shared by serving (snapshots) and offline tooling (evaluation);
+# standard library only, so importing them pulls in nothing else.
+
+import zlib
+from pathlib import Path
+
+
+def file_crc32(path) -> str:
+    """CRC-32 of a file's bytes as 8 hex digits, read in 1 MiB blocks."""
+    crc = 0
+    with Path(path).open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            crc = zlib.crc32(block, crc)
+    return f"{crc:08x}"
@@ -0,0 +1,136 @@
+# IR_2025S/filters.py
+#
+# Metadata filters pushed into the indexes instead of applied to over-fetched results.
+# Chapter ids are "<book_number>_<chapter_number>" and the corpus is indexed book by book, chapter
+# by chapter, so the chapters passing a book / chapter-range filter are a few contiguous runs of
+# doc_ids, and their paragraphs contiguous runs of FAISS ids. A filter is resolved once per index
+# into (start, end) runs: BM25 then reads only those key ranges of each posting list, and the
+# flat FAISS index scores only those rows, so a filtered query does less work than an open one.
+
+from typing import Iterable, Optional, Sequence, Tuple
+import numpy as np
+
+RESOLVED_FILTER_CACHE_SIZE = 64     # resolved filters kept per index
+
+
+class ChapterFilter:
+    """
+    Restricts a search to some books and, optionally, a chapter range: ChapterFilter(books=4) is
+    "only Goblet of Fire", ChapterFilter(books=[1, 2], chapters=(1, 10)) the first ten chapters of
+    books 1 and 2. `chapters` is an inclusive (first, last) range; either end may be None.
+    Filters are immutable and hashable, so indexes cache what they resolve to.
+    """
+    __slots__ = ("books", "chapters")
+
+    def __init__(self, books=None, chapters: Optional[Tuple[Optional[int], Optional[int]]] = None):
+        if isinstance(books, int):
+            books = (books,)
+        self.books = frozenset(int(book) for book in books) if books is not None else None
+        self.chapters = tuple(chapters) if chapters is not None else None
+
+    @classmethod
+    def parse(cls, books: str = None, chapters: str = None) -> Optional["ChapterFilter"]:
+        """From command-line strings: books "4" or "1,2", chapters "1-10", "5-" or "7". None if both are empty."""
+        if not books and not chapters:
+            return None
+        book_set = [int(book) for book in books.split(",")] if books else None
+        chapter_range = None
+        if chapters:
+            first, sep, last = chapters.partition("-")
+            first = int(first) if first else None
+            chapter_range = (first, (int(last) if last else None) if sep else first)
+        return cls(book_set, chapter_range)
+
+    def matches(self, book_number: int, chapter_number: int) -> bool:
+        if self.books is not None and book_number not in self.books:
+            return False
+        if self.chapters is not None:
+            first, last = self.chapters
+            if (first is not None and chapter_number < first) or (last is not None and chapter_number > last):
+                return False
+        return True
+
+    def matches_chapter_id(self, chapter_id: str) -> bool:
+        book, _, chapter = chapter_id.partition("_")
+        return self.matches(int(book), int(chapter))
+
+    def _key(self):
+        return (self.books, self.chapters)
+
+    def __eq__(self, other):
+        return isinstance(other, ChapterFilter) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        books = sorted(self.books) if self.books is not None else None
+        return f"ChapterFilter(books={books}, chapters={self.chapters})"
+
+
+def resolve_runs(chapter_filter: ChapterFilter, chapter_ids: Iterable[str]) -> Tuple[Tuple[int, int], ...]:
+    """
+    Half-open (start, end) runs of the ids whose chapter passes the filter, where `chapter_ids`
+    gives the chapter of id 0, 1, 2, ... (None for ids that do not exist).
+    """
+    runs = []
+    start = None
+    i = -1
+    for i, chapter_id in enumerate(chapter_ids):
+        keep = chapter_id is not None and chapter_filter.matches_chapter_id(chapter_id)
+        if keep and start is None:
+            start = i
+        elif not keep and start is not None:
+            runs.append((start, i))
+            start = None
+    if start is not None:
+        runs.append((start, i + 1))
+    return tuple(runs)
+
+
+def cached_runs(cache: dict, chapter_filter: ChapterFilter, chapter_ids) -> Tuple[Tuple[int, int], ...]:
+    """resolve_runs() memoized in `cache`; `chapter_ids` is a callable so it is only built on a miss."""
+    runs = cache.get(chapter_filter)
+    if runs is None:
+        runs = resolve_runs(chapter_filter, chapter_ids())
+        if len(cache) >= RESOLVED_FILTER_CACHE_SIZE:
+            cache.pop(next(iter(cache), None), None)
+        cache[chapter_filter] = runs
+    return runs
+
+
+def runs_mask(runs: Sequence[Tuple[int, int]], size: int) -> np.ndarray:
+    """Boolean mask of length `size` that is True inside the runs."""
+    mask = np.zeros(size, dtype=bool)
+    for start, end in runs:
+        mask[start:end] = True
+    return mask
+
+
+def search_faiss_runs(index, query_embedding: np.ndarray, top_k: int, runs: Sequence[Tuple[int, int]]):
+    """
+    FAISS search restricted to the ids inside `runs`, as (scores, ids) lists, best first.
+    A flat inner-product index scores just those rows of its vectors (a per-book sub-index
+    without a copy); other index types search with an IDSelector.
+    """
+    import faiss
+    total = sum(end - start for start, end in runs)
+    if total == 0:
+        return [], []
+    if isinstance(index, faiss.IndexFlat) and index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        vectors = faiss.rev_swig_ptr(index.get_xb(), index.ntotal * index.d).reshape(index.ntotal, index.d)
+        query = query_embedding.reshape(-1)
+        scores = np.concatenate([vectors[start:end] @ query for start, end in runs])
+        ids = np.concatenate([np.arange(start, end) for start, end in runs])
+        k = min(top_k, total)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return scores[top].tolist(), ids[top].tolist()
+
+    if len(runs) == 1:
+        selector = faiss.IDSelectorRange(runs[0][0], runs[0][1])
+    else:
+        selector = faiss.IDSelectorBatch(np.concatenate([np.arange(s, e) for s, e in runs]).astype("int64"))
+    scores, ids = index.search(query_embedding, min(top_k, total), params=faiss.SearchParameters(sel=selector))
+    keep = ids[0] >= 0
+    return scores[0][keep].tolist(), ids[0][keep].tolist()
@@ -6,37 +6,153 @@ from typing import List, Dict
 import numpy as np
 from collections import defaultdict
 from IR_2025S.retriever import BM25RetrieverSQLite
-from IR_2025S.dense_retriever import DenseRetrieverFAISS
-from IR_2025S.preprocessing import Preprocessor
-from sklearn.preprocessing import MinMaxScaler
+from IR_2025S.memory_report import memory_step
+from IR_2025S.results import HybridHit
+
+# The legs are imported when they are loaded: the dense and late-interaction legs pull in torch,
+# transformers and faiss, the expansion leg transformers, the preprocessor spaCy. A BM25 +
+# expansion retriever never imports torch; `import IR_2025S.hybrid_retriever` stays cheap.
 
 DEFAULT_ALPHA = 0.5  # Best alpha from evaluation
 
 class HybridRetriever:
-    def __init__(self, bm25_db_path: str, dense_index_path: str, alpha: float = DEFAULT_ALPHA):
+    def __init__(self, bm25_db_path: str, dense_index_path: str = None, alpha: float = DEFAULT_ALPHA, reranker=None,
+                 late_interaction_path: str = None, expansion_index_path: str = None, query_cache=None,
+                 feedback: Dict = None, encoder_from=None):
+        """
+        The second leg is, in order of preference: the expansion index ("lexical+expanded", no neural
+        model at query time, so the DPR models are only loaded if `dense_index_path` is given), the
+        late-interaction index, or the single-vector dense index. `query_cache` (a SemanticQueryCache)
+        is put in front of the single-vector dense search. `feedback` (keyword arguments of
+        BM25RetrieverSQLite.rank_rm3, {} for its defaults) turns on RM3 expansion of the BM25 leg.
+        `encoder_from`, a loaded DenseRetrieverFAISS, lends its DPR models to the dense leg instead
+        of loading them again (its query cache settings replace `query_cache`).
+        """
+        if not (dense_index_path or expansion_index_path):
+            raise ValueError("HybridRetriever needs a dense_index_path or an expansion_index_path")
+        if late_interaction_path and not dense_index_path:
+            raise ValueError("The late-interaction index needs the dense index (its encoder and corpus)")
         self.alpha = alpha
-        self.bm25_retriever = BM25RetrieverSQLite(bm25_db_path)
-        self.dense_retriever = DenseRetrieverFAISS()
-        self.dense_retriever.load_index(dense_index_path)
+        self.reranker = reranker    # optional CrossEncoderReranker applied after fusion
+        self.feedback = feedback    # None: plain BM25 leg
+        self._preprocessor = None   # created by search() if it is ever called without query_tokens
+        with memory_step("hybrid.bm25"):
+            self.bm25_retriever = BM25RetrieverSQLite(bm25_db_path)
+        self.dense_retriever = None
+        if dense_index_path:
+            with memory_step("hybrid.dense"):
+                if encoder_from is not None:
+                    self.dense_retriever = encoder_from.with_index(dense_index_path)
+                else:
+                    from IR_2025S.dense_retriever import DenseRetrieverFAISS
+                    self.dense_retriever = DenseRetrieverFAISS(query_cache=query_cache)
+                    self.dense_retriever.load_index(dense_index_path)
+        # optional multi-vector dense leg; it reuses the DPR encoder and corpus loaded above
+        self.late_retriever = None
+        if late_interaction_path:
+            with memory_step("hybrid.late_interaction"):
+                from IR_2025S.late_interaction import LateInteractionRetriever
+                self.late_retriever = LateInteractionRetriever(self.dense_retriever)
+                self.late_retriever.load_index(late_interaction_path)
+        self.expansion_retriever = None
+        if expansion_index_path:
+            with memory_step("hybrid.expansion"):
+                from IR_2025S.expansion import ExpansionRetrieverSQLite
+                self.expansion_retriever = ExpansionRetrieverSQLite(expansion_index_path)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, previous: "HybridRetriever" = None, dense: bool = True,
+                      late_interaction: bool = False, expansion: bool = False, **kwargs) -> "HybridRetriever":
+        """
+        A retriever over the indexes of an IR_2025S.snapshots.Snapshot. The legs are chosen as in
+        __init__ from the components asked for; `previous` (the retriever being replaced by a
+        HotSwapRetriever) lends its DPR models and spaCy preprocessor. Other keyword arguments
+        go to __init__. Usable directly as a HotSwapRetriever loader, e.g. through functools.partial.
+        """
+        def component(name, wanted=True):
+            if not wanted:
+                return None
+            path = snapshot.component(name)
+            if path is None:
+                raise FileNotFoundError(f"Snapshot {snapshot.version} has no {name} index")
+            return str(path)
+
+        retriever = cls(
+            component("bm25"),
+            dense_index_path=component("dense", dense or late_interaction),
+            late_interaction_path=component("late_interaction", late_interaction),
+            expansion_index_path=component("expansion", expansion),
+            encoder_from=previous.dense_retriever if previous is not None else None,
+            **kwargs,
+        )
+        if previous is not None:
+            retriever._preprocessor = previous._preprocessor
+        return retriever
+
+    def memory_components(self) -> Dict:
+        """The loaded legs, by name, for IR_2025S.memory_report (the reranker's model included)."""
+        return {
+            "bm25": self.bm25_retriever,
+            "dense": self.dense_retriever,
+            "late_interaction": self.late_retriever,
+            "expansion": self.expansion_retriever,
+            "reranker": self.reranker,
+        }
+
+    def _dense_doc_id(self, hit):
+        # dense indexes built before doc ids existed only know the chapter_id
+        if hit.doc_id >= 0:
+            return hit.doc_id
+        return self.bm25_retriever.doc_id_of(hit.chapter_id)
 
     def normalize_scores(self, scores: Dict[str, float]) -> Dict[str, float]:
         if not scores:
             return {}
-        keys = list(scores.keys())
-        values = np.array(list(scores.values())).reshape(-1, 1)
-        normalized = MinMaxScaler().fit_transform(values).flatten() if len(values) > 1 else np.ones_like(values).flatten()
-        return dict(zip(keys, normalized))
-
-    def search(self, query: str, query_tokens: List[str] = None, top_k: int = 5) -> List[Dict]:
+        values = np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+        if len(values) == 1:
+            normalized = np.ones(1)
+        else:
+            # min-max to [0, 1]; all-equal scores become 0, as with sklearn's MinMaxScaler
+            low, span = values.min(), np.ptp(values)
+            normalized = (values - low) / span if span > 0 else np.zeros_like(values)
+        return dict(zip(scores.keys(), normalized))
+
+    def search(self, query: str, query_tokens: List[str] = None, top_k: int = 5, rerank: bool = None,
+               chapter_filter=None) -> List[HybridHit]:
+        """
+        Fuses BM25 and dense scores into HybridHits (snippets are only built when read). With a
+        reranker configured (and `rerank` not False), the top `reranker.max_candidates` fused
+        chapters are re-scored by the cross-encoder within its time budget. A ChapterFilter
+        (IR_2025S.filters) is pushed into both legs, so each only scores the chapters it allows.
+        Hits read their text from this retriever's indexes: use bm25_text, dense_text and text
+        before close(), afterwards they raise sqlite3.ProgrammingError.
+        """
+        rerank = self.reranker is not None if rerank is None else rerank and self.reranker is not None
         if query_tokens is None:
-            preprocessor = Preprocessor(stopwords=True, lemmatize=True, preserve_punct=False)
-            query_tokens = preprocessor.preprocess_text(query)
-
-        bm25_results = self.bm25_retriever.rank_with_scores(query_tokens, top_n=top_k * 2)
-        dense_results = self.dense_retriever.search(query, top_k=top_k * 2)
-
-        bm25_scores = {cid: score for score, cid, *_ in bm25_results}
-        dense_scores = {meta['chapter_id']: score for score, meta in dense_results}
+            if self._preprocessor is None:
+                from IR_2025S.preprocessing import Preprocessor
+                self._preprocessor = Preprocessor(stopwords=True, lemmatize=True, preserve_punct=False)
+            query_tokens = self._preprocessor.preprocess_text(query)
+
+        n_candidates = max(top_k, self.reranker.max_candidates) if rerank else top_k
+        if self.feedback is not None:
+            bm25_results = self.bm25_retriever.rank_rm3(query_tokens, top_n=n_candidates * 2,
+                                                        chapter_filter=chapter_filter, **self.feedback)
+        else:
+            bm25_results = self.bm25_retriever.rank_with_scores(query_tokens, top_n=n_candidates * 2,
+                                                                chapter_filter=chapter_filter)
+        dense_leg = self.expansion_retriever or self.late_retriever or self.dense_retriever
+        dense_results = dense_leg.search(query, top_k=n_candidates * 2, chapter_filter=chapter_filter)
+
+        # fusion works on integer doc ids only; chapter_id strings are resolved for the output
+        bm25_hits = {hit.doc_id: hit for hit in bm25_results}
+        bm25_scores = {doc_id: hit.score for doc_id, hit in bm25_hits.items()}
+        dense_best = {}
+        for hit in dense_results:
+            doc_id = self._dense_doc_id(hit)
+            if doc_id is not None and doc_id not in dense_best:     # results are sorted, first is best
+                dense_best[doc_id] = hit
+        dense_scores = {doc_id: hit.score for doc_id, hit in dense_best.items()}
 
         norm_bm25 = self.normalize_scores(bm25_scores)
         norm_dense = self.normalize_scores(dense_scores)
@@ -49,29 +165,25 @@ class HybridRetriever:
                 (1 - self.alpha) * norm_bm25.get(doc_id, 0.0)
             )
 
-        sorted_docs = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
-
-        results = []
-        for doc_id, combined_score in sorted_docs:
-            bm25_score = bm25_scores.get(doc_id, 0.0)
-            dense_score = dense_scores.get(doc_id, 0.0)
-
-            bm25_text = next((text for _, cid, _, _, text in bm25_results if cid == doc_id), '')
-            dense_text = next((meta.get('paragraph_text', '') for _, meta in dense_results if meta['chapter_id'] == doc_id), '')
+        sorted_docs = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)[:n_candidates]
+        results = [
+            HybridHit(float(combined_score), doc_id, bm25_hits.get(doc_id), dense_best.get(doc_id))
+            for doc_id, combined_score in sorted_docs
+        ]
 
-            results.append({
-                'chapter_id': doc_id,
-                'combined_score': combined_score,
-                'bm25_score': bm25_score,
-                'dense_score': dense_score,
-                'bm25_text': bm25_text[:300].replace('\\n', ' '),
-                'dense_text': dense_text[:300].replace('\\n', ' ')
-            })
+        if rerank:
+            reranked = self.reranker.rerank(query, results, text_of=lambda hit: hit.text)
+            results = []
+            for hit, score in reranked:
+                hit.rerank_score = score
+                results.append(hit)
 
-        return results
+        return results[:top_k]
 
     def close(self):
         self.bm25_retriever.close()
+        if self.expansion_retriever is not None:
+            self.expansion_retriever.close()
 
 
 # python pipeline/08_hybrid.py "hogwarts school" --alpha 0.6 --topk 5
@@ -1,16 +1,48 @@
 import sqlite3
+from array import array
 from pathlib import Path
 from collections import Counter, defaultdict
+from IR_2025S.retriever import bm25_idf, bm25_tf
+from IR_2025S.segmentation import WORD_RE
 
 
 # NB: implement phrase index? e.g. "harry potter" --> bigram?
-# NB: implement positional index? e.g. "harry potter" --> [0, 1], [1, 2], [2, 3]...
+
+INFLECTION_SUFFIXES = ("s", "es", "ed", "ing", "'s")
+
+
+def match_index_token(word, tokens):
+    """
+    Maps a surface word to the (lemmatized) index token it most likely produced.
+    Exact lowercase match first, then a few inflection suffixes stripped, e.g. "socks" -> "sock".
+    Only a fallback for entries without `token_offsets`: irregular lemmas (went -> go) are missed.
+    """
+    word = word.lower()
+    if word in tokens:
+        return word
+    for suffix in INFLECTION_SUFFIXES:
+        if word.endswith(suffix) and word[:-len(suffix)] in tokens:
+            return word[:-len(suffix)]
+    return None
+
+
+def token_char_offsets(text, tokens):
+    """Character offsets of every word in `text` that maps to one of `tokens`, grouped by token."""
+    offsets = defaultdict(lambda: array("I"))
+    for match in WORD_RE.finditer(text):
+        token = match_index_token(match.group(), tokens)
+        if token is not None:
+            offsets[token].append(match.start())
+    return offsets
 
 
 class BooleanIndexerSQLite:
     def __init__(self, db_path):
         self.db_path = Path(db_path)
         self.conn = sqlite3.connect(self.db_path)
+        # WAL lets readers keep querying while the writer commits
+        self.conn.execute("PRAGMA journal_mode = WAL;")
+        self.conn.execute("PRAGMA synchronous = NORMAL;")
         self._create_tables()
 
     def _create_tables(self):
@@ -18,10 +50,17 @@ class BooleanIndexerSQLite:
             self.conn.execute("DROP TABLE IF EXISTS inverted_index;")
             self.conn.execute("DROP TABLE IF EXISTS chapters;")
             self.conn.execute("DROP TABLE IF EXISTS vocabulary;")
+            self.conn.execute("DROP TABLE IF EXISTS positions;")
+            self.conn.execute("DROP TABLE IF EXISTS impact_index;")
+            self.conn.execute("DROP TABLE IF EXISTS index_meta;")
+            self.conn.execute("DROP TABLE IF EXISTS doc_vectors;")
 
+            # doc_id: dense integer id in corpus order, used by every other table;
+            # chapter_id strings are only resolved for output
             self.conn.execute("""
                 CREATE TABLE chapters (
-                    chapter_id TEXT PRIMARY KEY,
+                    doc_id INTEGER PRIMARY KEY,
+                    chapter_id TEXT UNIQUE,
                     book TEXT,
                     chapter_title TEXT,
                     text TEXT,
@@ -29,68 +68,288 @@ class BooleanIndexerSQLite:
                 );
             """)
 
+            # clustered on (term_id, doc_id): a term's postings are stored contiguously
+            # and the primary key covers the frequency lookup, no separate index needed
             self.conn.execute("""
                 CREATE TABLE inverted_index (
-                    token TEXT,
-                    chapter_id TEXT,
+                    term_id INTEGER,
+                    doc_id INTEGER,
                     frequency INTEGER,
-                    UNIQUE(token, chapter_id)
-                );
+                    PRIMARY KEY (term_id, doc_id)
+                ) WITHOUT ROWID;
             """)
-            self.conn.execute("CREATE INDEX idx_token ON inverted_index(token);")
 
+            # term_ids are positions in the corpus vocabulary file (sorted for batch builds,
+            # first-seen order for streaming builds); readers sort by token themselves
             self.conn.execute("""
                 CREATE TABLE vocabulary (
-                    token TEXT PRIMARY KEY,
+                    term_id INTEGER PRIMARY KEY,
+                    token TEXT UNIQUE,
                     document_frequency INTEGER
                 );
             """)
 
-    def index_dataset(self, dataset):
-        token_to_chapters = defaultdict(set)
+            # character offsets of each term's occurrences in the chapter text,
+            # packed as uint32 arrays; used to build snippets without reading whole chapters
+            self.conn.execute("""
+                CREATE TABLE positions (
+                    term_id INTEGER,
+                    doc_id INTEGER,
+                    offsets BLOB,
+                    PRIMARY KEY (term_id, doc_id)
+                ) WITHOUT ROWID;
+            """)
+
+            # each chapter's term vector (term ids ascending, parallel frequencies), packed as
+            # uint32 arrays: pseudo-relevance feedback reads a feedback document in one lookup
+            # instead of scanning the postings of every term for its doc_id
+            self.conn.execute("""
+                CREATE TABLE doc_vectors (
+                    doc_id INTEGER PRIMARY KEY,
+                    term_ids BLOB,
+                    frequencies BLOB
+                );
+            """)
+
+            # optional impact-ordered postings, see build_impact_index()
+            self.conn.execute("""
+                CREATE TABLE impact_index (
+                    term_id INTEGER,
+                    impact INTEGER,
+                    doc_id INTEGER,
+                    PRIMARY KEY (term_id, impact DESC, doc_id)
+                ) WITHOUT ROWID;
+            """)
+
+            # build parameters and collection statistics, as key/value pairs
+            self.conn.execute("""
+                CREATE TABLE index_meta (
+                    key TEXT PRIMARY KEY,
+                    value
+                );
+            """)
 
+    def set_meta(self, key, value):
         with self.conn:
-            for entry in dataset:
-                chapter_id = entry["chapter_id"]
-                book = entry["book"]
-                title = entry["chapter_title"]
-                text = entry["text"]
-                tokens = entry["tokens"]
-                doc_length = len(tokens)
-
-                # chapter
-                self.conn.execute("""
-                    INSERT INTO chapters (chapter_id, book, chapter_title, text, doc_length)
-                    VALUES (?, ?, ?, ?, ?)
-                    ON CONFLICT(chapter_id) DO UPDATE SET
-                        book = excluded.book,
-                        chapter_title = excluded.chapter_title,
-                        text = excluded.text,
-                        doc_length = excluded.doc_length
-                """, (chapter_id, book, title, text, doc_length))
-
-                # index & frequencies
-                token_counts = Counter(tokens)
-                for token, freq in token_counts.items():
-                    token_to_chapters[token].add(chapter_id)
-                    self.conn.execute("""
-                        INSERT INTO inverted_index (token, chapter_id, frequency)
-                        VALUES (?, ?, ?)
-                        ON CONFLICT(token, chapter_id) DO UPDATE SET
-                            frequency = excluded.frequency
-                    """, (token, chapter_id, freq))
-
-            # vocabulary
-            for token, chapters in token_to_chapters.items():
-                # noinspection SqlResolve
+            self.conn.execute("""
+                INSERT INTO index_meta (key, value) VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value
+            """, (key, value))
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM index_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _collection_stats(self):
+        N, avgdl = self.conn.execute("SELECT COUNT(*), AVG(doc_length) FROM chapters").fetchone()
+        return int(self.get_meta("N", N)), float(self.get_meta("avgdl", avgdl))
+
+    def apply_collection_stats(self, N, avgdl, document_frequencies):
+        """
+        Overrides the local statistics with those of the whole collection, for indexes that hold
+        only one shard of it: BM25 scores then come out exactly as on a single unsharded index.
+        `document_frequencies` maps token -> global df; only tokens present in this shard are updated.
+        """
+        tokens = [row[0] for row in self.conn.execute("SELECT token FROM vocabulary").fetchall()]
+        with self.conn:
+            self.conn.executemany("""
+                UPDATE vocabulary SET document_frequency = ? WHERE token = ?
+            """, ((document_frequencies[token], token) for token in tokens))
+        self.set_meta("N", N)
+        self.set_meta("avgdl", avgdl)
+
+    def _posting_impacts(self, k1, b):
+        """(term_id, doc_id, BM25 contribution) of every posting, with the index's collection statistics."""
+        N, avgdl = self._collection_stats()
+        rows = self.conn.execute("""
+            SELECT i.term_id, i.doc_id, i.frequency, v.document_frequency, c.doc_length
+            FROM inverted_index i
+            JOIN vocabulary v ON v.term_id = i.term_id
+            JOIN chapters c ON c.doc_id = i.doc_id
+        """).fetchall()
+        return [
+            (term_id, doc_id, bm25_idf(N, df) * bm25_tf(freq, dl, avgdl, k1, b))
+            for term_id, doc_id, freq, df, dl in rows
+        ]
+
+    def max_impact(self, k1=1.5, b=0.75):
+        """Largest BM25 contribution of any posting, e.g. to share one quantization scale across shards."""
+        return max((impact for _, _, impact in self._posting_impacts(k1, b)), default=0.0)
+
+    def build_impact_index(self, k1=1.5, b=0.75, bits=12, scale=None):
+        """
+        Precomputes the BM25 contribution (idf * tf component) of every posting for the given
+        k1/b and stores it quantized to `bits`-bit integers, sorted by impact within each token.
+        Querying then only sums integers (see BM25RetrieverSQLite.rank_impact).
+        `scale` (score per integer step) defaults to this index's max_impact() / (2**bits - 1); shards
+        of one collection must share it, or their integer scores are not comparable.
+        Call after index_dataset(); impacts are stale if the collection changes afterwards.
+        """
+        impacts = self._posting_impacts(k1, b)
+        if scale is None:
+            levels = (1 << bits) - 1
+            max_impact = max((impact for _, _, impact in impacts), default=0.0) or 1.0
+            scale = max_impact / levels
+
+        with self.conn:
+            self.conn.execute("DELETE FROM impact_index;")
+            self.conn.executemany("""
+                INSERT INTO impact_index (term_id, impact, doc_id) VALUES (?, ?, ?)
+            """, ((term_id, max(1, round(impact / scale)), doc_id) for term_id, doc_id, impact in impacts))
+
+        for key, value in (("impact_k1", k1), ("impact_b", b), ("impact_bits", bits), ("impact_scale", scale)):
+            self.set_meta(key, value)
+
+    def index_dataset(self, dataset, vocabulary=None):
+        """
+        Indexes chapters with integer ids. Each entry's doc_id is `entry["doc_id"]` if present
+        (e.g. for shards of a larger corpus), else its position in `dataset`.
+        Entries carry either `tokens` or, together with the corpus `vocabulary` (token list),
+        `token_ids`; term ids are positions in that vocabulary either way (sorted if it is built here).
+        Tokens are mapped through a given vocabulary too, and must all be in it (ValueError otherwise).
+        """
+        ids_given = vocabulary is not None     # token_ids refer to the caller's vocabulary
+        if vocabulary is None:
+            vocabulary = sorted({token for entry in dataset for token in entry["tokens"]})
+            token_to_id = {token: term_id for term_id, token in enumerate(vocabulary)}
+        else:
+            token_to_id = None      # only built if some entry carries tokens instead of ids
+        document_frequencies = Counter()
+
+        with self.conn:
+            for position, entry in enumerate(dataset):
+                if "token_ids" in entry and ids_given:
+                    term_ids = entry["token_ids"]
+                else:
+                    if token_to_id is None:
+                        token_to_id = {token: term_id for term_id, token in enumerate(vocabulary)}
+                    missing = [token for token in entry["tokens"] if token not in token_to_id]
+                    if missing:
+                        raise ValueError(f"Tokens of chapter {entry.get('chapter_id')!r} are not in the given "
+                                         f"vocabulary: {sorted(set(missing))[:10]}")
+                    term_ids = [token_to_id[token] for token in entry["tokens"]]
+                document_frequencies.update(self.add_chapter(entry.get("doc_id", position), entry, term_ids, vocabulary))
+
+            self.write_vocabulary(vocabulary, document_frequencies)
+
+    def add_chapter(self, doc_id, entry, term_ids, vocabulary):
+        """
+        Inserts one chapter: its row, postings, term vector and positions. `vocabulary[term_id]` must give the
+        token of every id in `term_ids`. Positions come from the entry's `token_offsets` (parallel to
+        `term_ids`, see Preprocessor.preprocess_with_offsets) when it has them, else they are guessed
+        from the surface words. Returns the chapter's distinct term ids (for the dfs).
+        The caller owns the transaction, see index_dataset() and IR_2025S.build_pipeline.
+        """
+        text = entry["text"]
+
+        # chapter
+        self.conn.execute("""
+            INSERT INTO chapters (doc_id, chapter_id, book, chapter_title, text, doc_length)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(doc_id) DO UPDATE SET
+                chapter_id = excluded.chapter_id,
+                book = excluded.book,
+                chapter_title = excluded.chapter_title,
+                text = excluded.text,
+                doc_length = excluded.doc_length
+        """, (doc_id, entry["chapter_id"], entry["book"], entry["chapter_title"], text, len(term_ids)))
+
+        # index & frequencies
+        term_counts = Counter(term_ids)
+        self.conn.executemany("""
+            INSERT INTO inverted_index (term_id, doc_id, frequency)
+            VALUES (?, ?, ?)
+            ON CONFLICT(term_id, doc_id) DO UPDATE SET
+                frequency = excluded.frequency
+        """, ((term_id, doc_id, freq) for term_id, freq in term_counts.items()))
+
+        # term vector
+        vector_terms = sorted(term_counts)
+        self.conn.execute("""
+            INSERT INTO doc_vectors (doc_id, term_ids, frequencies)
+            VALUES (?, ?, ?)
+            ON CONFLICT(doc_id) DO UPDATE SET
+                term_ids = excluded.term_ids,
+                frequencies = excluded.frequencies
+        """, (doc_id, array("I", vector_terms).tobytes(),
+              array("I", (term_counts[term_id] for term_id in vector_terms)).tobytes()))
+
+        # positions
+        token_offsets = entry.get("token_offsets")
+        if token_offsets is not None:
+            positions = defaultdict(lambda: array("I"))
+            for term_id, offset in zip(term_ids, token_offsets):
+                positions[term_id].append(offset)
+        else:
+            chapter_terms = {vocabulary[term_id]: term_id for term_id in term_counts}
+            positions = {chapter_terms[token]: offsets
+                         for token, offsets in token_char_offsets(text, chapter_terms).items()}
+        self.conn.executemany("""
+            INSERT INTO positions (term_id, doc_id, offsets)
+            VALUES (?, ?, ?)
+            ON CONFLICT(term_id, doc_id) DO UPDATE SET
+                offsets = excluded.offsets
+        """, ((term_id, doc_id, offsets.tobytes()) for term_id, offsets in positions.items()))
+        return term_counts.keys()
+
+    def write_vocabulary(self, vocabulary, document_frequencies):
+        """Vocabulary rows for the terms that occur in this index (`document_frequencies`: term_id -> df)."""
+        # noinspection SqlResolve
+        self.conn.executemany("""
+            INSERT INTO vocabulary (term_id, token, document_frequency)
+            VALUES (?, ?, ?)
+            ON CONFLICT(term_id) DO UPDATE SET
+                document_frequency = excluded.document_frequency
+        """, ((term_id, vocabulary[term_id], df) for term_id, df in sorted(document_frequencies.items())))
+
+    def index_expansions(self, dataset, expansions, model_name=None, bits=8):
+        """
+        Indexes chapters by learned term weights instead of term counts (document-side expansion,
+        see IR_2025S.expansion): `expansions[i]` maps term -> weight for `dataset[i]`.
+        Weights are quantized to `bits`-bit integers and stored both as the posting "frequency" and
+        as impact postings, so the index is queried with BM25RetrieverSQLite.rank_impact(), which
+        then sums learned weights instead of BM25 contributions. Positions are kept for the
+        expansion terms that literally occur in the text, for snippets.
+        """
+        vocabulary = sorted({term for weights in expansions for term in weights})
+        token_to_id = {token: term_id for term_id, token in enumerate(vocabulary)}
+        levels = (1 << bits) - 1
+        scale = max((max(weights.values(), default=0.0) for weights in expansions), default=0.0) / levels or 1.0
+        document_frequencies = Counter()
+
+        with self.conn:
+            for position, (entry, weights) in enumerate(zip(dataset, expansions)):
+                doc_id = entry.get("doc_id", position)
+                impacts = {token_to_id[term]: max(1, round(weight / scale)) for term, weight in weights.items()}
+                document_frequencies.update(impacts.keys())
+
                 self.conn.execute("""
-                    INSERT INTO vocabulary (token, document_frequency)
-                    VALUES (?, ?)
-                    ON CONFLICT(token) DO UPDATE SET
-                        document_frequency = excluded.document_frequency
-                """, (token, len(chapters)))
+                    INSERT INTO chapters (doc_id, chapter_id, book, chapter_title, text, doc_length)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (doc_id, entry["chapter_id"], entry["book"], entry["chapter_title"], entry["text"], len(impacts)))
+                self.conn.executemany("""
+                    INSERT INTO inverted_index (term_id, doc_id, frequency) VALUES (?, ?, ?)
+                """, ((term_id, doc_id, impact) for term_id, impact in impacts.items()))
+                self.conn.executemany("""
+                    INSERT INTO impact_index (term_id, impact, doc_id) VALUES (?, ?, ?)
+                """, ((term_id, impact, doc_id) for term_id, impact in impacts.items()))
+                self.conn.executemany("""
+                    INSERT INTO positions (term_id, doc_id, offsets) VALUES (?, ?, ?)
+                """, ((token_to_id[token], doc_id, offsets.tobytes())
+                      for token, offsets in token_char_offsets(entry["text"], weights).items()))
+
+            self.conn.executemany("""
+                INSERT INTO vocabulary (term_id, token, document_frequency) VALUES (?, ?, ?)
+            """, ((term_id, vocabulary[term_id], df) for term_id, df in sorted(document_frequencies.items())))
+
+        for key, value in (("index_type", "expansion"), ("expansion_model", model_name),
+                           ("impact_bits", bits), ("impact_scale", scale)):
+            self.set_meta(key, value)
 
     def close(self):
+        # fold the WAL back into the main file so read-only/immutable readers see everything
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+        self.conn.execute("PRAGMA optimize;")
         self.conn.close()
 
 
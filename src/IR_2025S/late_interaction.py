@@ -0,0 +1,286 @@
+# IR_2025S/late_interaction.py
+#
+# Multi-vector (ColBERT-style) dense index: every paragraph keeps one embedding per token and
+# a query is scored by MaxSim, sum over query tokens of the best matching paragraph token.
+# Token embeddings are compressed the ColBERTv2 way (centroid id + a few bits of residual per
+# dimension) and stored as .npy files that are memory-mapped at load time.
+#
+# Budget per paragraph (n tokens, D = model dim, d = projected dim, b = residual bits):
+#   flat single-vector index : 4 * D bytes                      (768-d DPR: 3072 B)
+#   late interaction         : n * (2 + d * b / 8) + 8 bytes    (d=128, b=2, n~30: ~1.0 KB)
+# plus the IVF lists (4 bytes per distinct (centroid, paragraph) pair) and the tiny centroid
+# and PCA tables. Latency is one query-encoder pass, a centroid scan, a MaxSim over centroid
+# scores for every candidate and an exact MaxSim over decompressed tokens for the best
+# `max_candidates` of them; pipeline/bench_late_interaction.py measures both against the flat index.
+
+import json
+import pickle
+import faiss
+import torch
+import numpy as np
+from pathlib import Path
+from typing import List, Tuple, Dict
+from IR_2025S.results import SearchHit
+from IR_2025S.filters import runs_mask
+
+LATE_INDEX_FILES = ("codes", "residuals", "doc_offsets", "ivf_offsets", "ivf_pids")
+QUERY_MAXLEN = 64
+
+
+class LateInteractionRetriever:
+    """
+    Late-interaction dense mode on top of a loaded DenseRetrieverFAISS, whose context encoder
+    embeds both paragraph and query tokens (the same encoder on both sides keeps token vectors
+    comparable) and whose corpus resolves paragraph text. Paragraphs and their metadata are
+    exactly those of the single-vector index, so results are interchangeable with
+    DenseRetrieverFAISS.search().
+    """
+
+    def __init__(self,
+                 encoder,
+                 dim: int = 128,
+                 nbits: int = 2,
+                 ncentroids: int = 1024,
+                 doc_maxlen: int = 180,
+                 nprobe: int = 4,
+                 max_candidates: int = 256):
+        if 8 % nbits or dim % (8 // nbits):
+            raise ValueError(f"nbits must divide 8 and dim must be a multiple of {8 // nbits}")
+        self.encoder = encoder
+        self.dim = dim
+        self.nbits = nbits
+        self.ncentroids = ncentroids
+        self.doc_maxlen = doc_maxlen
+        self.nprobe = nprobe
+        self.max_candidates = max_candidates
+
+        self.pca = None                 # faiss.PCAMatrix, None when dim == model dim
+        self.centroids = None           # (ncentroids, dim) float32, unit norm
+        self.bucket_cutoffs = None      # (2**nbits - 1,) residual quantization boundaries
+        self.bucket_weights = None      # (2**nbits,) reconstruction value of each bucket
+        self.codes = None               # (n_tokens,) centroid id per token
+        self.residuals = None           # (n_tokens, dim * nbits / 8) packed residual codes
+        self.doc_offsets = None         # (n_paragraphs + 1,) token range of each paragraph
+        self.ivf_offsets = None         # (ncentroids + 1,) range of each centroid in ivf_pids
+        self.ivf_pids = None            # paragraphs having at least one token in the centroid
+        self.paragraph_metadata = []
+
+    # ---- encoding ----
+
+    def _token_embeddings(self, texts: List[str], max_length: int) -> List[np.ndarray]:
+        """Per-text (n_tokens, dim) unit vectors; [SEP] and padding dropped, [CLS] kept so no text is empty."""
+        inputs = self.encoder.ctx_tokenizer(
+            texts,
+            return_tensors="pt",
+            padding=True,
+            truncation=True,
+            max_length=max_length,
+            return_special_tokens_mask=True
+        )
+        special = inputs.pop("special_tokens_mask").bool()
+        with torch.no_grad():
+            hidden = self.encoder.ctx_encoder(**inputs, output_hidden_states=True).hidden_states[-1]
+
+        keep = inputs["attention_mask"].bool() & ~special
+        keep[:, 0] = True
+        flat = hidden[keep].numpy()
+        if self.pca is not None:
+            flat = self.pca.apply_py(np.ascontiguousarray(flat))
+        faiss.normalize_L2(flat)
+        return np.split(flat, np.cumsum(keep.sum(dim=1).numpy())[:-1])
+
+    def _encode_batches(self, texts: List[str], batch_size: int):
+        for i in range(0, len(texts), batch_size):
+            yield self._token_embeddings(texts[i:i + batch_size], self.doc_maxlen)
+
+    # ---- compression ----
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def _compress(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        codes = self._assign(vectors)
+        buckets = np.searchsorted(self.bucket_cutoffs, vectors - self.centroids[codes]).astype(np.uint8)
+        per_byte = 8 // self.nbits
+        buckets = buckets.reshape(len(vectors), -1, per_byte)
+        packed = np.zeros(buckets.shape[:2], dtype=np.uint8)
+        for j in range(per_byte):
+            packed |= buckets[:, :, j] << (self.nbits * j)
+        return codes.astype(self.codes_dtype), packed
+
+    def _decompress(self, token_idx: np.ndarray) -> np.ndarray:
+        per_byte = 8 // self.nbits
+        shifts = (np.arange(per_byte, dtype=np.uint8) * self.nbits)
+        buckets = (self.residuals[token_idx][:, :, None] >> shifts) & ((1 << self.nbits) - 1)
+        vectors = self.centroids[self.codes[token_idx]] + self.bucket_weights[buckets.reshape(len(token_idx), -1)]
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    @property
+    def codes_dtype(self):
+        return np.uint16 if self.ncentroids <= 2**16 else np.int32
+
+    def _train(self, sample: List[str], batch_size: int):
+        """PCA, centroids and residual buckets from the token embeddings of a paragraph sample."""
+        pca, self.pca = self.pca, None
+        vectors = np.vstack([v for batch in self._encode_batches(sample, batch_size) for v in batch])
+        if self.dim < vectors.shape[1]:
+            pca = faiss.PCAMatrix(vectors.shape[1], self.dim)
+            pca.train(vectors)
+            vectors = pca.apply_py(vectors)
+            faiss.normalize_L2(vectors)
+        elif self.dim > vectors.shape[1]:
+            raise ValueError(f"dim={self.dim} is larger than the encoder dimension {vectors.shape[1]}")
+        self.pca = pca
+
+        self.ncentroids = min(self.ncentroids, len(vectors))
+        kmeans = faiss.Kmeans(self.dim, self.ncentroids, niter=20, seed=13, spherical=True, verbose=False)
+        kmeans.train(vectors)
+        self.centroids = kmeans.centroids.astype(np.float32)
+
+        residuals = vectors - self.centroids[self._assign(vectors)]
+        levels = 2 ** self.nbits
+        self.bucket_cutoffs = np.quantile(residuals, np.arange(1, levels) / levels).astype(np.float32)
+        self.bucket_weights = np.quantile(residuals, (np.arange(levels) + 0.5) / levels).astype(np.float32)
+
+    # ---- build / persist ----
+
+    def build_index(self, dataset: List[Dict], save_path: str = None,
+                    train_paragraphs: int = 2000, batch_size: int = 16):
+        """Encodes every paragraph token by token; only compressed codes are kept in memory."""
+        print("📖 Processing chapters into paragraphs...")
+        paragraphs, self.paragraph_metadata = self.encoder.split_dataset(dataset)
+        print(f"📝 Created {len(paragraphs)} paragraphs from {len(dataset)} chapters")
+
+        rng = np.random.default_rng(13)
+        sample = rng.choice(len(paragraphs), size=min(train_paragraphs, len(paragraphs)), replace=False)
+        print(f"🎯 Training PCA, {self.ncentroids} centroids and {self.nbits}-bit residuals on {len(sample)} paragraphs...")
+        self._train([paragraphs[i] for i in sample], batch_size)
+
+        print("🔢 Encoding and compressing paragraph tokens...")
+        codes, residuals, lengths = [], [], []
+        for batch in self._encode_batches(paragraphs, batch_size):
+            vectors = np.vstack(batch)
+            batch_codes, batch_residuals = self._compress(vectors)
+            codes.append(batch_codes)
+            residuals.append(batch_residuals)
+            lengths.extend(len(v) for v in batch)
+
+        self.codes = np.concatenate(codes)
+        self.residuals = np.concatenate(residuals)
+        self.doc_offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self._build_ivf()
+        print(f"✅ Late-interaction index built with {len(self.codes)} token vectors for {len(paragraphs)} paragraphs")
+
+        if save_path:
+            self.save_index(save_path)
+
+    def _build_ivf(self):
+        n_paragraphs = len(self.doc_offsets) - 1
+        pids = np.repeat(np.arange(n_paragraphs, dtype=np.int64), np.diff(self.doc_offsets))
+        pairs = np.unique(self.codes.astype(np.int64) * n_paragraphs + pids)     # sorted by centroid, then paragraph
+        self.ivf_pids = (pairs % n_paragraphs).astype(np.int32)
+        counts = np.bincount(pairs // n_paragraphs, minlength=len(self.centroids))
+        self.ivf_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def save_index(self, save_path: str):
+        """Saves the index as a directory of .npy arrays plus the paragraph metadata."""
+        save_path = Path(save_path)
+        save_path.mkdir(parents=True, exist_ok=True)
+        for name in LATE_INDEX_FILES + ("centroids", "bucket_cutoffs", "bucket_weights"):
+            np.save(save_path / f"{name}.npy", getattr(self, name))
+        if self.pca is not None:
+            faiss.write_VectorTransform(self.pca, str(save_path / "pca.bin"))
+        with open(save_path / "metadata.pkl", "wb") as f:
+            pickle.dump(self.paragraph_metadata, f)
+        config = {"dim": self.dim, "nbits": self.nbits, "ncentroids": self.ncentroids, "doc_maxlen": self.doc_maxlen}
+        (save_path / "config.json").write_text(json.dumps(config, indent=4), encoding="utf-8")
+        print(f"💾 Saved late-interaction index to: {save_path}")
+
+    def load_index(self, load_path: str, corpus_path: str = None):
+        """Memory-maps the token arrays; only centroids, buckets and metadata are read into memory."""
+        load_path = Path(load_path)
+        config = json.loads((load_path / "config.json").read_text(encoding="utf-8"))
+        self.dim, self.nbits, self.ncentroids, self.doc_maxlen = (
+            config["dim"], config["nbits"], config["ncentroids"], config["doc_maxlen"])
+        for name in LATE_INDEX_FILES:
+            setattr(self, name, np.load(load_path / f"{name}.npy", mmap_mode="r"))
+        for name in ("centroids", "bucket_cutoffs", "bucket_weights"):
+            setattr(self, name, np.load(load_path / f"{name}.npy"))
+        pca_path = load_path / "pca.bin"
+        self.pca = faiss.read_VectorTransform(str(pca_path)) if pca_path.exists() else None
+        with open(load_path / "metadata.pkl", "rb") as f:
+            self.paragraph_metadata = pickle.load(f)
+        if self.encoder.corpus_path is None:
+            self.encoder.corpus_path = Path(corpus_path) if corpus_path else load_path.parent / "corpus.arrow"
+        print(f"📂 Loaded late-interaction index from: {load_path}")
+
+    def memory_components(self) -> Dict:
+        """Index arrays and metadata (the encoder is the dense retriever's), for IR_2025S.memory_report."""
+        components = {name: getattr(self, name) for name in LATE_INDEX_FILES
+                      + ("centroids", "bucket_cutoffs", "bucket_weights", "pca")}
+        components["paragraph_metadata"] = self.paragraph_metadata
+        return components
+
+    def footprint(self) -> Dict[str, int]:
+        """Bytes per index component next to what a flat single-vector index of the same paragraphs needs."""
+        sizes = {name: int(getattr(self, name).nbytes) for name in LATE_INDEX_FILES + ("centroids",)}
+        sizes["total"] = sum(sizes.values())
+        sizes["flat_single_vector"] = (len(self.doc_offsets) - 1) * self.encoder.embedding_dim * 4
+        return sizes
+
+    # ---- search ----
+
+    def _token_ranges(self, pids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Token indices of the given paragraphs, concatenated, and where each paragraph starts in them."""
+        starts = np.asarray(self.doc_offsets[pids])
+        lengths = np.asarray(self.doc_offsets[pids + 1]) - starts
+        segment_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        token_idx = np.arange(lengths.sum()) + np.repeat(starts - segment_starts, lengths)
+        return token_idx, segment_starts
+
+    def hit_metadata(self, hit: SearchHit) -> Dict:
+        return self.paragraph_metadata[hit.passage_id]
+
+    def hit_text(self, hit: SearchHit) -> str:
+        return self.encoder.paragraph_text(self.paragraph_metadata[hit.passage_id])
+
+    def search(self, query: str, top_k: int = 5, nprobe: int = None, max_candidates: int = None,
+               chapter_filter=None) -> List[SearchHit]:
+        """
+        MaxSim search; returns paragraph SearchHits like DenseRetrieverFAISS.search(). A ChapterFilter
+        drops candidates before any MaxSim, so only paragraphs it allows are scored.
+        """
+        if self.codes is None:
+            raise ValueError("Index not built or loaded. Call build_index() or load_index() first.")
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        max_candidates = max_candidates or self.max_candidates
+
+        query_vectors = self._token_embeddings([query], QUERY_MAXLEN)[0]
+        centroid_scores = query_vectors @ self.centroids.T
+
+        # candidate generation: paragraphs sharing a centroid with one of the query tokens' nearest ones
+        cells = np.unique(np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe])
+        pids = np.unique(np.concatenate([self.ivf_pids[self.ivf_offsets[c]:self.ivf_offsets[c + 1]] for c in cells]))
+        if chapter_filter is not None:
+            # paragraph ids are those of the single-vector index, so its resolved runs apply
+            pids = pids[runs_mask(self.encoder.passage_runs(chapter_filter), len(self.doc_offsets) - 1)[pids]]
+        if not len(pids):
+            return []
+
+        # stage 1: MaxSim on centroid scores alone (no decompression) to cut the candidate set
+        token_idx, segment_starts = self._token_ranges(pids)
+        if len(pids) > max_candidates:
+            approx = np.maximum.reduceat(centroid_scores[:, self.codes[token_idx]], segment_starts, axis=1).sum(axis=0)
+            pids = np.sort(pids[np.argpartition(-approx, max_candidates - 1)[:max_candidates]])
+            token_idx, segment_starts = self._token_ranges(pids)
+
+        # stage 2: exact MaxSim over the decompressed token embeddings of the survivors
+        token_vectors = self._decompress(token_idx)
+        scores = np.maximum.reduceat(query_vectors @ token_vectors.T, segment_starts, axis=1).sum(axis=0)
+
+        top = np.argsort(-scores)[:top_k]
+        return [
+            SearchHit(self, score, self.paragraph_metadata[pid].get("doc_id", -1), pid)
+            for score, pid in zip(scores[top].tolist(), pids[top].tolist())
+        ]
@@ -14,8 +14,11 @@ def str_to_int(word):
 
 def load_books_from_txt(folder_path):
     """Loads books from a folder of .txt files and returns a formatted dataset."""
-    dataset = []
+    return list(iter_chapters_from_txt(folder_path))
 
+
+def iter_chapters_from_txt(folder_path):
+    """Yields the chapters of a folder of .txt books one at a time, in book order (for streaming builds)."""
     for filename in sorted(os.listdir(folder_path)):
         if not filename.endswith(".txt"):
             continue
@@ -51,7 +54,7 @@ def load_books_from_txt(folder_path):
                 # Save previous chapter before starting new one
                 if current_chapter_str_num and current_text:
                     chapter_id = f"{book_number}_{current_chapter_int_num}"
-                    dataset.append({
+                    yield {
                         "chapter_id": chapter_id,
                         "book": book_title,
                         "book_number": book_number,
@@ -59,7 +62,7 @@ def load_books_from_txt(folder_path):
                         "chapter_int_number": current_chapter_int_num,
                         "chapter_title": current_chapter_title,
                         "text": " ".join(current_text)
-                    })
+                    }
                     current_text = []
 
                 current_chapter_str_num = stripped
@@ -88,7 +91,7 @@ def load_books_from_txt(folder_path):
         # Save final chapter
         if current_chapter_str_num and current_text:
             chapter_id = f"{book_number}_{current_chapter_int_num}"
-            dataset.append({
+            yield {
                 "chapter_id": chapter_id,
                 "book": book_title,
                 "book_number": book_number,
@@ -96,6 +99,4 @@ def load_books_from_txt(folder_path):
                 "chapter_int_number": current_chapter_int_num,
                 "chapter_title": current_chapter_title,
                 "text": " ".join(current_text)
-            })
-
-    return dataset
\ No newline at end of file
+            }
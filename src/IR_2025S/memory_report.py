@@ -0,0 +1,247 @@
+# IR_2025S/memory_report.py
+#
+# Where the RAM goes. Three views that complement each other:
+#   - RSS before/after every load step: what the process really pays, including C/C++ heaps
+#     (SQLite page cache, FAISS, torch, spaCy) that Python cannot see;
+#   - tracemalloc snapshots around the same steps: Python-level allocations, by source file;
+#   - object-graph sizing of the loaded components (metadata lists, term dictionary, models, ...),
+#     split into private heap bytes and memory-mapped bytes (file-backed, shared between processes).
+#
+# Load steps in the retrievers are wrapped in memory_step(), which does nothing unless a
+# MemoryProfiler is active, so the instrumentation costs nothing in normal runs.
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+import types
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict
+import numpy as np
+
+_active = []        # stack of active MemoryProfilers; memory_step() records with the innermost
+
+# shared by everything, never attributed to a component
+_SKIP_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+               types.MethodType, types.CodeType, types.FrameType)
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process (peak RSS where /proc is not available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _is_torch_module(obj):
+    return callable(getattr(obj, "named_parameters", None)) and callable(getattr(obj, "buffers", None))
+
+
+def _torch_bytes(obj, seen):
+    """Parameter and buffer bytes of a torch module, or the storage of a tensor."""
+    tensors = list(obj.parameters()) + list(obj.buffers()) if _is_torch_module(obj) else [obj]
+    total = 0
+    for tensor in tensors:
+        key = ("torch", tensor.data_ptr())
+        if key not in seen:
+            seen.add(key)
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def object_footprint(obj, seen=None) -> Dict[str, int]:
+    """
+    Bytes reachable from `obj`: {"heap": private memory, "mapped": memory-mapped file data}.
+    Objects already in `seen` (ids) are not counted again, so one set can be shared across the
+    components of a report to avoid double counting shared encoders or corpora. Objects may
+    define memory_footprint() returning the same keys (e.g. SQLiteReadPool).
+    """
+    seen = set() if seen is None else seen
+    heap = mapped = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if o is None or id(o) in seen or isinstance(o, _SKIP_TYPES):
+            continue
+        seen.add(id(o))
+
+        custom = getattr(o, "memory_footprint", None)
+        if callable(custom):
+            footprint = custom()
+            heap += footprint.get("heap", 0)
+            mapped += footprint.get("mapped", 0)
+            continue
+
+        module = type(o).__module__
+        if isinstance(o, np.memmap):
+            mapped += o.nbytes
+        elif isinstance(o, np.ndarray):
+            heap += sys.getsizeof(o)     # includes the data buffer only if the array owns it
+            stack.append(o.base)
+        elif _is_torch_module(o) or (module.startswith("torch") and hasattr(o, "data_ptr")):
+            heap += _torch_bytes(o, seen)   # models are sized by their weights, not their Python graph
+        elif module.startswith("faiss"):
+            if hasattr(o, "ntotal"):
+                import faiss
+                heap += faiss.serialize_index(o).nbytes    # codes + structure, as held in memory
+            elif hasattr(o, "d_in"):                         # linear transform, e.g. PCAMatrix
+                heap += 4 * o.d_in * (o.d_out + 1)
+        elif module.startswith("pyarrow"):
+            mapped += getattr(o, "nbytes", 0)   # corpus columns point into memory-mapped Arrow files
+        else:
+            heap += sys.getsizeof(o)
+            if isinstance(o, dict):
+                stack.extend(o.keys())
+                stack.extend(o.values())
+            elif isinstance(o, (list, tuple, set, frozenset)) or type(o).__name__ == "deque":
+                stack.extend(o)
+            elif not isinstance(o, (str, bytes, bytearray, int, float, complex, bool)):
+                if hasattr(o, "__dict__"):
+                    stack.append(vars(o))
+                for cls in type(o).__mro__:
+                    for slot in getattr(cls, "__slots__", ()):
+                        stack.append(getattr(o, slot, None))
+    return {"heap": heap, "mapped": mapped}
+
+
+class MemoryProfiler:
+    """
+    Records load steps and component sizes while active:
+
+        with MemoryProfiler() as profiler:
+            retriever = HybridRetriever(...)        # steps are recorded by memory_step()
+            profiler.measure_components("hybrid", retriever)
+        profiler.save("memory_report.json")
+
+    tracemalloc is started for the profiler's lifetime unless already tracing (`trace=False`
+    keeps only RSS, without tracing's slowdown of the steps); `top_files` source files with the
+    largest allocation growth are kept per top-level step.
+    """
+
+    def __init__(self, trace=True, top_files=5):
+        self.trace = trace
+        self.top_files = top_files
+        self.steps = []
+        self.components = {}
+        self._seen = set()
+        self._peaks = []                # running tracemalloc peak of each open step
+        self._started_tracing = False
+        self.rss_baseline = None
+
+    def __enter__(self):
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self.rss_baseline = rss_bytes()
+        _active.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _active.remove(self)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextmanager
+    def step(self, name):
+        tracing = tracemalloc.is_tracing()
+        rss_before = rss_bytes()
+        # snapshots are slow and large: only top-level steps get the by-file breakdown, so that
+        # nested steps do not inflate the time and RSS of their parent
+        snapshot = tracemalloc.take_snapshot() if tracing and not self._peaks and self.top_files else None
+        if tracing:
+            traced_before, peak = tracemalloc.get_traced_memory()
+            if self._peaks:         # keep the enclosing step's peak before resetting it
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            tracemalloc.reset_peak()
+        record = {"step": name, "depth": len(self._peaks)}
+        self.steps.append(record)       # in start order, so nested steps follow their parent
+        self._peaks.append(0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 3)
+            record["rss_before"] = rss_before
+            record["rss_after"] = rss_bytes()
+            record["rss_delta"] = record["rss_after"] - rss_before
+            peak = self._peaks.pop()
+            if tracing and tracemalloc.is_tracing():
+                traced_after, step_peak = tracemalloc.get_traced_memory()
+                peak = max(peak, step_peak)
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+                record["traced_delta"] = traced_after - traced_before
+                record["traced_peak"] = peak - traced_before
+                if snapshot is not None:
+                    record["top_files"] = [
+                        {"file": stat.traceback[0].filename, "size_diff": stat.size_diff}
+                        for stat in tracemalloc.take_snapshot().compare_to(snapshot, "filename")[:self.top_files]
+                    ]
+
+    def measure(self, name, obj):
+        """Sizes one object graph; parts already counted under another name are skipped."""
+        footprint = object_footprint(obj, self._seen)
+        self.components[name] = {"type": type(obj).__name__, **footprint}
+        return footprint
+
+    def measure_components(self, prefix, owner):
+        """Sizes every entry of `owner.memory_components()`, recursing into components that have their own."""
+        for name, component in owner.memory_components().items():
+            if component is None:
+                continue
+            if hasattr(component, "memory_components"):
+                self.measure_components(f"{prefix}.{name}", component)
+            else:
+                self.measure(f"{prefix}.{name}", component)
+
+    def report(self) -> Dict:
+        rss = rss_bytes()
+        return {
+            "rss_baseline": self.rss_baseline,
+            "rss": rss,
+            "rss_loaded": rss - (self.rss_baseline or 0),
+            "heap_total": sum(c["heap"] for c in self.components.values()),
+            "mapped_total": sum(c["mapped"] for c in self.components.values()),
+            "steps": self.steps,
+            "components": self.components,
+        }
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+@contextmanager
+def memory_step(name):
+    """Marks a load step for the active MemoryProfiler; a no-op when none is active."""
+    if not _active:
+        yield
+        return
+    with _active[-1].step(name):
+        yield
+
+
+def format_report(report) -> str:
+    """Plain-text tables of a MemoryProfiler.report()."""
+    mb = 1024 * 1024
+    lines = [f"{'load step':<34}{'seconds':>9}{'RSS Δ MB':>10}{'traced Δ MB':>13}{'peak MB':>9}"]
+    for step in report["steps"]:
+        name = "  " * step["depth"] + step["step"]
+        lines.append(f"{name:<34}{step['seconds']:>9.2f}{step['rss_delta'] / mb:>10.1f}"
+                     f"{step.get('traced_delta', 0) / mb:>13.1f}{step.get('traced_peak', 0) / mb:>9.1f}")
+    lines.append("")
+    lines.append(f"{'component':<34}{'type':<24}{'heap MB':>9}{'mapped MB':>11}")
+    for name, component in sorted(report["components"].items(), key=lambda item: -item[1]["heap"]):
+        lines.append(f"{name:<34}{component['type'][:23]:<24}{component['heap'] / mb:>9.2f}{component['mapped'] / mb:>11.2f}")
+    lines.append(f"{'total':<58}{report['heap_total'] / mb:>9.2f}{report['mapped_total'] / mb:>11.2f}")
+    lines.append(f"RSS: {report['rss_baseline'] / mb:.1f} MB at start, {report['rss'] / mb:.1f} MB loaded")
+    return "\n".join(lines)
@@ -1,5 +1,6 @@
-import re
-import spacy
+from bisect import bisect_right
+from IR_2025S.segmentation import tokenize, iter_token_spans
+from IR_2025S.memory_report import memory_step
 
 
 class Preprocessor:
@@ -7,37 +8,67 @@ class Preprocessor:
         self.remove_stopwords = stopwords
         self.lemmatize = lemmatize
         self.preserve_punct = preserve_punct
-        self.nlp = spacy.load("en_core_web_sm", disable=["ner", "parser"])
+        self._nlp = None
+
+    @property
+    def nlp(self):
+        # spaCy and its model are loaded on first use: creating a Preprocessor costs nothing,
+        # so scripts can build one before argument parsing or on paths that never normalize
+        if self._nlp is None:
+            import spacy
+            with memory_step("preprocessor.spacy"):
+                self._nlp = spacy.load("en_core_web_sm", disable=["ner", "parser"])
+        return self._nlp
 
     def tokenize(self, text):
         """
         Custom tokenizer that ensures whitespace before punctuation.
         E.g., "Hello!" -> ["Hello", "!"]
         """
-        spaced = re.sub(r"([^\w\s])", r" \1 ", text)        # add space around punctuation
-        spaced = re.sub(r"\s{2,}", " ", spaced)     # remove extra spaces
-        return spaced.strip().split()
+        return tokenize(text)       # single regex pass, no intermediate strings
 
-    def normalize(self, tokens):
-        """
-        Applies spaCy NLP processing: lowercasing, lemmatization, stopword/punctuation filtering.
-        """
-        doc = self.nlp(" ".join(tokens))
-        normalized = []
+    def _normalized(self, doc):
+        """(spaCy token, normalized form) of the tokens kept by normalize()."""
         for token in doc:
             if not token.is_alpha and not self.preserve_punct:
                 continue
             if self.remove_stopwords and token.is_stop:
                 continue
             norm = token.lemma_ if self.lemmatize else token.text
-            normalized.append(norm.lower())
-        return normalized
+            yield token, norm.lower()
+
+    def normalize(self, tokens):
+        """
+        Applies spaCy NLP processing: lowercasing, lemmatization, stopword/punctuation filtering.
+        """
+        doc = self.nlp(" ".join(tokens))
+        return [norm for _, norm in self._normalized(doc)]
 
     def preprocess_text(self, text):
         tokens = self.tokenize(text)
         return self.normalize(tokens)
 
+    def preprocess_with_offsets(self, text):
+        """
+        preprocess_text() plus, for every token, the character offset in `text` of the word spaCy
+        produced it from. Irregular lemmas keep their position too, e.g. "went" -> "go".
+        """
+        spans = list(iter_token_spans(text))
+        # start of every regex token in the space-joined string spaCy sees
+        joined_starts, position = [], 0
+        for start, end in spans:
+            joined_starts.append(position)
+            position += end - start + 1
+        doc = self.nlp(" ".join(text[start:end] for start, end in spans))
+
+        normalized, offsets = [], []
+        for token, norm in self._normalized(doc):
+            i = bisect_right(joined_starts, token.idx) - 1     # spaCy may split a regex token further
+            normalized.append(norm)
+            offsets.append(spans[i][0] + token.idx - joined_starts[i])
+        return normalized, offsets
+
     def preprocess_dataset(self, dataset):
         for entry in dataset:
-            entry["tokens"] = self.preprocess_text(entry["text"])
+            entry["tokens"], entry["token_offsets"] = self.preprocess_with_offsets(entry["text"])
         return dataset
\ No newline at end of file
@@ -0,0 +1,162 @@
+# IR_2025S/query_cache.py
+
+import random
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List
+import faiss
+import numpy as np
+from IR_2025S.segmentation import WORD_RE
+from IR_2025S.results import SearchHit
+
+
+def normalize_query(query: str) -> str:
+    """Case- and punctuation-insensitive form of a query: "Who is Harry's godfather?" -> "who is harry s godfather"."""
+    return " ".join(WORD_RE.findall(query.casefold()))
+
+
+class _Entry:
+    __slots__ = ("entry_id", "keys", "embedding", "results", "top_k")
+
+    def __init__(self, entry_id, key, embedding, results, top_k):
+        self.entry_id = entry_id
+        self.keys = [key]
+        self.embedding = embedding
+        self.results = results
+        self.top_k = top_k
+
+
+class SemanticQueryCache:
+    """
+    Two-level cache in front of a dense retriever's encode + FAISS search:
+
+    1. exact: the normalized query text is looked up before anything else, so a repeated
+       query skips the question encoder entirely;
+    2. semantic: otherwise the query is encoded and searched in a small inner-product index over
+       the embeddings of recently cached queries; a neighbour with cosine similarity >= `threshold`
+       (a paraphrase) donates its candidate list and the FAISS search is skipped.
+
+    Entries are evicted least recently used beyond `capacity`. A fraction `drift_sample_rate` of
+    semantic hits is also searched for real, and the overlap of the two candidate lists is tracked
+    as the quality drift that the threshold costs.
+
+    One cache can serve several query threads: lookups, inserts and evictions hold a lock, while
+    encoding and the real FAISS search run outside it.
+    """
+
+    def __init__(self, dim: int, capacity: int = 1024, threshold: float = 0.95,
+                 drift_sample_rate: float = 0.05, seed: int = 13):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.drift_sample_rate = drift_sample_rate
+        self._rng = random.Random(seed)
+
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self._entries = OrderedDict()       # entry_id -> _Entry, LRU order
+        self._keys = {}                     # normalized query -> entry_id
+        self._next_id = 0
+        self._lock = threading.Lock()       # guards the LRU, the key map and the FAISS id map
+        self.stats = {"queries": 0, "exact_hits": 0, "semantic_hits": 0, "misses": 0,
+                      "evictions": 0, "drift_checks": 0, "drift_overlap_sum": 0.0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def empty_copy(self) -> "SemanticQueryCache":
+        """A new, empty cache with the same settings, for a retriever over another index."""
+        return SemanticQueryCache(self._index.d, capacity=self.capacity, threshold=self.threshold,
+                                  drift_sample_rate=self.drift_sample_rate)
+
+    def clear(self):
+        """Drops every entry, e.g. after the underlying index was rebuilt or reloaded."""
+        with self._lock:
+            self._index.reset()
+            self._entries.clear()
+            self._keys.clear()
+
+    # _touch, _put and _evict are called with self._lock held
+
+    def _touch(self, entry, key):
+        self._entries.move_to_end(entry.entry_id)
+        if key not in self._keys:
+            # remember the paraphrase too: next time it is an exact hit
+            self._keys[key] = entry.entry_id
+            entry.keys.append(key)
+
+    def _put(self, key, embedding, results, top_k):
+        old_id = self._keys.get(key)
+        if old_id is not None:      # same text seen with a smaller top_k
+            self._evict(old_id)
+        entry = _Entry(self._next_id, key, embedding, results, top_k)
+        self._next_id += 1
+        self._entries[entry.entry_id] = entry
+        self._keys[key] = entry.entry_id
+        self._index.add_with_ids(embedding, np.array([entry.entry_id], dtype=np.int64))
+        while len(self._entries) > self.capacity:
+            self._evict(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def _evict(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        for key in entry.keys:
+            if self._keys.get(key) == entry_id:
+                del self._keys[key]
+        self._index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    def search(self, query: str, top_k: int, encode: Callable[[str], np.ndarray],
+               search: Callable[[np.ndarray, int], List[SearchHit]]) -> List[SearchHit]:
+        """`encode` maps a query to a normalized (1, dim) embedding, `search` an embedding to SearchHits."""
+        key = normalize_query(query)
+        with self._lock:
+            self.stats["queries"] += 1
+            entry = self._entries.get(self._keys.get(key))
+            if entry is not None and entry.top_k >= top_k:
+                self.stats["exact_hits"] += 1
+                self._touch(entry, key)
+                return entry.results[:top_k]     # hits are read-only handles, safe to share
+
+        embedding = encode(query)
+        with self._lock:
+            entry, check_drift = None, False
+            if len(self._entries):
+                similarities, ids = self._index.search(embedding, 1)
+                entry = self._entries.get(int(ids[0][0]))
+                if entry is not None and similarities[0][0] >= self.threshold and entry.top_k >= top_k:
+                    self.stats["semantic_hits"] += 1
+                    self._touch(entry, key)
+                    check_drift = self._rng.random() < self.drift_sample_rate
+                else:
+                    entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+        if entry is not None:
+            if check_drift:
+                self._check_drift(entry.results[:top_k], search(embedding, top_k))
+            return entry.results[:top_k]
+
+        results = search(embedding, top_k)
+        with self._lock:
+            self._put(key, embedding, results, top_k)
+        return results[:top_k]
+
+    def _check_drift(self, cached, fresh):
+        cached_ids = {hit.passage_id for hit in cached}
+        fresh_ids = {hit.passage_id for hit in fresh}
+        with self._lock:
+            self.stats["drift_checks"] += 1
+            self.stats["drift_overlap_sum"] += len(cached_ids & fresh_ids) / max(len(fresh_ids), 1)
+
+    def metrics(self) -> Dict[str, float]:
+        """Hit rates over all queries and the mean candidate overlap of sampled semantic hits (1.0 = no drift)."""
+        with self._lock:
+            stats, size = dict(self.stats), len(self._entries)
+        queries = stats["queries"] or 1
+        checks = stats["drift_checks"]
+        return {
+            "size": size,
+            "hit_rate": (stats["exact_hits"] + stats["semantic_hits"]) / queries,
+            "exact_hit_rate": stats["exact_hits"] / queries,
+            "semantic_hit_rate": stats["semantic_hits"] / queries,
+            "drift_overlap": stats["drift_overlap_sum"] / checks if checks else None,
+            **{k: v for k, v in stats.items() if k != "drift_overlap_sum"},
+        }
@@ -0,0 +1,123 @@
+# IR_2025S/reranker.py
+
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+COLD_START_PAIRS = 4    # pairs scored to calibrate the cost estimate before the budget applies
+
+
+class CrossEncoderReranker:
+    """
+    Second-stage re-ranker: scores (query, passage) pairs with a cross-encoder in one batched
+    forward pass. The work per query is bounded twice: only the first `max_candidates` fused
+    results are considered, and only as many uncached pairs as the time budget is predicted
+    to allow get scored; until there is a prediction, pairs are scored in small chunks and the
+    budget is checked after each. Whatever cannot be scored keeps its fused order.
+    """
+
+    def __init__(self,
+                 model_name: str = DEFAULT_RERANK_MODEL,
+                 max_candidates: int = 20,
+                 time_budget_ms: float = 250.0,
+                 max_length: int = 256,
+                 cache_size: int = 4096,
+                 local_files_only: bool = False):
+        self.model_name = model_name
+        self.max_candidates = max_candidates
+        self.time_budget_ms = time_budget_ms
+        self.max_length = max_length
+        self.cache_size = cache_size
+
+        print(f"🤖 Loading cross-encoder {model_name}...")
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=local_files_only)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_name, local_files_only=local_files_only)
+        self.model.eval()
+
+        self._cache = OrderedDict()     # (query, passage) -> score, LRU order
+        self._ms_per_pair = None        # running estimate of the forward-pass cost
+        self.stats = {"queries": 0, "scored_pairs": 0, "cache_hits": 0, "truncated": 0, "fallbacks": 0, "overruns": 0}
+
+    def _cache_get(self, key):
+        score = self._cache.get(key)
+        if score is not None:
+            self._cache.move_to_end(key)
+        return score
+
+    def _cache_put(self, key, score):
+        self._cache[key] = score
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _forward(self, query: str, passages: List[str]) -> List[float]:
+        inputs = self.tokenizer(
+            [query] * len(passages),
+            passages,
+            return_tensors="pt",
+            padding=True,
+            truncation=True,
+            max_length=self.max_length
+        )
+        with torch.no_grad():
+            logits = self.model(**inputs).logits
+        # single-logit models give a relevance score, two-class models put "relevant" last
+        return logits[:, -1].tolist()
+
+    def rerank(self, query: str, candidates: List, text_of: Callable = lambda c: c,
+               time_budget_ms: Optional[float] = None) -> List[Tuple[object, Optional[float]]]:
+        """
+        Re-orders `candidates` (already in fused order) and returns (candidate, score) pairs.
+        Candidates that were not scored within the budget get score None and stay behind the
+        scored prefix in their fused order.
+        """
+        budget = self.time_budget_ms if time_budget_ms is None else time_budget_ms
+        start = time.perf_counter()
+        self.stats["queries"] += 1
+
+        head = candidates[:self.max_candidates]
+        scores = [self._cache_get((query, text_of(c))) for c in head]
+        self.stats["cache_hits"] += sum(score is not None for score in scores)
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        while missing:
+            if self._ms_per_pair is None:
+                # no estimate yet: score a small chunk first, so a cold query still checks its budget
+                batch = missing[:COLD_START_PAIRS]
+            elif self._ms_per_pair:
+                remaining_ms = budget - (time.perf_counter() - start) * 1000
+                batch = missing[:max(0, int(remaining_ms / self._ms_per_pair))]
+            else:
+                batch = missing
+            if not batch:
+                self.stats["truncated"] += 1
+                break
+
+            passages = [text_of(head[i]) for i in batch]
+            pass_start = time.perf_counter()
+            for i, passage, score in zip(batch, passages, self._forward(query, passages)):
+                scores[i] = score
+                self._cache_put((query, passage), score)
+            ms_per_pair = (time.perf_counter() - pass_start) * 1000 / len(batch)
+            self._ms_per_pair = ms_per_pair if self._ms_per_pair is None else 0.8 * self._ms_per_pair + 0.2 * ms_per_pair
+            self.stats["scored_pairs"] += len(batch)
+            missing = missing[len(batch):]
+
+        if (time.perf_counter() - start) * 1000 > budget:
+            self.stats["overruns"] += 1
+
+        # only a fully scored prefix can be re-ordered; the rest keeps fused order
+        prefix = 0
+        while prefix < len(head) and scores[prefix] is not None:
+            prefix += 1
+        if prefix < 2:
+            if prefix < len(head):
+                self.stats["fallbacks"] += 1
+            return [(c, s) for c, s in zip(head, scores)] + [(c, None) for c in candidates[len(head):]]
+
+        reranked = sorted(zip(head[:prefix], scores[:prefix]), key=lambda x: x[1], reverse=True)
+        rest = [(c, scores[i]) for i, c in enumerate(head[prefix:], prefix)]
+        return reranked + rest + [(c, None) for c in candidates[len(head):]]
@@ -0,0 +1,111 @@
+# IR_2025S/results.py
+#
+# One result type for every retriever. A hit is a handful of slots: float score, integer
+# doc_id (chapter) and passage_id (paragraph, -1 for chapter-level hits) plus the retriever
+# that produced it. Titles, metadata and text are resolved through that retriever only when
+# read, so ranking allocates one small object per hit and no dicts or strings.
+
+
+class SearchHit:
+    """
+    A ranked chapter or paragraph. `source` resolves the lazy fields:
+    source.hit_metadata(hit) -> the stored metadata dict (shared, do not modify) and
+    source.hit_text(hit) -> the passage text. `ref` is an optional source-specific handle
+    (e.g. the metadata a shard worker sent back).
+    """
+    __slots__ = ("score", "doc_id", "passage_id", "_source", "_ref", "_text")
+
+    def __init__(self, source, score, doc_id, passage_id=-1, ref=None):
+        self._source = source
+        self.score = score
+        self.doc_id = doc_id
+        self.passage_id = passage_id
+        self._ref = ref
+        self._text = None
+
+    @property
+    def metadata(self):
+        return self._source.hit_metadata(self)
+
+    @property
+    def chapter_id(self):
+        return self.metadata["chapter_id"]
+
+    @property
+    def book(self):
+        return self.metadata["book"]
+
+    @property
+    def chapter_title(self):
+        return self.metadata["chapter_title"]
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self._source.hit_text(self)
+        return self._text
+
+    def preview(self, width=300):
+        """Up to `width` characters of the hit's text, on one line."""
+        return self.text[:width].replace("\n", " ")
+
+    def __repr__(self):
+        return f"{type(self).__name__}(doc_id={self.doc_id}, passage_id={self.passage_id}, score={self.score:.4f})"
+
+
+class HybridHit(SearchHit):
+    """
+    A fused chapter: `score` is the combined score, the legs' own hits (either may be None) keep
+    their scores and text. `rerank_score` is set when a cross-encoder re-ordered the results.
+    Texts are read lazily, so they are only available while the HybridRetriever is open.
+    """
+    __slots__ = ("bm25_score", "dense_score", "rerank_score", "bm25_hit", "dense_hit", "_bm25_text", "_dense_text")
+
+    def __init__(self, score, doc_id, bm25_hit=None, dense_hit=None):
+        super().__init__(None, score, doc_id, dense_hit.passage_id if dense_hit is not None else -1)
+        self.bm25_hit = bm25_hit
+        self.dense_hit = dense_hit
+        self.bm25_score = bm25_hit.score if bm25_hit is not None else 0.0
+        self.dense_score = dense_hit.score if dense_hit is not None else 0.0
+        self.rerank_score = None
+        self._bm25_text = None
+        self._dense_text = None
+
+    @property
+    def combined_score(self):
+        return self.score
+
+    @property
+    def metadata(self):
+        return (self.bm25_hit or self.dense_hit).metadata
+
+    @property
+    def chapter_id(self):
+        return (self.bm25_hit or self.dense_hit).chapter_id
+
+    @property
+    def book(self):
+        return (self.bm25_hit or self.dense_hit).book
+
+    @property
+    def chapter_title(self):
+        return (self.bm25_hit or self.dense_hit).chapter_title
+
+    @property
+    def bm25_text(self):
+        """Query-relevant window of the chapter, "" if BM25 did not retrieve it."""
+        if self._bm25_text is None:
+            self._bm25_text = self.bm25_hit.preview(300) if self.bm25_hit is not None else ""
+        return self._bm25_text
+
+    @property
+    def dense_text(self):
+        """Best paragraph (or expansion snippet) of the second leg, "" if it did not retrieve the chapter."""
+        if self._dense_text is None:
+            self._dense_text = self.dense_hit.preview(300) if self.dense_hit is not None else ""
+        return self._dense_text
+
+    @property
+    def text(self):
+        # the dense paragraph is the tighter passage; chapters only found by BM25 use their snippet
+        return self.dense_text or self.bm25_text
@@ -1,93 +1,512 @@
-import sqlite3
 import math
+import sqlite3
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
 from pathlib import Path
-from collections import defaultdict
+from operator import itemgetter
+from collections import Counter, defaultdict
+import numpy as np
+from IR_2025S.sqlite_utils import SQLiteReadPool
+from IR_2025S.segmentation import WORD_RE
+from IR_2025S.memory_report import memory_step
+from IR_2025S.results import SearchHit
+from IR_2025S.filters import cached_runs, runs_mask
+
+DEFAULT_HIGHLIGHT = ("**", "**")
+DOC_VECTOR_CACHE_SIZE = 1024    # decoded term vectors kept for pseudo-relevance feedback
+IMPACT_BLOCK_SIZE = 256         # impact postings read per term in rank_impact()'s first round
+
+
+def bm25_idf(N, df):
+    return math.log((N - df + 0.5) / (df + 0.5) + 1)
+
+
+def bm25_tf(freq, dl, avgdl, k1, b):
+    return (freq * (k1 + 1)) / (freq + k1 * (1 - b + b * (dl / avgdl)))
+
+
+class TermDictionary:
+    """
+    Compact, read-only token -> (term_id, df) dictionary: a sorted tuple of tokens plus
+    parallel int arrays, looked up by binary search. Loaded once per retriever.
+    """
+    __slots__ = ("tokens", "term_ids", "dfs", "_by_id")
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=itemgetter(1))      # (term_id, token, df) by token
+        self.tokens = tuple(token for _, token, _ in rows)
+        self.term_ids = array("I", (term_id for term_id, _, _ in rows))
+        self.dfs = array("I", (df for _, _, df in rows))
+        self._by_id = None
+
+    def _find(self, token):
+        i = bisect_left(self.tokens, token)
+        if i < len(self.tokens) and self.tokens[i] == token:
+            return i
+        return -1
+
+    def term_id(self, token):
+        i = self._find(token)
+        return self.term_ids[i] if i >= 0 else None
+
+    def lookup(self, token):
+        """(term_id, document_frequency), or (None, 0) for unknown tokens."""
+        i = self._find(token)
+        return (self.term_ids[i], self.dfs[i]) if i >= 0 else (None, 0)
+
+    def _positions(self):
+        # term_id -> position in the sorted arrays (-1: no such term), built on first use (feedback)
+        if self._by_id is None:
+            term_ids = np.frombuffer(self.term_ids, dtype=np.uint32)
+            by_id = np.full(int(term_ids.max(initial=0)) + 1, -1, dtype=np.int64)
+            by_id[term_ids] = np.arange(len(term_ids))
+            self._by_id = by_id
+        return self._by_id
+
+    def token_of(self, term_id):
+        """Token of a term id, or None."""
+        by_id = self._positions()
+        i = by_id[term_id] if 0 <= term_id < len(by_id) else -1
+        return self.tokens[i] if i >= 0 else None
+
+    def dfs_of(self, term_ids):
+        """Document frequencies of an int array of term ids (0 for unknown ids)."""
+        by_id = self._positions()
+        term_ids = np.asarray(term_ids)
+        positions = np.where(term_ids < len(by_id), by_id[np.minimum(term_ids, len(by_id) - 1)], -1)
+        dfs = np.frombuffer(self.dfs, dtype=np.uint32)[np.maximum(positions, 0)]
+        return np.where(positions >= 0, dfs, 0)
+
+    def __len__(self):
+        return len(self.tokens)
+
+
+class ChapterHit(SearchHit):
+    """
+    The SearchHit of a ranked chapter (passage_id -1). The chapter's ids and title are fetched
+    together with the ranking and kept in slots; the chapter text is loaded lazily on first
+    access, and `snippet()` reads just a query-relevant window of it.
+    """
+    __slots__ = ("chapter_id", "book", "chapter_title", "query_tokens")
+
+    def __init__(self, retriever, score, doc_id, chapter_id, book, chapter_title, query_tokens=()):
+        super().__init__(retriever, score, doc_id)
+        self.chapter_id = chapter_id
+        self.book = book
+        self.chapter_title = chapter_title
+        self.query_tokens = query_tokens
+
+    @property
+    def metadata(self):
+        return {"doc_id": self.doc_id, "chapter_id": self.chapter_id, "book": self.book, "chapter_title": self.chapter_title}
+
+    def snippet(self, width=300, highlight=DEFAULT_HIGHLIGHT, query_tokens=None):
+        tokens = self.query_tokens if query_tokens is None else query_tokens
+        return self._source.snippet(self.doc_id, tokens, width=width, highlight=highlight)
+
+    def preview(self, width=300):
+        return self.snippet(width=width, highlight=None).replace("\n", " ")
+
+    def __repr__(self):
+        return f"ChapterHit(chapter_id={self.chapter_id!r}, score={self.score:.4f})"
 
 
 class BM25RetrieverSQLite:
-    def __init__(self, db_path, k1=1.5, b=0.75):
+    def __init__(self, db_path, k1=1.5, b=0.75, immutable=True, **pool_kwargs):
         self.db_path = Path(db_path)
-        self.conn = sqlite3.connect(self.db_path)
+        self.pool = SQLiteReadPool(self.db_path, immutable=immutable, **pool_kwargs)
         self.k1 = k1
         self.b = b
+        with memory_step("bm25.meta"):
+            self.meta = self._load_meta()
+        with memory_step("bm25.term_dictionary"):
+            self.terms = self._load_terms()
+        with memory_step("bm25.doc_lengths"):
+            self.doc_lengths = self._load_doc_lengths()
         self.N = self._get_total_docs()
         self.avgdl = self._get_avg_doc_length()
+        self._doc_vectors = {}      # doc_id -> (term_ids, frequencies), insertion-ordered LRU
+        self._filter_runs = {}      # ChapterFilter -> doc_id runs, see IR_2025S.filters
+        self._cache_lock = threading.Lock()     # both caches are shared by the pool's reader threads
+
+    def memory_components(self):
+        """What this retriever holds in memory, by name, for IR_2025S.memory_report."""
+        return {"term_dictionary": self.terms, "doc_lengths": self.doc_lengths, "meta": self.meta,
+                "doc_vectors": self._doc_vectors, "filter_runs": self._filter_runs, "sqlite": self.pool}
+
+    @property
+    def conn(self):
+        return self.pool.conn
+
+    def _load_terms(self):
+        return TermDictionary(self.conn.execute(
+            "SELECT term_id, token, document_frequency FROM vocabulary"
+        ).fetchall())
+
+    def _load_doc_lengths(self):
+        # loaded once into an array indexed by doc_id, cheaper than a lookup query per ranking call
+        rows = self.conn.execute("SELECT doc_id, doc_length FROM chapters").fetchall()
+        doc_lengths = array("I", bytes(4 * (max((doc_id for doc_id, _ in rows), default=-1) + 1)))
+        for doc_id, length in rows:
+            doc_lengths[doc_id] = length
+        self.num_local_docs = len(rows)
+        return doc_lengths
+
+    def _load_meta(self):
+        try:
+            return dict(self.conn.execute("SELECT key, value FROM index_meta").fetchall())
+        except sqlite3.OperationalError:     # index built before index_meta existed
+            return {}
 
     def _get_total_docs(self):
-        result = self.conn.execute("SELECT COUNT(*) FROM chapters").fetchone()
-        return result[0]
+        # shards carry the statistics of the whole collection, see BooleanIndexerSQLite.apply_collection_stats
+        if "N" in self.meta:
+            return int(self.meta["N"])
+        return self.num_local_docs
 
     def _get_avg_doc_length(self):
-        result = self.conn.execute("SELECT AVG(doc_length) FROM chapters").fetchone()
-        return result[0]
+        if "avgdl" in self.meta:
+            return float(self.meta["avgdl"])
+        if not self.num_local_docs:
+            return 0.0
+        return sum(self.doc_lengths) / self.num_local_docs
 
     def _get_document_frequency(self, token):
-        result = self.conn.execute("""
-            SELECT document_frequency FROM vocabulary WHERE token = ?
-        """, (token,)).fetchone()
-        return result[0] if result else 0
-
-    def _get_postings(self, token):
-        rows = self.conn.execute("""
-            SELECT chapter_id, frequency FROM inverted_index WHERE token = ?
-        """, (token,)).fetchall()
+        return self.terms.lookup(token)[1]
+
+    def _get_postings(self, term_id, runs=None):
+        if runs is None:
+            return self.conn.execute("""
+                SELECT doc_id, frequency FROM inverted_index WHERE term_id = ?
+            """, (term_id,)).fetchall()
+        # (term_id, doc_id) is the primary key: each run is one range scan of the posting list
+        rows = []
+        for start, end in runs:
+            rows.extend(self.conn.execute("""
+                SELECT doc_id, frequency FROM inverted_index WHERE term_id = ? AND doc_id >= ? AND doc_id < ?
+            """, (term_id, start, end)))
         return rows
 
-    def _get_doc_lengths(self, chapter_ids):
-        placeholders = ",".join("?" for _ in chapter_ids)
-        query = f"SELECT chapter_id, doc_length FROM chapters WHERE chapter_id IN ({placeholders})"
-        rows = self.conn.execute(query, tuple(chapter_ids)).fetchall()
-        return {cid: length for cid, length in rows}
+    def _chapter_ids(self):
+        # chapter_id by doc_id, None for unused ids
+        chapter_ids = [None] * len(self.doc_lengths)
+        for doc_id, chapter_id in self.conn.execute("SELECT doc_id, chapter_id FROM chapters"):
+            chapter_ids[doc_id] = chapter_id
+        return chapter_ids
+
+    def doc_runs(self, chapter_filter):
+        """(start, end) doc_id runs of the chapters passing a ChapterFilter, resolved once per filter."""
+        with self._cache_lock:
+            return cached_runs(self._filter_runs, chapter_filter, self._chapter_ids)
+
+    def doc_id_of(self, chapter_id):
+        row = self.conn.execute("SELECT doc_id FROM chapters WHERE chapter_id = ?", (chapter_id,)).fetchone()
+        return row[0] if row else None
+
+    def rank(self, query_tokens, top_n=5, chapter_filter=None):
+        """
+        Returns the top-n chapters as ChapterHit handles, best first. With a ChapterFilter only the
+        matching doc_id ranges of each posting list are read.
+        """
+        scores = self.score_documents(query_tokens, chapter_filter=chapter_filter)
+        ranked = heapq.nlargest(top_n, scores.items(), key=lambda x: x[1])
+        return self._make_hits(ranked, tuple(query_tokens))
+
+    def score_documents(self, query_tokens, postings=None, chapter_filter=None):
+        """
+        BM25 score of every matching document, as {doc_id: score}. `postings` (term_id -> rows)
+        keeps the posting lists read, so that a later pass over the same terms reuses them.
+        """
+        return self._score_weighted(((token, 1.0) for token in query_tokens), postings, chapter_filter)
 
-    def rank(self, query_tokens, top_n=5, return_scores=False):
+    def _score_weighted(self, weighted_tokens, postings=None, chapter_filter=None):
+        # (token, weight) pairs: each term's BM25 contribution is scaled by its query weight
         scores = defaultdict(float)
-        doc_lengths = {}
+        doc_lengths = self.doc_lengths
+        runs = self.doc_runs(chapter_filter) if chapter_filter is not None else None
+        if runs == ():
+            return scores
 
-        for token in query_tokens:
-            df = self._get_document_frequency(token)
+        for token, weight in weighted_tokens:
+            term_id, df = self.terms.lookup(token)
             if df == 0:
                 continue
 
-            idf = math.log((self.N - df + 0.5) / (df + 0.5) + 1)
-            postings = self._get_postings(token)
-            chapter_ids = [cid for cid, _ in postings]
-
-            if not doc_lengths:
-                doc_lengths = self._get_doc_lengths(set(chapter_ids))
+            idf = weight * bm25_idf(self.N, df)
+            rows = postings.get(term_id) if postings is not None else None
+            if rows is None:
+                rows = self._get_postings(term_id, runs)
+                if postings is not None:
+                    postings[term_id] = rows
 
-            for chapter_id, freq in postings:
-                dl = doc_lengths.get(chapter_id, self.avgdl)
-                tf_component = (freq * (self.k1 + 1)) / (freq + self.k1 * (1 - self.b + self.b * (dl / self.avgdl)))
-                scores[chapter_id] += idf * tf_component
+            for doc_id, freq in rows:
+                scores[doc_id] += idf * bm25_tf(freq, doc_lengths[doc_id], self.avgdl, self.k1, self.b)
 
-        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        top_chapter_ids = [cid for cid, _ in ranked[:top_n]]
+        return scores
 
-        if return_scores:
-            metadata = self._fetch_chapter_metadata(top_chapter_ids)
-            score_dict = dict(ranked[:top_n])
+    def document_vector(self, doc_id):
+        """
+        (term_ids, frequencies) uint32 arrays of a chapter, as stored at index time. The last
+        DOC_VECTOR_CACHE_SIZE vectors read stay in memory.
+        """
+        cache = self._doc_vectors
+        with self._cache_lock:
+            vector = cache.pop(doc_id, None)
+            if vector is not None:
+                cache[doc_id] = vector      # re-inserted: most recently used last
+                return vector
 
-            results = []
-            for chapter_id, book, chapter_title, text in metadata:
-                score = score_dict.get(chapter_id, 0.0)
-                results.append((score, chapter_id, book, chapter_title, text))
-            return results
+        # read outside the lock; two threads missing on the same doc_id both read it, harmlessly
+        try:
+            row = self.conn.execute(
+                "SELECT term_ids, frequencies FROM doc_vectors WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+        except sqlite3.OperationalError:     # index built before doc_vectors existed
+            raise ValueError(f"{self.db_path} has no document vectors; rebuild it to use feedback") from None
+        if row:
+            vector = (np.frombuffer(row[0], dtype=np.uint32), np.frombuffer(row[1], dtype=np.uint32))
         else:
-            return self._fetch_chapter_metadata(top_chapter_ids)
+            vector = (np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint32))
+        with self._cache_lock:
+            if doc_id not in cache and len(cache) >= DOC_VECTOR_CACHE_SIZE:
+                cache.pop(next(iter(cache), None), None)
+            cache[doc_id] = vector
+        return vector
+
+    def expand_query(self, query_tokens, scores, fb_docs=10, fb_terms=10, original_query_weight=0.5,
+                     max_df_ratio=0.5):
+        """
+        RM3 query model from a first-pass ranking `scores` ({doc_id: score}): P(w|R) is the
+        score-weighted average of the term distributions (tf / doc_length) of the top `fb_docs`
+        chapters, cut to its `fb_terms` best terms and interpolated with the original query
+        (weight `original_query_weight`). Returns {token: weight}, weights summing to 1.
+        Terms in more than `max_df_ratio` of the chapters ("harry", "say") are not expansion
+        candidates: their BM25 idf is close to zero, they would only take up the fb_terms slots.
+        """
+        counts = Counter(query_tokens)
+        weights = defaultdict(float)
+        for token, count in counts.items():
+            weights[token] += original_query_weight * count / len(query_tokens)
+
+        feedback = heapq.nlargest(fb_docs, scores.items(), key=itemgetter(1))
+        total = sum(score for _, score in feedback)
+        if total <= 0 or fb_terms <= 0:
+            return {token: count / len(query_tokens) for token, count in counts.items()}
+
+        term_ids, contributions = [], []
+        for doc_id, score in feedback:
+            doc_terms, frequencies = self.document_vector(doc_id)
+            term_ids.append(doc_terms)
+            contributions.append(frequencies * (score / (total * (self.doc_lengths[doc_id] or 1))))
+        relevance = np.bincount(np.concatenate(term_ids), weights=np.concatenate(contributions))
+
+        candidates = np.flatnonzero(relevance)
+        candidates = candidates[self.terms.dfs_of(candidates) <= max_df_ratio * self.N]
+        if len(candidates) > fb_terms:
+            candidates = candidates[np.argpartition(-relevance[candidates], fb_terms)[:fb_terms]]
+        norm = relevance[candidates].sum()
+        for term_id in candidates:
+            token = self.terms.token_of(int(term_id))
+            if token is not None:
+                weights[token] += (1 - original_query_weight) * float(relevance[term_id] / norm)
+        return dict(weights)
+
+    def rank_rm3(self, query_tokens, top_n=5, fb_docs=10, fb_terms=10, original_query_weight=0.5, max_df_ratio=0.5,
+                 chapter_filter=None, return_weights=False):
+        """
+        rank() with RM3 pseudo-relevance feedback: the query is expanded from the first-pass
+        top `fb_docs` chapters (see expand_query) and ranked again. The cost is bounded: the
+        second pass reuses the first pass's posting lists and reads at most `fb_terms` new
+        ones, and the feedback chapters' term vectors are single lookups (cached).
+        Hits keep the original query tokens for their snippets. A ChapterFilter applies to both
+        passes, so feedback comes from the chapters that can be returned.
+        With `return_weights`, returns (hits, expanded query as {token: weight}) instead.
+        """
+        query_tokens = list(query_tokens)
+        if not query_tokens:
+            return ([], {}) if return_weights else []
+        postings = {}
+        first_pass = self.score_documents(query_tokens, postings, chapter_filter)
+        weights = self.expand_query(query_tokens, first_pass, fb_docs, fb_terms, original_query_weight, max_df_ratio)
+        scores = self._score_weighted(weights.items(), postings, chapter_filter)
+        ranked = heapq.nlargest(top_n, scores.items(), key=itemgetter(1))
+        hits = self._make_hits(ranked, tuple(query_tokens))
+        return (hits, weights) if return_weights else hits
+
+    def _make_hits(self, ranked, query_tokens=()):
+        # ranked: (doc_id, score) pairs. One fixed statement per id instead of a fresh
+        # `IN (?,?,...)` string per call: the statement is prepared once and reused, and the
+        # rank order is preserved. The text column is deliberately not selected, see ChapterHit.text
+        hits = []
+        for doc_id, score in ranked:
+            row = self.conn.execute("""
+                SELECT chapter_id, book, chapter_title FROM chapters WHERE doc_id = ?
+            """, (doc_id,)).fetchone()
+            if row:
+                hits.append(ChapterHit(self, score, doc_id, row[0], row[1], row[2], query_tokens))
+        return hits
+
+    def rank_impact(self, query_tokens, top_n=5, early_termination=True, chapter_filter=None):
+        """
+        BM25 over the precomputed impact index (see BooleanIndexerSQLite.build_impact_index): each
+        term's postings are read in decreasing impact order, in blocks of IMPACT_BLOCK_SIZE rows that
+        double every round, and their integer impacts are added into one array with NumPy.
+        With early termination, reading stops after a round of blocks once no document outside the
+        current top-n can still overtake the n-th one (each term adds at most its last impact read);
+        the top-n set is then final and only its members' scores are completed from the unread
+        postings, so scores and order are those of the exhaustive run.
+        A ChapterFilter is applied as a doc_id mask while accumulating; the bounds stay valid.
+        """
+        if "impact_scale" not in self.meta:
+            raise ValueError("Index has no impact postings. Call BooleanIndexerSQLite.build_impact_index() first.")
+        allowed = None
+        if chapter_filter is not None:
+            runs = self.doc_runs(chapter_filter)
+            if not runs:
+                return []
+            allowed = np.asarray(runs_mask(runs, len(self.doc_lengths)), dtype=bool)
 
-    def _fetch_chapter_metadata(self, chapter_ids):
-        if not chapter_ids:
-            return []
+        # repeated query terms count repeatedly, as in rank()
+        weights = Counter(term_id for term_id in map(self.terms.term_id, query_tokens) if term_id is not None)
+        acc = np.zeros(len(self.doc_lengths), dtype=np.int64)
+        block_size = IMPACT_BLOCK_SIZE if early_termination else -1
+        cursors = {term_id: self.conn.execute("""
+            SELECT impact, doc_id FROM impact_index WHERE term_id = ?
+            ORDER BY impact DESC, doc_id
+        """, (term_id,)) for term_id in weights}
+        last_read = {}      # term_id -> (impact, doc_id) of its last posting read, where reading resumes
 
-        placeholders = ",".join("?" for _ in chapter_ids)
-        query = f"""
-            SELECT chapter_id, book, chapter_title, text FROM chapters
-            WHERE chapter_id IN ({placeholders})
+        while cursors:
+            for term_id, cursor in list(cursors.items()):
+                rows = cursor.fetchmany(block_size) if block_size > 0 else cursor.fetchall()
+                if rows:
+                    last_read[term_id] = rows[-1]
+                    postings = np.array(rows, dtype=np.int64)
+                    impacts, doc_ids = postings[:, 0] * weights[term_id], postings[:, 1]
+                    if allowed is not None:
+                        keep = allowed[doc_ids]
+                        impacts, doc_ids = impacts[keep], doc_ids[keep]
+                    acc[doc_ids] += impacts      # doc_ids are unique within a term's postings
+                if len(rows) < block_size or block_size < 0:
+                    del cursors[term_id]
+            if not cursors or not 0 < top_n < len(acc):
+                continue
+
+            # any document, seen or not, can still gain at most `remaining`
+            remaining = sum(last_read[term_id][0] * weights[term_id] for term_id in cursors)
+            block_size *= 2     # a check costs O(#docs), so keep their number logarithmic
+            # cheap guard first: the n-th score can never exceed the best one
+            if remaining > acc.max():
+                continue
+            top = np.partition(acc, len(acc) - top_n - 1)[len(acc) - top_n - 1:]
+            if top[0] + remaining <= top[1:].min():
+                break
+
+        candidates = np.flatnonzero(acc)
+        if 0 < top_n < len(candidates):
+            # keep ties with the n-th score, the final sort breaks them by doc_id
+            nth = np.partition(acc[candidates], len(candidates) - top_n)[len(candidates) - top_n]
+            candidates = candidates[acc[candidates] >= nth]
+        scores = {int(doc_id): int(acc[doc_id]) for doc_id in candidates}
+        if cursors:
+            self._complete_impacts(scores, {term_id: last_read[term_id] for term_id in cursors}, weights)
+        ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:top_n]
+
+        scale = float(self.meta["impact_scale"])
+        return self._make_hits([(doc_id, impact * scale) for doc_id, impact in ranked], tuple(query_tokens))
+
+    def _complete_impacts(self, scores, resume_at, weights):
+        """
+        Adds the unread postings of the documents in `scores` ({doc_id: partial score}, updated in
+        place) after an early stop; a term's unread postings follow its `resume_at` (impact, doc_id).
+        """
+        placeholders = ",".join("?" * len(scores))
+        for term_id, (impact, doc_id) in resume_at.items():
+            rows = self.conn.execute(f"""
+                SELECT doc_id, impact FROM impact_index
+                WHERE term_id = ? AND (impact < ? OR (impact = ? AND doc_id > ?)) AND doc_id IN ({placeholders})
+            """, (term_id, impact, impact, doc_id, *scores))
+            for row_doc_id, row_impact in rows:
+                scores[row_doc_id] += row_impact * weights[term_id]
+
+    def rank_with_scores(self, query_tokens, top_n=5, chapter_filter=None):
+        # hits always carry their score now; kept for existing callers
+        return self.rank(query_tokens, top_n=top_n, chapter_filter=chapter_filter)
+
+    def hit_text(self, hit):
+        return self.fetch_text(hit.doc_id)
+
+    def fetch_text(self, doc_id):
+        row = self.conn.execute("SELECT text FROM chapters WHERE doc_id = ?", (doc_id,)).fetchone()
+        return row[0] if row else ""
+
+    def _get_offsets(self, term_id, doc_id):
+        row = self.conn.execute("""
+            SELECT offsets FROM positions WHERE term_id = ? AND doc_id = ?
+        """, (term_id, doc_id)).fetchone()
+        return array("I", row[0]) if row else array("I")
+
+    def _best_window(self, hits, width):
+        """Start offset of the `width`-char window covering the most distinct query terms (then most hits)."""
+        best_start, best_key = 0, (0, 0)
+        in_window = Counter()       # term -> hits inside [hits[lo], hits[hi]], updated as the window slides
+        lo = 0
+        for hi, (offset, term) in enumerate(hits):
+            in_window[term] += 1
+            while offset - hits[lo][0] >= width:
+                in_window[hits[lo][1]] -= 1
+                if not in_window[hits[lo][1]]:
+                    del in_window[hits[lo][1]]
+                lo += 1
+            key = (len(in_window), hi - lo + 1)
+            if key > best_key:
+                best_start, best_key = hits[lo][0], key
+        return best_start
+
+    def snippet(self, doc_id, query_tokens, width=300, highlight=DEFAULT_HIGHLIGHT):
         """
-        return self.conn.execute(query, tuple(chapter_ids)).fetchall()
+        Returns the `width`-char window of the chapter that best matches the query,
+        with query-term occurrences wrapped in `highlight` markers (None disables highlighting).
+        Only that window is read from SQLite via substr().
+        """
+        term_ids = {self.terms.term_id(token) for token in query_tokens} - {None}
+        hits = sorted(
+            (offset, term_id)
+            for term_id in term_ids
+            for offset in self._get_offsets(term_id, doc_id)
+        )
+
+        start = 0
+        if hits:
+            # leave a little leading context in front of the first hit
+            start = max(0, self._best_window(hits, width - width // 5) - width // 10)
+
+        row = self.conn.execute("""
+            SELECT substr(text, ?, ?) FROM chapters WHERE doc_id = ?
+        """, (start + 1, width, doc_id)).fetchone()     # substr() is 1-based
+        window = row[0] if row else ""
+        truncated = len(window) == width
+
+        # highlight hits inside the window, back to front so offsets stay valid
+        if highlight and hits:
+            open_mark, close_mark = highlight
+            for offset, _ in reversed(hits):
+                rel = offset - start
+                if rel < 0 or rel >= len(window):
+                    continue
+                match = WORD_RE.match(window, rel)
+                if match:
+                    end = match.end()
+                    window = window[:rel] + open_mark + window[rel:end] + close_mark + window[end:]
 
-    def rank_with_scores(self, query_tokens, top_n=5):
-        return self.rank(query_tokens, top_n=top_n, return_scores=True)
+        # drop words cut in half at the window edges
+        if start > 0 and " " in window:
+            window = window[window.index(" ") + 1:]
+        if truncated and " " in window:
+            window = window[:window.rindex(" ")]
+        return window.strip()
 
     def close(self):
-        self.conn.close()
+        self.pool.close()
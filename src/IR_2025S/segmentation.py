@@ -0,0 +1,56 @@
+# IR_2025S/segmentation.py
+#
+# Paragraph segmentation and tokenization shared by the sparse and dense pipelines.
+# Patterns are compiled once; scanners yield (start, end) offsets into the chapter text
+# so callers only copy the substrings they really need.
+
+import re
+
+# a token is a run of word characters or a single punctuation mark, e.g. "Hello!" -> ["Hello", "!"]
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+WORD_RE = re.compile(r"\w+")
+# naive sentence boundary: '.', '!' or '?' then whitespace (group 1) then a capital letter or an opening quote;
+# matching the mark instead of looking behind for it lets the regex engine skip ahead to candidates
+SEGMENT_BOUNDARY_RE = re.compile(r'[.!?](\s+)(?=[A-Z“"])')
+MIN_SEGMENT_CHARS = 20
+
+
+def tokenize(text):
+    """Word and punctuation tokens of `text` in one pass."""
+    return TOKEN_RE.findall(text)
+
+
+def iter_token_spans(text):
+    """(start, end) offsets of the tokens returned by tokenize()."""
+    for match in TOKEN_RE.finditer(text):
+        yield match.span()
+
+
+def _trimmed(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def iter_segment_spans(text, min_chars=MIN_SEGMENT_CHARS):
+    """
+    (start, end) offsets of the sentence-like segments of a chapter, whitespace trimmed.
+    Segments of `min_chars` characters or fewer are skipped.
+    """
+    # a boundary consumes all whitespace between the mark and the next capital or quote,
+    # so only the chapter's first start and last end can need trimming
+    spaces = [match.span(1) for match in SEGMENT_BOUNDARY_RE.finditer(text)]
+    starts = [0] + [space_end for _, space_end in spaces]
+    ends = [space_start for space_start, _ in spaces] + [len(text)]
+    starts[0] = _trimmed(text, 0, ends[0])[0]
+    ends[-1] = _trimmed(text, starts[-1], len(text))[1]
+    for seg_start, seg_end in zip(starts, ends):
+        if seg_end - seg_start > min_chars:
+            yield seg_start, seg_end
+
+
+def segment_text(text, start, end):
+    """The text of one segment, on a single line."""
+    return text[start:end].replace("\n", " ")
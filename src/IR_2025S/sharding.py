@@ -0,0 +1,248 @@
+import json
+import zlib
+import heapq
+import multiprocessing
+from pathlib import Path
+from itertools import chain
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from IR_2025S.indexer import BooleanIndexerSQLite
+from IR_2025S.retriever import BM25RetrieverSQLite
+from IR_2025S.results import SearchHit
+from IR_2025S.filters import cached_runs, search_faiss_runs
+from IR_2025S.segmentation import iter_segment_spans
+
+SHARD_SCHEMES = ("book", "hash")
+MANIFEST_NAME = "shards.json"
+
+
+def shard_of(entry, num_shards, scheme="book"):
+    """Shard number of a chapter: by book (whole books stay together) or by a stable hash of chapter_id."""
+    if scheme == "book":
+        return (int(entry["book_number"]) - 1) % num_shards
+    if scheme == "hash":
+        return zlib.crc32(entry["chapter_id"].encode("utf-8")) % num_shards
+    raise ValueError(f"Unknown shard scheme {scheme!r}, expected one of {SHARD_SCHEMES}")
+
+
+def partition_dataset(dataset, num_shards, scheme="book"):
+    """Splits the corpus into shards; entries keep their global doc_id (corpus position) across shards."""
+    shards = [[] for _ in range(num_shards)]
+    for position, entry in enumerate(dataset):
+        shards[shard_of(entry, num_shards, scheme)].append({"doc_id": position, **entry})
+    return shards
+
+
+def collection_stats(dataset, vocabulary=None):
+    """
+    Global N, avgdl and document frequencies (by token) over the whole (unsharded) collection.
+    Entries carry `tokens` or, given the `vocabulary` they refer to, `token_ids` (see index_dataset()).
+    """
+    document_frequencies = Counter()
+    total_length = 0
+    for entry in dataset:
+        if "token_ids" in entry and vocabulary is not None:
+            document_frequencies.update(vocabulary[term_id] for term_id in set(entry["token_ids"]))
+            total_length += len(entry["token_ids"])
+        else:
+            document_frequencies.update(set(entry["tokens"]))
+            total_length += len(entry["tokens"])
+    N = len(dataset)
+    return N, (total_length / N if N else 0.0), document_frequencies
+
+
+def build_bm25_shards(dataset, shard_dir, num_shards, scheme="book", impacts=False, k1=1.5, b=0.75,
+                      impact_bits=12, vocabulary=None):
+    """
+    Builds one SQLite index per shard under `shard_dir` plus a `shards.json` manifest.
+    Every shard stores the global N, avgdl and document frequencies, so per-shard BM25
+    scores are directly comparable and merging them gives the single-index ranking.
+    Impact postings are quantized with one scale for all shards, for the same reason.
+    """
+    shard_dir = Path(shard_dir)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+
+    N, avgdl, document_frequencies = collection_stats(dataset, vocabulary)
+    paths, indexers = [], []
+    for i, part in enumerate(partition_dataset(dataset, num_shards, scheme)):
+        path = shard_dir / f"bm25_{i:03d}.db"
+        indexer = BooleanIndexerSQLite(path)
+        indexer.index_dataset(part, vocabulary=vocabulary)
+        indexer.apply_collection_stats(N, avgdl, document_frequencies)
+        indexers.append(indexer)
+        paths.append(path.name)
+        print(f"🧩 Shard {i}: {len(part)} chapters -> {path}")
+
+    if impacts:
+        # the scale a single index over the whole collection would use
+        max_impact = max(indexer.max_impact(k1=k1, b=b) for indexer in indexers) or 1.0
+        scale = max_impact / ((1 << impact_bits) - 1)
+        for indexer in indexers:
+            indexer.build_impact_index(k1=k1, b=b, bits=impact_bits, scale=scale)
+    for indexer in indexers:
+        indexer.close()
+
+    _update_manifest(shard_dir, scheme=scheme, num_shards=num_shards, N=N, avgdl=avgdl, bm25=paths)
+    return shard_dir / MANIFEST_NAME
+
+
+def build_dense_shards(dataset, shard_dir, num_shards, dense_retriever, scheme="book"):
+    """
+    Builds one FAISS index per shard with an already loaded DenseRetrieverFAISS (models are loaded once).
+    Cosine scores need no global statistics, so the shards are fully independent. Paragraphs keep the
+    global_idx (passage id) a single index over the whole collection would give them.
+    """
+    shard_dir = Path(shard_dir)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+
+    # global_idx of each chapter's first paragraph, numbered in corpus order as split_dataset() does
+    first_paragraph, num_paragraphs = {}, 0
+    for position, entry in enumerate(dataset):
+        first_paragraph[entry.get("doc_id", position)] = num_paragraphs
+        num_paragraphs += sum(1 for _ in iter_segment_spans(entry["text"]))
+
+    paths = []
+    for i, part in enumerate(partition_dataset(dataset, num_shards, scheme)):
+        path = shard_dir / f"dense_{i:03d}"
+        dense_retriever.build_index(part)
+        for metadata in dense_retriever.paragraph_metadata:
+            metadata["global_idx"] = first_paragraph[metadata["doc_id"]] + metadata["paragraph_idx"]
+        dense_retriever.save_index(str(path))
+        paths.append(path.name)
+
+    _update_manifest(shard_dir, scheme=scheme, num_shards=num_shards, dense=paths)
+    return shard_dir / MANIFEST_NAME
+
+
+def _update_manifest(shard_dir, **fields):
+    manifest_path = Path(shard_dir) / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {}
+    if manifest.get("num_shards", fields["num_shards"]) != fields["num_shards"] or \
+            manifest.get("scheme", fields["scheme"]) != fields["scheme"]:
+        raise ValueError(f"{manifest_path} describes a different sharding; use a fresh shard_dir")
+    manifest.update(fields)
+    manifest_path.write_text(json.dumps(manifest, indent=4), encoding="utf-8")
+
+
+# ---- worker side: each process opens the shards it is asked about once and keeps them ----
+
+_WORKER_BM25 = {}
+_WORKER_DENSE = {}
+_WORKER_DENSE_RUNS = {}     # path -> {ChapterFilter: runs of shard-local FAISS ids}
+
+
+def _bm25_shard_search(path, query_tokens, top_n, impact, chapter_filter=None):
+    retriever = _WORKER_BM25.get(path)
+    if retriever is None:
+        retriever = _WORKER_BM25[path] = BM25RetrieverSQLite(path)
+    # rank_impact() completes the scores of its top-n, so shard results merge exactly
+    rank = retriever.rank_impact if impact else retriever.rank
+    return [(hit.score, hit.doc_id) for hit in rank(query_tokens, top_n=top_n, chapter_filter=chapter_filter)]
+
+
+def _dense_shard_search(path, query_embedding, top_k, chapter_filter=None):
+    import faiss
+    import pickle
+
+    shard = _WORKER_DENSE.get(path)
+    if shard is None:
+        index = faiss.read_index(str(Path(path).with_suffix(".faiss")))
+        with open(Path(path).with_suffix(".pkl"), "rb") as f:
+            metadata = pickle.load(f)
+        shard = _WORKER_DENSE[path] = (index, metadata)
+
+    index, metadata = shard
+    if chapter_filter is not None:
+        runs = cached_runs(_WORKER_DENSE_RUNS.setdefault(path, {}), chapter_filter,
+                           lambda: [meta.get("chapter_id") for meta in metadata])
+        scores, indices = search_faiss_runs(index, query_embedding, top_k, runs)
+        scores, indices = [scores], [indices]
+    else:
+        scores, indices = index.search(query_embedding, top_k)
+    return [(float(score), metadata[idx]) for score, idx in zip(scores[0], indices[0]) if 0 <= idx < len(metadata)]
+
+
+class ShardedSearcher:
+    """
+    Scatter-gather search over the shards described by a `shards.json` manifest.
+    Each query is sent to all shards in parallel (worker processes by default, threads optionally)
+    and the per-shard top-k lists are merged with a heap.
+    """
+
+    def __init__(self, shard_dir, workers=None, executor="process", dense_retriever=None, corpus_path=None):
+        self.shard_dir = Path(shard_dir)
+        self.manifest = json.loads((self.shard_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+        self.bm25_paths = [str(self.shard_dir / name) for name in self.manifest.get("bm25", [])]
+        self.dense_paths = [str(self.shard_dir / name) for name in self.manifest.get("dense", [])]
+        self.dense_retriever = dense_retriever     # only used to encode queries and resolve paragraph text
+        if dense_retriever is not None and corpus_path is not None:
+            dense_retriever.corpus_path = Path(corpus_path)
+
+        workers = workers or self.manifest["num_shards"]
+        if executor == "process":
+            # spawn, not fork: torch/faiss/sqlite state does not survive a fork reliably
+            self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        elif executor == "thread":
+            self.pool = ThreadPoolExecutor(max_workers=workers)
+        else:
+            raise ValueError(f"Unknown executor {executor!r}, expected 'process' or 'thread'")
+
+        # parent-side handles, used only to resolve metadata and snippets of the merged hits
+        self._local_bm25 = {}
+
+    def _local(self, path):
+        retriever = self._local_bm25.get(path)
+        if retriever is None:
+            retriever = self._local_bm25[path] = BM25RetrieverSQLite(path)
+        return retriever
+
+    def _shard_paths(self, paths, chapter_filter):
+        """
+        The shards a query has to visit. Under the book scheme a book filter names its shards
+        outright (shard_of), so the others are not contacted at all.
+        """
+        if chapter_filter is None or chapter_filter.books is None or self.manifest.get("scheme") != "book":
+            return paths
+        wanted = {(book - 1) % self.manifest["num_shards"] for book in chapter_filter.books}
+        return [path for i, path in enumerate(paths) if i in wanted]
+
+    def rank(self, query_tokens, top_n=5, impact=False, chapter_filter=None):
+        """BM25 over all shards; returns ChapterHit handles like BM25RetrieverSQLite.rank()."""
+        query_tokens = list(query_tokens)
+        futures = [
+            (path, self.pool.submit(_bm25_shard_search, path, query_tokens, top_n, impact, chapter_filter))
+            for path in self._shard_paths(self.bm25_paths, chapter_filter)
+        ]
+        merged = heapq.nlargest(
+            top_n,
+            chain.from_iterable(((score, doc_id, path) for score, doc_id in f.result()) for path, f in futures),
+            key=lambda x: x[0]
+        )
+        return [
+            hit for score, doc_id, path in merged
+            for hit in self._local(path)._make_hits([(doc_id, score)], tuple(query_tokens))
+        ]
+
+    def search(self, query, top_k=5, chapter_filter=None):
+        """Dense search over all shards; returns paragraph SearchHits like DenseRetrieverFAISS.search()."""
+        if self.dense_retriever is None:
+            raise ValueError("Dense search needs a dense_retriever to encode queries.")
+        query_embedding = self.dense_retriever.encode_query(query)
+        futures = [self.pool.submit(_dense_shard_search, path, query_embedding, top_k, chapter_filter)
+                   for path in self._shard_paths(self.dense_paths, chapter_filter)]
+        merged = heapq.nlargest(top_k, chain.from_iterable(f.result() for f in futures), key=lambda x: x[0])
+        # the parent has no metadata of its own: each hit keeps the dict its shard sent back
+        return [SearchHit(self, score, metadata.get("doc_id", -1), metadata["global_idx"], ref=metadata)
+                for score, metadata in merged]
+
+    def hit_metadata(self, hit):
+        return hit._ref
+
+    def hit_text(self, hit):
+        return self.dense_retriever.paragraph_text(hit._ref)
+
+    def close(self):
+        self.pool.shutdown()
+        for retriever in self._local_bm25.values():
+            retriever.close()
+        self._local_bm25 = {}
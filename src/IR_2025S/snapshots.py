@@ -0,0 +1,485 @@
+# IR_2025S/snapshots.py
+#
+# Versioned, immutable index snapshots and in-process hot-swapping between them.
+#
+#   snapshots/
+#   ├── CURRENT              name of the live version, replaced atomically
+#   ├── .pins/               one empty file per version a running HotSwapRetriever holds
+#   ├── v000001/
+#   │   ├── manifest.json    components, file sizes and CRC-32s, collection statistics (N, avgdl)
+#   │   ├── boolean_index.db
+#   │   ├── harry_dense_index.faiss / .pkl
+#   │   └── corpus.arrow
+#   └── v000002/ ...
+#
+# publish_snapshot() copies freshly built indexes into a hidden staging directory, writes the
+# manifest, renames the directory to the next version and only then points CURRENT at it, so a
+# reader never sees a partly written version. Files of a published version are never written
+# again (they are made read-only), which is what SQLite's immutable=1 open mode and memory
+# mapping assume. The stage scripts keep building into data/processed as before; serving reads
+# snapshots, so rebuilding no longer pulls tables out from under running retrievers.
+#
+# HotSwapRetriever serves queries from one loaded version and swaps to another without a
+# restart: the new version is loaded next to the old one (reusing its models), queries started
+# after the swap see the new one, and the old version is closed once its last query finishes.
+# Every loaded version is pinned with a file named after it and the process id, so pruning from
+# another process (12_publish_snapshot.py --keep) leaves it alone; pins of dead processes are ignored.
+
+import os
+import json
+import shutil
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from IR_2025S.file_utils import file_crc32
+from IR_2025S.sqlite_utils import read_only_uri
+
+SNAPSHOT_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+CURRENT_NAME = "CURRENT"
+PINS_NAME = ".pins"
+
+# component -> file or directory name inside data/processed and inside a snapshot;
+# the dense index is a path stem, as for DenseRetrieverFAISS.save_index / load_index
+SNAPSHOT_COMPONENTS = {
+    "bm25": "boolean_index.db",
+    "dense": "harry_dense_index",
+    "corpus": "corpus.arrow",
+    "late_interaction": "harry_late_index",
+    "expansion": "expansion_index.db",
+}
+DENSE_SUFFIXES = (".faiss", ".pkl")
+
+
+def _component_files(component, path: Path) -> List[Path]:
+    """Files making up a component at `path` (empty if it is not there)."""
+    if component == "dense":
+        files = [path.with_suffix(suffix) for suffix in DENSE_SUFFIXES]
+        return files if all(f.exists() for f in files) else []
+    if path.is_dir():
+        return sorted(f for f in path.rglob("*") if f.is_file())
+    return [path] if path.exists() else []
+
+
+def default_sources(processed_path) -> Dict[str, Path]:
+    """The components present in a build directory (data/processed), by component name."""
+    processed_path = Path(processed_path)
+    return {component: processed_path / name for component, name in SNAPSHOT_COMPONENTS.items()
+            if _component_files(component, processed_path / name)}
+
+
+def _copy_sqlite(source: Path, target: Path):
+    # the backup API copies a consistent state even if the source is being written. The source is
+    # not opened read-only: a read-only connection to a WAL database leaves its -wal/-shm files behind
+    src = sqlite3.connect(str(source))
+    dst = sqlite3.connect(str(target))
+    try:
+        src.backup(dst)
+        # a published file is never written again, so it needs no WAL next to it
+        dst.execute("PRAGMA journal_mode = DELETE;")
+    finally:
+        dst.close()
+        src.close()
+
+
+def _fsync_dir(path: Path):
+    # makes a rename inside `path` durable; directories cannot be opened this way on Windows
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(str(path), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_atomic(path: Path, text: str):
+    """Writes `text` to a temporary file next to `path`, then renames it over `path`."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    _fsync_dir(path.parent)
+
+
+def _collection_stats(db_path: Path) -> Dict:
+    """N, avgdl and vocabulary size of a BM25 index, as its retriever will see them."""
+    conn = sqlite3.connect(read_only_uri(db_path, immutable=False), uri=True)
+    try:
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM index_meta").fetchall())
+        except sqlite3.OperationalError:     # index built before index_meta existed
+            meta = {}
+        count, avgdl = conn.execute("SELECT COUNT(*), AVG(doc_length) FROM chapters").fetchone()
+        vocabulary_size = conn.execute("SELECT COUNT(*) FROM vocabulary").fetchone()[0]
+    finally:
+        conn.close()
+    return {
+        "N": int(meta.get("N", count)),
+        "avgdl": float(meta.get("avgdl", avgdl or 0.0)),
+        "chapters": count,
+        "vocabulary_size": vocabulary_size,
+        "index_meta": meta,
+    }
+
+
+def list_versions(root) -> List[str]:
+    """Published versions under `root`, oldest first."""
+    root = Path(root)
+    if not root.exists():
+        return []
+    versions = [p.name for p in root.iterdir()
+                if p.is_dir() and p.name.startswith("v") and p.name[1:].isdigit() and (p / MANIFEST_NAME).exists()]
+    return sorted(versions, key=lambda name: int(name[1:]))
+
+
+def current_version(root) -> Optional[str]:
+    path = Path(root) / CURRENT_NAME
+    if not path.exists():
+        return None
+    return path.read_text(encoding="utf-8").strip() or None
+
+
+def set_current(root, version: str):
+    """Points CURRENT at a published version (also how a bad version is rolled back)."""
+    root = Path(root)
+    if not (root / version / MANIFEST_NAME).exists():
+        raise FileNotFoundError(f"No published snapshot {version!r} in {root}")
+    _write_atomic(root / CURRENT_NAME, version + "\n")
+
+
+def publish_snapshot(root, sources: Dict[str, Path], note: str = None, make_current: bool = True) -> "Snapshot":
+    """
+    Copies the components in `sources` (component -> path, see default_sources) into a new
+    version under `root` and makes it CURRENT. Nothing under `root` changes until the complete
+    version is renamed into place; an interrupted publish leaves only a hidden staging directory.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    if "bm25" not in sources:
+        raise ValueError("A snapshot needs at least the BM25 index ('bm25')")
+
+    staging = Path(tempfile.mkdtemp(dir=root, prefix=".staging-"))
+    try:
+        components, files = {}, {}
+        for component, source in sources.items():
+            source = Path(source)
+            name = SNAPSHOT_COMPONENTS[component]
+            source_files = _component_files(component, source)
+            if not source_files:
+                raise FileNotFoundError(f"{component} not found at {source}")
+            for source_file in source_files:
+                if component == "dense":
+                    target = staging / (name + source_file.suffix)
+                elif source.is_dir():
+                    target = staging / name / source_file.relative_to(source)
+                else:
+                    target = staging / name
+                target.parent.mkdir(parents=True, exist_ok=True)
+                if target.suffix == ".db":
+                    _copy_sqlite(source_file, target)
+                else:
+                    shutil.copy2(source_file, target)
+            components[component] = name
+
+        for path in sorted(f for f in staging.rglob("*") if f.is_file()):
+            relative = path.relative_to(staging).as_posix()
+            files[relative] = {"bytes": path.stat().st_size, "crc32": file_crc32(path)}
+            with path.open("rb") as f:
+                os.fsync(f.fileno())
+            path.chmod(0o444)
+
+        previous = current_version(root)
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "parent": previous,
+            "note": note,
+            "components": components,
+            "collection": _collection_stats(staging / components["bm25"]),
+            "files": files,
+        }
+        if "dense" in components:
+            import pickle
+            with (staging / (components["dense"] + ".pkl")).open("rb") as f:
+                manifest["collection"]["paragraphs"] = len(pickle.load(f))
+
+        # the version number is taken by the rename itself, so concurrent publishers cannot collide
+        existing = list_versions(root)
+        number = int(existing[-1][1:]) + 1 if existing else 1
+        while True:
+            version = f"v{number:06d}"
+            manifest["version"] = version
+            _write_atomic(staging / MANIFEST_NAME, json.dumps(manifest, indent=2))
+            try:
+                os.rename(staging, root / version)
+                break
+            except OSError:
+                if not (root / version).exists():
+                    raise
+                number += 1
+        _fsync_dir(root)
+    except BaseException:
+        _remove_tree(staging)
+        raise
+
+    if make_current:
+        set_current(root, version)
+    return Snapshot(root / version)
+
+
+def _remove_tree(path: Path):
+    if not path.exists():
+        return
+    for f in path.rglob("*"):
+        if f.is_file():
+            f.chmod(0o644)      # published files are read-only
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def pin_version(root, version: str) -> Path:
+    """Marks `version` as in use by this process until the returned pin file is removed (unpin)."""
+    pins = Path(root) / PINS_NAME
+    pins.mkdir(exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=pins, prefix=f"{version}.{os.getpid()}.")
+    os.close(fd)
+    return Path(path)
+
+
+def unpin(pin: Path):
+    Path(pin).unlink(missing_ok=True)
+
+
+def _process_alive(pid: int) -> bool:
+    if os.name != "posix":
+        return True     # no cheap liveness check (os.kill would terminate it): keep the pin
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:     # alive, owned by another user
+        return True
+    return True
+
+
+def pinned_versions(root) -> set:
+    """Versions pinned by running processes (any HotSwapRetriever on `root`); stale pins are removed."""
+    pins = Path(root) / PINS_NAME
+    if not pins.exists():
+        return set()
+    pinned = set()
+    for pin in pins.iterdir():
+        version, pid, _ = (pin.name.split(".", 2) + ["", ""])[:3]
+        if pid.isdigit() and not _process_alive(int(pid)):
+            unpin(pin)
+        else:
+            pinned.add(version)
+    return pinned
+
+
+def prune_snapshots(root, keep: int = 3, protect=()) -> List[str]:
+    """
+    Deletes all but the newest `keep` versions. CURRENT, the versions in `protect` and those pinned
+    by a HotSwapRetriever in any running process (see pin_version) are never deleted.
+    Returns the removed versions.
+    """
+    root = Path(root)
+    keep_set = set(list_versions(root)[-keep:]) if keep > 0 else set()
+    keep_set.update(protect)
+    keep_set.update(pinned_versions(root))
+    keep_set.add(current_version(root))
+    removed = [version for version in list_versions(root) if version not in keep_set]
+    for version in removed:
+        _remove_tree(root / version)
+    return removed
+
+
+class Snapshot:
+    """One published version: its directory and manifest. Component paths are resolved from the manifest."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        manifest_path = self.path / MANIFEST_NAME
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"Not a published snapshot (no {MANIFEST_NAME}): {self.path}")
+        self.manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if self.manifest.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"{self.path} has snapshot format {self.manifest.get('format')}, expected {SNAPSHOT_FORMAT}")
+        self.version = self.manifest["version"]
+
+    @property
+    def N(self) -> int:
+        return self.manifest["collection"]["N"]
+
+    @property
+    def avgdl(self) -> float:
+        return self.manifest["collection"]["avgdl"]
+
+    def component(self, name: str) -> Optional[Path]:
+        """Path of a component (the dense index as a stem), None if this version has none."""
+        relative = self.manifest["components"].get(name)
+        return self.path / relative if relative else None
+
+    def verify(self) -> List[str]:
+        """Problems found by checking every file against the manifest's size and CRC-32; empty if intact."""
+        problems = []
+        for relative, expected in self.manifest["files"].items():
+            path = self.path / relative
+            if not path.exists():
+                problems.append(f"{relative}: missing")
+            elif path.stat().st_size != expected["bytes"]:
+                problems.append(f"{relative}: {path.stat().st_size} bytes, expected {expected['bytes']}")
+            elif file_crc32(path) != expected["crc32"]:
+                problems.append(f"{relative}: checksum mismatch")
+        return problems
+
+    def __repr__(self):
+        return f"Snapshot({self.version!r}, N={self.N}, avgdl={self.avgdl:.1f})"
+
+
+def open_snapshot(root, version: str = None) -> Snapshot:
+    """A published version, CURRENT by default."""
+    version = version or current_version(root)
+    if version is None:
+        raise FileNotFoundError(f"No current snapshot in {root}; publish one with pipeline/12_publish_snapshot.py")
+    return Snapshot(Path(root) / version)
+
+
+class _Loaded:
+    """A loaded version, its pin file and the queries running on it."""
+    __slots__ = ("snapshot", "retriever", "pin", "in_flight", "retired")
+
+    def __init__(self, snapshot, retriever, pin):
+        self.snapshot = snapshot
+        self.retriever = retriever
+        self.pin = pin
+        self.in_flight = 0
+        self.retired = False
+
+
+class HotSwapRetriever:
+    """
+    Serves one loaded snapshot at a time and swaps versions in-process.
+
+    `loader(snapshot, previous)` returns a retriever for a Snapshot; `previous` is the retriever
+    being replaced (None for the first load), so models can be carried over instead of reloaded,
+    e.g. HybridRetriever.from_snapshot. Queries run inside `with hot.acquire() as retriever:`;
+    lazy hits (snippets, texts) must be read inside the block too, as with close().
+
+    swap_to() loads the new version while queries continue on the old one, then switches with a
+    single reference assignment. The old version is closed by whichever thread finishes its last
+    in-flight query. refresh() swaps when CURRENT has moved and is cheap enough to call per request.
+    Loaded versions are pinned (pin_version) until closed, so prune_snapshots() keeps them.
+    """
+
+    def __init__(self, root, loader: Callable, version: str = None):
+        self.root = Path(root)
+        self.loader = loader
+        self._lock = threading.Lock()           # guards _active and the in-flight counts
+        self._swap_lock = threading.Lock()      # one load at a time
+        self._retired = []                      # replaced versions still serving queries
+        self.swaps = 0
+        snapshot = open_snapshot(self.root, version)
+        self._active = self._load(snapshot, None)
+
+    @property
+    def version(self) -> str:
+        return self._active.snapshot.version
+
+    @property
+    def snapshot(self) -> Snapshot:
+        return self._active.snapshot
+
+    @contextmanager
+    def acquire(self):
+        """The current version's retriever, kept open until the block exits even if a swap happens meanwhile."""
+        with self._lock:
+            loaded = self._active
+            loaded.in_flight += 1
+        try:
+            yield loaded.retriever
+        finally:
+            self._release(loaded)
+
+    def _release(self, loaded):
+        with self._lock:
+            loaded.in_flight -= 1
+            idle = loaded.retired and loaded.in_flight == 0
+            if idle:
+                self._retired.remove(loaded)
+        if idle:
+            self._close(loaded)
+
+    def _load(self, snapshot, previous):
+        pin = pin_version(self.root, snapshot.version)      # before loading: a prune may run meanwhile
+        try:
+            return _Loaded(snapshot, self.loader(snapshot, previous), pin)
+        except BaseException:
+            unpin(pin)
+            raise
+
+    @staticmethod
+    def _close(loaded):
+        close = getattr(loaded.retriever, "close", None)
+        if close is not None:
+            close()
+        loaded.retriever = None     # drops the FAISS index and metadata of this version
+        unpin(loaded.pin)
+
+    def swap_to(self, version: str = None) -> bool:
+        """Loads `version` (CURRENT by default) and makes it active; False if it already is."""
+        with self._swap_lock:
+            snapshot = open_snapshot(self.root, version)
+            if snapshot.version == self.version:
+                return False
+            with self.acquire() as previous:    # the old version stays open while its models are borrowed
+                loaded = self._load(snapshot, previous)
+            with self._lock:
+                old, self._active = self._active, loaded
+                old.retired = True
+                idle = old.in_flight == 0
+                if not idle:
+                    self._retired.append(old)
+            if idle:
+                self._close(old)
+            self.swaps += 1
+            print(f"🔁 Swapped index snapshot {old.snapshot.version} -> {snapshot.version}")
+            return True
+
+    def refresh(self) -> bool:
+        """Swaps to CURRENT if it names another version than the active one."""
+        current = current_version(self.root)
+        if current is None or current == self.version:
+            return False
+        return self.swap_to(current)
+
+    def versions_in_use(self) -> List[str]:
+        """The active version and replaced ones still finishing queries (not to be pruned)."""
+        with self._lock:
+            return [self._active.snapshot.version] + [loaded.snapshot.version for loaded in self._retired]
+
+    def memory_components(self) -> Dict:
+        """The active retriever and any retired ones not yet released, for IR_2025S.memory_report."""
+        with self._lock:
+            components = {f"active {self.version}": self._active.retriever}
+            for loaded in self._retired:
+                components[f"retired {loaded.snapshot.version}"] = loaded.retriever
+        return components
+
+    def close(self):
+        with self._lock:
+            loaded = [self._active] + self._retired
+            self._retired = []
+        for item in loaded:
+            if item.retriever is not None:
+                self._close(item)
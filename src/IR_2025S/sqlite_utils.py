@@ -0,0 +1,95 @@
+import sqlite3
+import threading
+from pathlib import Path
+
+
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024    # 256 MiB, larger than the whole index
+DEFAULT_CACHE_SIZE_KB = 64 * 1024        # 64 MiB page cache per connection
+
+
+def read_only_uri(db_path, immutable=True):
+    """
+    Builds a SQLite URI that opens the database read-only.
+    `immutable=1` tells SQLite the file cannot change while it is open, so it skips
+    all locking and change detection. Only use it on indexes that are not rebuilt in place.
+    """
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    if immutable:
+        uri += "&immutable=1"
+    return uri
+
+
+class SQLiteReadPool:
+    """
+    Hands out one read-only connection per thread.
+    sqlite3 connections cannot be shared across threads, so every thread that queries
+    the index lazily gets its own connection, tuned for read-heavy workloads.
+    """
+
+    def __init__(self, db_path, immutable=True, mmap_size=DEFAULT_MMAP_SIZE,
+                 cache_size_kb=DEFAULT_CACHE_SIZE_KB, cached_statements=256):
+        self.db_path = Path(db_path)
+        if not self.db_path.exists():
+            raise FileNotFoundError(f"SQLite index not found: {self.db_path}")
+
+        self.uri = read_only_uri(self.db_path, immutable=immutable)
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self.cached_statements = cached_statements
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._closed = False
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.uri,
+            uri=True,
+            check_same_thread=False,
+            cached_statements=self.cached_statements   # prepared statement cache
+        )
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)};")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)};")   # negative = KiB
+        conn.execute("PRAGMA temp_store = MEMORY;")
+        conn.execute("PRAGMA query_only = ON;")
+        return conn
+
+    @property
+    def conn(self):
+        """Connection owned by the calling thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self._closed:
+                # e.g. a lazy hit read after its retriever was closed; reopening could hit a deleted snapshot
+                raise sqlite3.ProgrammingError(
+                    f"{self.db_path.name} was closed; read hit texts and snippets before closing the retriever"
+                )
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def memory_footprint(self):
+        """
+        Mapped: the part of the database file covered by mmap (shared with other processes).
+        The page cache lives in SQLite's own heap, invisible to Python; its per-connection limit
+        is reported as `cache_limit`, the real use shows up in RSS.
+        """
+        return {
+            "heap": 0,
+            "mapped": min(self.db_path.stat().st_size, self.mmap_size),
+            "cache_limit": len(self._connections) * self.cache_size_kb * 1024,
+        }
+
+    def execute(self, sql, params=()):
+        return self.conn.execute(sql, params)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
@@ -0,0 +1,31 @@
+import sys
+import random
+from pathlib import Path
+import pytest
+
+# Fix Python path to point to src/ folder where the IR_2025S module lives
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+WORDS = [f"w{i}" for i in range(40)]
+
+
+@pytest.fixture(scope="session")
+def synthetic_dataset():
+    """300 tokenized chapters in 10 books, term frequencies roughly Zipfian over WORDS."""
+    rng = random.Random(0)
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    dataset = []
+    for i in range(300):
+        book, chapter = i // 30 + 1, i % 30 + 1
+        tokens = rng.choices(WORDS, weights, k=rng.randrange(20, 200))
+        dataset.append({"chapter_id": f"{book}_{chapter}", "book": f"Book {book}", "book_number": book,
+                        "chapter_int_number": chapter, "chapter_title": f"Chapter {chapter}",
+                        "text": " ".join(tokens), "tokens": tokens})
+    return dataset
+
+
+@pytest.fixture(scope="session")
+def synthetic_queries():
+    """100 queries of 1-4 distinct WORDS."""
+    rng = random.Random(1)
+    return [rng.sample(WORDS, rng.randrange(1, 5)) for _ in range(100)]
@@ -0,0 +1,56 @@
+import json
+import numpy as np
+from IR_2025S.build_pipeline import BuildCheckpoint
+
+DIM = 4
+CONFIG = {"tokens": {"preprocessor": "Preprocessor"}, "embeddings": {"model": "test", "dim": DIM}}
+
+
+def fill(checkpoint, keys):
+    for i, key in enumerate(keys):
+        checkpoint.put_tokens(key, [f"t{i}"], [i])
+        checkpoint.put_embeddings(key, np.full((i % 3 + 1, DIM), i, dtype=np.float32))
+
+
+def assert_complete(checkpoint, keys):
+    for i, key in enumerate(keys):
+        assert checkpoint.get_tokens(key) == ([f"t{i}"], [i])
+        np.testing.assert_array_equal(checkpoint.get_embeddings(key), np.full((i % 3 + 1, DIM), i))
+
+
+def test_resume_after_torn_writes(tmp_path):
+    checkpoint = BuildCheckpoint(tmp_path, CONFIG)
+    fill(checkpoint, ["a", "b", "c"])
+    checkpoint.close()
+
+    # an interrupted build: half a token line, a partial embedding row and its half-written range
+    with checkpoint.tokens_path.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(["d", ["t3"], [3]])[:7])
+    with checkpoint.embeddings_path.open("ab") as f:
+        f.write(np.ones(DIM + 2, dtype=np.float32).tobytes()[:-2])
+    with checkpoint.embedding_rows_path.open("a", encoding="utf-8") as f:
+        f.write('["d", [6,')
+
+    checkpoint = BuildCheckpoint(tmp_path, CONFIG)
+    assert checkpoint.get_tokens("d") is None and checkpoint.get_embeddings("d") is None
+    assert_complete(checkpoint, ["a", "b", "c"])
+    fill(checkpoint, ["a", "b", "c", "d", "e"])     # appends after the cut are readable again
+    checkpoint.close()
+
+    checkpoint = BuildCheckpoint(tmp_path, CONFIG)
+    assert_complete(checkpoint, ["a", "b", "c", "d", "e"])
+    checkpoint.close()
+
+
+def test_ranges_past_the_embedding_data_are_dropped(tmp_path):
+    checkpoint = BuildCheckpoint(tmp_path, CONFIG)
+    fill(checkpoint, ["a", "b"])
+    checkpoint.close()
+    size = checkpoint.embeddings_path.stat().st_size
+    with checkpoint.embeddings_path.open("rb+") as f:
+        f.truncate(size - 4 * DIM)      # b's last row never reached the disk
+
+    checkpoint = BuildCheckpoint(tmp_path, CONFIG)
+    assert checkpoint.get_embeddings("b") is None
+    assert_complete(checkpoint, ["a"])
+    checkpoint.close()
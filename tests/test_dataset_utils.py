@@ -0,0 +1,29 @@
+import pytest
+from IR_2025S.dataset_utils import CorpusWriter, load_corpus, save_corpus
+
+
+def chapters(text):
+    return [{"chapter_id": f"1_{i}", "book": "Book 1", "book_number": 1, "chapter_str_number": str(i),
+             "chapter_int_number": i, "chapter_title": f"Chapter {i}", "text": f"{text} {i}"} for i in range(50)]
+
+
+def test_rewriting_a_corpus_keeps_mapped_readers_valid(tmp_path):
+    path = tmp_path / "corpus.arrow"
+    save_corpus(chapters("old"), path)
+    mapped = load_corpus(path, columns=["text"])
+
+    save_corpus(chapters("new text, longer than the old one"), path)
+    assert mapped.column("text").to_pylist() == [entry["text"] for entry in chapters("old")]
+    assert load_corpus(path, columns=["text"]).column("text")[0].as_py().startswith("new")
+    assert [p.name for p in tmp_path.iterdir()] == ["corpus.arrow"]
+
+
+def test_failed_corpus_writer_leaves_the_previous_corpus(tmp_path):
+    path = tmp_path / "corpus.arrow"
+    save_corpus(chapters("old"), path)
+    with pytest.raises(RuntimeError):
+        with CorpusWriter(path) as writer:
+            writer.write(chapters("new")[0])
+            raise RuntimeError("stage failed")
+    assert load_corpus(path).num_rows == 50
+    assert [p.name for p in tmp_path.iterdir()] == ["corpus.arrow"]
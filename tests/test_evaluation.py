@@ -0,0 +1,52 @@
+import random
+import numpy as np
+import pytest
+from IR_2025S.evaluation import AhoCorasick, average_precision, ndcg, relevance_matrix
+
+sklearn_metrics = pytest.importorskip("sklearn.metrics")
+
+
+@pytest.fixture
+def rankings():
+    """200 random top-10 rankings over 50 ids, each with a random relevant set."""
+    rng = random.Random(0)
+    result_ids = [rng.sample(range(50), 10) for _ in range(200)]
+    relevant = [set(rng.sample(range(50), rng.randrange(0, 8))) for _ in range(200)]
+    return relevance_matrix(result_ids, relevant, 10)
+
+
+def test_average_precision_matches_sklearn(rankings):
+    scores = np.arange(rankings.shape[1], 0, -1)        # rank order as decreasing scores
+    ours = average_precision(rankings)
+    for row, value in zip(rankings, ours):
+        if row.any():
+            assert value == pytest.approx(sklearn_metrics.average_precision_score(row, scores))
+        else:
+            assert value == 0.0
+
+
+def test_ndcg_matches_sklearn(rankings):
+    scores = np.arange(rankings.shape[1], 0, -1)
+    ours = ndcg(rankings)
+    for row, value in zip(rankings, ours):
+        assert value == pytest.approx(sklearn_metrics.ndcg_score([row], [scores]))
+
+
+def test_aho_corasick_finds_every_occurrence():
+    rng = random.Random(0)
+    for _ in range(100):
+        # a small alphabet makes overlaps and patterns inside other patterns common
+        patterns = ["".join(rng.choices("abc", k=rng.randrange(1, 5))) for _ in range(rng.randrange(1, 8))]
+        text = "".join(rng.choices("abc", k=200))
+        expected = sorted(
+            (start, start + len(pattern), pattern_id)
+            for pattern_id, pattern in enumerate(patterns)
+            for start in range(len(text) - len(pattern) + 1)
+            if text.startswith(pattern, start)
+        )
+        assert sorted(AhoCorasick(patterns).iter_matches(text)) == expected
+
+
+def test_aho_corasick_skips_empty_patterns():
+    matcher = AhoCorasick(["", "he", "she", "hers"])
+    assert sorted(matcher.iter_matches("ushers")) == [(1, 4, 2), (2, 4, 1), (2, 6, 3)]
@@ -0,0 +1,19 @@
+import sqlite3
+import pytest
+from IR_2025S.indexer import BooleanIndexerSQLite
+from IR_2025S.retriever import BM25RetrieverSQLite
+
+
+def test_hits_fail_clearly_after_close(tmp_path, synthetic_dataset):
+    indexer = BooleanIndexerSQLite(tmp_path / "index.db")
+    indexer.index_dataset(synthetic_dataset[:20])
+    indexer.close()
+
+    retriever = BM25RetrieverSQLite(tmp_path / "index.db")
+    first, second = retriever.rank(["w0", "w1"], top_n=2)
+    assert first.snippet(width=50)
+    retriever.close()
+    with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+        second.snippet(width=50)
+    with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+        _ = second.text
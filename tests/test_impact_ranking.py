@@ -0,0 +1,40 @@
+import pytest
+from IR_2025S.indexer import BooleanIndexerSQLite
+from IR_2025S.retriever import BM25RetrieverSQLite
+
+
+@pytest.fixture(scope="module")
+def retriever(tmp_path_factory, synthetic_dataset):
+    path = tmp_path_factory.mktemp("impact") / "index.db"
+    indexer = BooleanIndexerSQLite(path)
+    indexer.index_dataset(synthetic_dataset)
+    indexer.build_impact_index(bits=16)
+    indexer.close()
+    retriever = BM25RetrieverSQLite(path)
+    yield retriever
+    retriever.close()
+
+
+def test_early_termination_gives_exhaustive_scores(retriever, synthetic_queries):
+    for query in synthetic_queries:
+        early = retriever.rank_impact(query, top_n=10)
+        full = retriever.rank_impact(query, top_n=10, early_termination=False)
+        assert [hit.score for hit in early] == pytest.approx([hit.score for hit in full])
+        assert {hit.doc_id for hit in early} == {hit.doc_id for hit in full} or \
+            early[-1].score == pytest.approx(full[-1].score)        # ties at the cut-off
+
+
+def test_impact_ranking_matches_bm25(retriever, synthetic_queries):
+    # each posting is off by at most one quantization step, so the k-th best score is too
+    tolerance = 4 * float(retriever.meta["impact_scale"])
+    for query in synthetic_queries:
+        exact = retriever.rank(query, top_n=11)     # one more to see the gap below the cut-off
+        impact = retriever.rank_impact(query, top_n=10)
+        assert len(impact) == min(len(exact), 10)
+        for i, (e, a) in enumerate(zip(exact, impact)):
+            assert abs(e.score - a.score) <= tolerance
+            # same document wherever the exact ranking is not (near-)tied
+            gap_before = exact[i - 1].score - e.score if i else float("inf")
+            gap_after = e.score - exact[i + 1].score if i + 1 < len(exact) else float("inf")
+            if min(gap_before, gap_after) > 2 * tolerance:
+                assert a.doc_id == e.doc_id
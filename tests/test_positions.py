@@ -0,0 +1,64 @@
+import random
+import pytest
+from IR_2025S.preprocessing import Preprocessor
+from IR_2025S.indexer import BooleanIndexerSQLite
+from IR_2025S.retriever import BM25RetrieverSQLite
+
+spacy = pytest.importorskip("spacy")
+
+LEMMAS = {"harry": "harry", "went": "go", "kitchen": "kitchen", "mice": "mouse", "ran": "run", "better": "well",
+          "ever": "ever", "ate": "eat", "cheese": "cheese"}
+TEXT = "Harry went to the kitchen. The mice ran better than ever, and the mice ate cheese!"
+
+
+@pytest.fixture
+def preprocessor():
+    # a blank pipeline with fixed lemmas: en_core_web_sm is not needed to check the offsets
+    nlp = spacy.blank("en")
+    ruler = nlp.add_pipe("attribute_ruler")
+    for word, lemma in LEMMAS.items():
+        ruler.add([[{"LOWER": word}]], {"LEMMA": lemma})
+    preprocessor = Preprocessor()
+    preprocessor._nlp = nlp
+    return preprocessor
+
+
+def test_offsets_point_at_the_source_word(preprocessor):
+    tokens, offsets = preprocessor.preprocess_with_offsets(TEXT)
+    assert tokens == preprocessor.preprocess_text(TEXT)
+    surface = {lemma: word for word, lemma in LEMMAS.items()}
+    for token, offset in zip(tokens, offsets):
+        assert TEXT[offset:offset + len(surface[token])].lower() == surface[token]
+
+
+def test_irregular_lemmas_are_highlighted(preprocessor, tmp_path):
+    entry = {"chapter_id": "1_1", "book": "Book", "chapter_title": "Title", "text": TEXT}
+    dataset = preprocessor.preprocess_dataset([entry])
+    indexer = BooleanIndexerSQLite(tmp_path / "index.db")
+    indexer.index_dataset(dataset)
+    indexer.close()
+
+    retriever = BM25RetrieverSQLite(tmp_path / "index.db")
+    snippet = retriever.snippet(0, ["go", "mouse", "well"], width=200, highlight=("[", "]"))
+    retriever.close()
+    assert "[went]" in snippet
+    assert snippet.count("[mice]") == 2
+    assert "[better]" in snippet
+
+
+def brute_force_window(hits, width):
+    best_start, best_key = 0, (0, 0)
+    for lo in range(len(hits)):
+        window = [hit for hit in hits[lo:] if hit[0] - hits[lo][0] < width]
+        key = (len({term for _, term in window}), len(window))
+        if key > best_key:
+            best_start, best_key = hits[lo][0], key
+    return best_start
+
+
+def test_best_window_matches_brute_force():
+    rng = random.Random(0)
+    for _ in range(200):
+        hits = sorted((rng.randrange(2000), rng.randrange(4)) for _ in range(rng.randrange(1, 60)))
+        width = rng.choice([20, 100, 300])
+        assert BM25RetrieverSQLite._best_window(None, hits, width) == brute_force_window(hits, width)
@@ -0,0 +1,94 @@
+import pytest
+from IR_2025S.indexer import BooleanIndexerSQLite
+from IR_2025S.retriever import BM25RetrieverSQLite
+from IR_2025S.sharding import ShardedSearcher, build_bm25_shards, collection_stats
+from IR_2025S.filters import ChapterFilter
+
+
+@pytest.fixture(scope="module")
+def single(tmp_path_factory, synthetic_dataset):
+    path = tmp_path_factory.mktemp("single") / "index.db"
+    indexer = BooleanIndexerSQLite(path)
+    indexer.index_dataset(synthetic_dataset)
+    indexer.build_impact_index()
+    indexer.close()
+    retriever = BM25RetrieverSQLite(path)
+    yield retriever
+    retriever.close()
+
+
+@pytest.fixture(scope="module", params=["book", "hash"])
+def sharded(request, tmp_path_factory, synthetic_dataset):
+    shard_dir = tmp_path_factory.mktemp(f"shards_{request.param}")
+    build_bm25_shards(synthetic_dataset, shard_dir, 3, scheme=request.param, impacts=True)
+    searcher = ShardedSearcher(shard_dir, executor="thread")
+    yield searcher
+    searcher.close()
+
+
+def ranking(hits):
+    return [(hit.doc_id, round(hit.score, 9)) for hit in hits]
+
+
+def assert_same_ranking(expected, actual):
+    # doc ids may only differ between tied scores
+    assert [score for _, score in actual] == [score for _, score in expected]
+    assert sorted(actual) == sorted(expected) or actual[-1][1] == expected[-1][1]
+
+
+def test_shards_share_one_impact_scale(single, sharded):
+    scales = [float(sharded._local(path).meta["impact_scale"]) for path in sharded.bm25_paths]
+    assert scales == pytest.approx([float(single.meta["impact_scale"])] * len(scales))
+
+
+@pytest.mark.parametrize("impact", [False, True])
+def test_sharded_ranking_equals_single_index(single, sharded, synthetic_queries, impact):
+    rank = single.rank_impact if impact else single.rank
+    for query in synthetic_queries:
+        assert_same_ranking(ranking(rank(query, top_n=10)), ranking(sharded.rank(query, top_n=10, impact=impact)))
+
+
+def test_sharded_filtered_ranking_equals_single_index(single, sharded, synthetic_queries):
+    chapter_filter = ChapterFilter([2, 4], (5, 20))
+    for query in synthetic_queries:
+        for impact in (False, True):
+            rank = single.rank_impact if impact else single.rank
+            assert_same_ranking(ranking(rank(query, top_n=10, chapter_filter=chapter_filter)),
+                                ranking(sharded.rank(query, top_n=10, impact=impact, chapter_filter=chapter_filter)))
+
+
+
+def test_shards_of_tokenized_entries_with_a_vocabulary(tmp_path, single, synthetic_dataset, synthetic_queries):
+    # entries carry only `tokens`; the shared vocabulary fixes the term ids of every shard
+    vocabulary = sorted({token for entry in synthetic_dataset for token in entry["tokens"]})
+    build_bm25_shards(synthetic_dataset, tmp_path, 3, vocabulary=vocabulary)
+    searcher = ShardedSearcher(tmp_path, executor="thread")
+    try:
+        for query in synthetic_queries[:20]:
+            assert_same_ranking(ranking(single.rank(query, top_n=10)), ranking(searcher.rank(query, top_n=10)))
+    finally:
+        searcher.close()
+
+
+def test_shards_of_token_id_entries(tmp_path, single, synthetic_dataset, synthetic_queries):
+    # entries carry only `token_ids`, as read from a tokenized corpus
+    vocabulary = sorted({token for entry in synthetic_dataset for token in entry["tokens"]})
+    token_to_id = {token: term_id for term_id, token in enumerate(vocabulary)}
+    dataset = [{**{key: value for key, value in entry.items() if key != "tokens"},
+                "token_ids": [token_to_id[token] for token in entry["tokens"]]} for entry in synthetic_dataset]
+    assert collection_stats(dataset, vocabulary) == collection_stats(synthetic_dataset)
+
+    build_bm25_shards(dataset, tmp_path, 3, vocabulary=vocabulary)
+    searcher = ShardedSearcher(tmp_path, executor="thread")
+    try:
+        for query in synthetic_queries[:20]:
+            assert_same_ranking(ranking(single.rank(query, top_n=10)), ranking(searcher.rank(query, top_n=10)))
+    finally:
+        searcher.close()
+
+
+def test_tokens_missing_from_the_vocabulary_are_reported(tmp_path, synthetic_dataset):
+    indexer = BooleanIndexerSQLite(tmp_path / "index.db")
+    with pytest.raises(ValueError, match="not in the given vocabulary"):
+        indexer.index_dataset(synthetic_dataset[:5], vocabulary=["w0", "w1"])
+    indexer.close()
@@ -0,0 +1,91 @@
+import sys
+import subprocess
+from pathlib import Path
+import pytest
+from IR_2025S.indexer import BooleanIndexerSQLite
+from IR_2025S.retriever import BM25RetrieverSQLite
+from IR_2025S.snapshots import (
+    PINS_NAME, HotSwapRetriever, Snapshot, current_version, list_versions, pinned_versions, prune_snapshots,
+    publish_snapshot, set_current,
+)
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+
+
+def bm25_loader(snapshot, previous):
+    return BM25RetrieverSQLite(snapshot.component("bm25"))
+
+
+@pytest.fixture
+def snapshot_root(tmp_path, synthetic_dataset):
+    db_path = tmp_path / "build" / "boolean_index.db"
+    db_path.parent.mkdir()
+    root = tmp_path / "snapshots"
+    for size in (100, 200):     # two versions with different collections
+        indexer = BooleanIndexerSQLite(db_path)
+        indexer.index_dataset(synthetic_dataset[:size])
+        indexer.close()
+        publish_snapshot(root, {"bm25": db_path})
+    return root
+
+
+def test_publish(snapshot_root):
+    assert list_versions(snapshot_root) == ["v000001", "v000002"]
+    assert current_version(snapshot_root) == "v000002"
+    for version, N in (("v000001", 100), ("v000002", 200)):
+        snapshot = Snapshot(snapshot_root / version)
+        assert snapshot.N == N and snapshot.verify() == []
+        retriever = bm25_loader(snapshot, None)
+        assert retriever.N == N
+        retriever.close()
+
+
+def test_swap_and_release(snapshot_root):
+    set_current(snapshot_root, "v000001")
+    hot = HotSwapRetriever(snapshot_root, bm25_loader)
+    assert hot.version == "v000001"
+    assert pinned_versions(snapshot_root) == {"v000001"}
+
+    with hot.acquire() as old:
+        set_current(snapshot_root, "v000002")
+        assert hot.refresh()
+        # the query started before the swap keeps its version, snippets included
+        hit = old.rank(["w0"], top_n=1)[0]
+        assert hit.snippet(width=50)
+        assert hot.versions_in_use() == ["v000002", "v000001"]
+        assert prune_snapshots(snapshot_root, keep=0) == []
+    assert hot.versions_in_use() == ["v000002"]
+    assert pinned_versions(snapshot_root) == {"v000002"}
+    with pytest.raises(Exception, match="closed"):
+        hit.snippet(width=50)
+
+    with hot.acquire() as retriever:
+        assert retriever.N == 200
+    set_current(snapshot_root, "v000001")
+    assert prune_snapshots(snapshot_root, keep=0) == []    # v1 is CURRENT, v2 still served
+    hot.close()
+    assert pinned_versions(snapshot_root) == set()
+    assert prune_snapshots(snapshot_root, keep=0) == ["v000002"]
+
+
+def test_pins_of_other_processes(snapshot_root):
+    set_current(snapshot_root, "v000002")
+    pins = snapshot_root / PINS_NAME
+    pins.mkdir(exist_ok=True)
+    # a pin of a process that is still running protects its version ...
+    (pins / "v000001.1.live").touch()
+    assert prune_snapshots(snapshot_root, keep=0) == []
+    # ... one of a process that died does not, and is cleaned up
+    (pins / "v000001.1.live").unlink()
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    (pins / f"v000001.{dead.pid}.stale").touch()
+    assert prune_snapshots(snapshot_root, keep=0) == ["v000001"]
+    assert not any(pins.iterdir())
+
+
+def test_verify_without_current(tmp_path):
+    result = subprocess.run([sys.executable, str(ROOT_DIR / "pipeline" / "12_publish_snapshot.py"),
+                             "--root", str(tmp_path), "--verify"], capture_output=True, text=True)
+    assert result.returncode == 1
+    assert "No CURRENT snapshot" in result.stderr